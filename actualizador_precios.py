@@ -0,0 +1,337 @@
+import asyncio
+import http.client
+import json
+import math
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Actualización de precios y tipo de cambio en segundo plano.
+# Un hilo propio corre un loop de asyncio que consulta periódicamente una fuente
+# (HTTP o archivo local) y publica los valores en una instantánea compartida.
+# Las ejecuciones de Streamlit solo leen la instantánea: nunca hacen I/O ni esperan.
+#
+# Formato de los datos (JSON):
+#   {"tipo_cambio": 1050.0, "precios": {"Soja": 300.0, "Maíz": 180.0, ...}}
+
+# Configuración por variables de entorno
+VARIABLE_FUENTE = "MARGENES_FUENTE_PRECIOS"          # URL http(s)://... o ruta a un archivo JSON
+VARIABLE_INTERVALO = "MARGENES_INTERVALO_PRECIOS"    # Segundos entre consultas
+
+INTERVALO_DEFAULT = 60.0
+TTL_DEFAULT = 15 * 60.0
+TIMEOUT_DEFAULT = 5.0
+ESPERA_MAXIMA_DEFAULT = 15 * 60.0
+CONEXIONES_POR_HOST = 4
+
+
+def _numero_valido(valor, minimo):
+    # Número finito (no texto ni booleano) y no menor que el mínimo
+    return (isinstance(valor, (int, float)) and not isinstance(valor, bool)
+            and math.isfinite(valor) and valor >= minimo)
+
+
+def validar_datos(datos):
+    """
+    Verifica los datos de la fuente antes de publicarlos.
+
+    Parámetros:
+    - datos: Objeto JSON leído de la fuente
+
+    Retorna:
+    - Los mismos datos; lanza ValueError si algún valor no es válido
+      (tipo de cambio numérico y >= 1, precios numéricos y > 0)
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("La fuente de precios no devolvió un objeto JSON")
+    if "tipo_cambio" in datos and not _numero_valido(datos["tipo_cambio"], 1.0):
+        raise ValueError(f"Tipo de cambio inválido: {datos['tipo_cambio']!r}")
+    precios = datos.get("precios", {})
+    if not isinstance(precios, dict):
+        raise ValueError("Los precios deben ser un objeto producto -> USD/tn")
+    invalidos = [producto for producto, precio in precios.items() if not (_numero_valido(precio, 0.0) and precio > 0)]
+    if invalidos:
+        raise ValueError("Precios inválidos: " + ", ".join(map(str, invalidos)))
+    return datos
+
+
+class Instantanea:
+    """
+    Últimos valores conocidos de precios y tipo de cambio, con vencimiento (TTL).
+
+    Se escribe desde el hilo del actualizador y se lee desde cualquier sesión.
+    """
+
+    def __init__(self, ttl_segundos=TTL_DEFAULT):
+        self.ttl_segundos = ttl_segundos
+        self._datos = {}
+        self._actualizado = None
+        self._lock = threading.Lock()
+
+    def publicar(self, datos):
+        with self._lock:
+            self._datos = dict(datos)
+            self._actualizado = time.time()
+
+    @property
+    def antiguedad(self):
+        """Segundos desde la última actualización (None si nunca se actualizó)."""
+        actualizado = self._actualizado
+        return None if actualizado is None else time.time() - actualizado
+
+    @property
+    def vigente(self):
+        antiguedad = self.antiguedad
+        return antiguedad is not None and antiguedad <= self.ttl_segundos
+
+    def tipo_cambio(self, default):
+        """Tipo de cambio vigente, o default si no hay datos o están vencidos."""
+        with self._lock:
+            if not self.vigente:
+                return default
+            valor = self._datos.get("tipo_cambio", default)
+        return float(valor) if _numero_valido(valor, 1.0) else default
+
+    def precio(self, producto, default):
+        """Precio vigente de un producto en USD/tn, o default si no hay datos o están vencidos."""
+        with self._lock:
+            if not self.vigente:
+                return default
+            precios = self._datos.get("precios", {})
+            valor = precios.get(producto, default) if isinstance(precios, dict) else default
+        return float(valor) if _numero_valido(valor, 0.0) and valor > 0 else default
+
+
+class FuenteArchivo:
+    """Fuente local: un archivo JSON que otro proceso reemplaza (solo se relee si cambió)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._mtime = None
+        self._ultimo = None
+
+    def _leer(self):
+        mtime = os.stat(self.ruta).st_mtime_ns
+        if mtime != self._mtime:
+            with open(self.ruta, encoding="utf-8") as archivo:
+                self._ultimo = json.load(archivo)
+            self._mtime = mtime
+        return self._ultimo
+
+    async def consultar(self):
+        return await asyncio.to_thread(self._leer)
+
+    def cerrar(self):
+        pass
+
+
+class FuenteHTTP:
+    """
+    Fuente HTTP con conexiones persistentes reutilizadas (pool) y tiempo máximo por consulta.
+    """
+
+    def __init__(self, url, timeout=TIMEOUT_DEFAULT, conexiones=CONEXIONES_POR_HOST):
+        partes = urlsplit(url)
+        if partes.scheme not in ("http", "https"):
+            raise ValueError("La URL de precios debe ser http o https: " + url)
+        self.url = url
+        self.timeout = timeout
+        self._https = partes.scheme == "https"
+        self._host = partes.hostname
+        self._puerto = partes.port
+        self._ruta = (partes.path or "/") + ("?" + partes.query if partes.query else "")
+        self._pool = queue.LifoQueue(maxsize=conexiones)
+
+    def _conexion(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            clase = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            return clase(self._host, self._puerto, timeout=self.timeout)
+
+    def _devolver(self, conexion):
+        try:
+            self._pool.put_nowait(conexion)
+        except queue.Full:
+            conexion.close()
+
+    def _leer(self):
+        conexion = self._conexion()
+        try:
+            conexion.request("GET", self._ruta, headers={"Accept": "application/json", "Connection": "keep-alive"})
+            respuesta = conexion.getresponse()
+            cuerpo = respuesta.read()
+            if respuesta.status != 200:
+                raise ConnectionError(f"La fuente de precios respondió {respuesta.status}")
+        except Exception:
+            # Una conexión con error no vuelve al pool
+            conexion.close()
+            raise
+        self._devolver(conexion)
+        return json.loads(cuerpo)
+
+    async def consultar(self):
+        return await asyncio.wait_for(asyncio.to_thread(self._leer), timeout=self.timeout)
+
+    def cerrar(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def crear_fuente(origen, timeout=TIMEOUT_DEFAULT):
+    """Crea la fuente adecuada para una URL http(s) o una ruta de archivo."""
+    if origen.startswith(("http://", "https://")):
+        return FuenteHTTP(origen, timeout=timeout)
+    return FuenteArchivo(origen)
+
+
+class ActualizadorPrecios:
+    """
+    Consulta la fuente periódicamente en un hilo con su propio loop de asyncio.
+
+    Ante errores reintenta con espera exponencial (con variación aleatoria) hasta
+    espera_maxima; con una consulta exitosa vuelve al intervalo normal.
+    """
+
+    def __init__(self, fuente, instantanea=None, intervalo=INTERVALO_DEFAULT, espera_maxima=ESPERA_MAXIMA_DEFAULT):
+        self.fuente = fuente
+        self.instantanea = instantanea or Instantanea()
+        self.intervalo = intervalo
+        self.espera_maxima = espera_maxima
+        self.consultas_ok = 0
+        self.errores = 0
+        self.ultimo_error = None
+        self._hilo = None
+        self._loop = None
+        self._detener = None
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    async def actualizar(self):
+        """Hace una consulta y publica el resultado. Devuelve True si tuvo éxito."""
+        try:
+            # Un dato inválido cuenta como error y se conserva la última instantánea buena
+            datos = validar_datos(await self.fuente.consultar())
+            self.instantanea.publicar(datos)
+            self.consultas_ok += 1
+            return True
+        except Exception as e:
+            self.errores += 1
+            self.ultimo_error = f"{type(e).__name__}: {e}"
+            return False
+
+    async def _ciclo(self):
+        fallas_seguidas = 0
+        while not self._detener.is_set():
+            if await self.actualizar():
+                fallas_seguidas = 0
+                espera = self.intervalo
+            else:
+                fallas_seguidas += 1
+                espera = min(self.espera_maxima, self.intervalo * 2 ** fallas_seguidas)
+                espera *= random.uniform(0.5, 1.0)
+            try:
+                await asyncio.wait_for(self._detener.wait(), timeout=espera)
+            except asyncio.TimeoutError:
+                pass
+
+    def _correr(self):
+        self._loop = asyncio.new_event_loop()
+        self._detener = asyncio.Event()
+        try:
+            self._loop.run_until_complete(self._ciclo())
+        finally:
+            self.fuente.cerrar()
+            self._loop.close()
+
+    def iniciar(self):
+        """Arranca el hilo del actualizador (si no está corriendo)."""
+        if not self.activo:
+            self._hilo = threading.Thread(target=self._correr, name="actualizador-precios", daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self, timeout=5.0):
+        """Detiene el actualizador y espera a que termine el hilo."""
+        if self.activo and self._loop is not None and self._detener is not None:
+            self._loop.call_soon_threadsafe(self._detener.set)
+            self._hilo.join(timeout)
+
+    def metricas(self):
+        return {
+            "consultas_ok": self.consultas_ok,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error,
+            "antiguedad": self.instantanea.antiguedad,
+            "vigente": self.instantanea.vigente,
+        }
+
+
+# Actualizador compartido por todas las sesiones del proceso
+_actualizador = None
+_lock_actualizador = threading.Lock()
+
+
+def obtener_actualizador():
+    """
+    Devuelve el actualizador del proceso, creándolo y arrancándolo la primera vez.
+
+    Retorna:
+    - ActualizadorPrecios, o None si no hay una fuente configurada en MARGENES_FUENTE_PRECIOS
+    """
+    global _actualizador
+    origen = os.environ.get(VARIABLE_FUENTE)
+    if not origen:
+        return None
+    with _lock_actualizador:
+        if _actualizador is None:
+            intervalo = float(os.environ.get(VARIABLE_INTERVALO, INTERVALO_DEFAULT))
+            _actualizador = ActualizadorPrecios(crear_fuente(origen), intervalo=intervalo).iniciar()
+        return _actualizador
+
+
+def servir_archivo(ruta, puerto=8765):
+    """
+    Sirve un archivo JSON de precios por HTTP en localhost (fuente de prueba).
+
+    Parámetros:
+    - ruta: Archivo JSON con tipo_cambio y precios
+    - puerto: Puerto local
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Permite conexiones persistentes
+
+        def do_GET(self):
+            with open(ruta, "rb") as archivo:
+                cuerpo = archivo.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Manejador)
+    print(f"Sirviendo {ruta} en http://127.0.0.1:{puerto}/")
+    servidor.serve_forever()
+
+
+if __name__ == "__main__":
+    # Fuente de prueba: python actualizador_precios.py precios.json [puerto]
+    import sys
+    if len(sys.argv) < 2:
+        print("Uso: python actualizador_precios.py archivo.json [puerto]")
+        sys.exit(1)
+    servir_archivo(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
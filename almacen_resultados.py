@@ -0,0 +1,185 @@
+import glob
+import hashlib
+import os
+from urllib.parse import unquote
+
+import pandas as pd
+
+# Almacén de resultados calculados en un dataset Parquet particionado (estilo Hive):
+#   <carpeta>/<tabla>/campana=2024/zona=Norte/cultivo=Maíz/<archivo>.parquet
+# Las consultas por campaña, zona o cultivo solo abren las carpetas que corresponden y
+# leen solo las columnas pedidas; los filtros sobre otras columnas (tarifa, escenario)
+# se resuelven con las estadísticas de cada grupo de filas.
+#
+# Cada guardado queda identificado por tabla, campaña, tarifa y escenario: volver a
+# guardar la misma combinación reemplaza los archivos anteriores (todos, o solo los de las
+# particiones que se vuelven a escribir).
+#
+# pyarrow se importa recién al leer o escribir: la aplicación crea el almacén al iniciar,
+# pero solo lo usa cuando se guardan o consultan resultados.
+
+VARIABLE_CARPETA = "MARGENES_RESULTADOS"
+CARPETA_DEFAULT = "resultados"
+PARTICIONES_DEFAULT = ["campana", "zona", "cultivo"]
+FILAS_POR_GRUPO = 64 * 1024
+
+
+def nombre_campana(campana):
+    """Campaña como texto: 2024 -> "2024/25"."""
+    return f"{int(campana)}/{(int(campana) + 1) % 100:02d}"
+
+
+def _esquema_particion(particiones):
+    # Particionado Hive con tipos fijos: campana entera y el resto texto
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([(c, pa.int64() if c == "campana" else pa.string()) for c in particiones]),
+                           flavor="hive")
+
+
+class AlmacenResultados:
+    """
+    Dataset Parquet particionado con los resultados de cada cálculo.
+
+    Parámetros:
+    - carpeta: Carpeta raíz del almacén (por defecto MARGENES_RESULTADOS o "resultados")
+    - filas_por_grupo: Filas por grupo de filas de Parquet (unidad mínima de lectura)
+    """
+
+    def __init__(self, carpeta=None, filas_por_grupo=FILAS_POR_GRUPO):
+        self.carpeta = carpeta or os.environ.get(VARIABLE_CARPETA, CARPETA_DEFAULT)
+        self.filas_por_grupo = filas_por_grupo
+
+    def _ruta(self, tabla):
+        return os.path.join(self.carpeta, tabla)
+
+    def _particiones(self, tabla):
+        # Particiones con las que se escribió la tabla (según las carpetas existentes, todas iguales)
+        nivel = [self._ruta(tabla)]
+        particiones = []
+        while True:
+            carpetas = [os.path.join(ruta, d) for ruta in nivel if os.path.isdir(ruta)
+                        for d in os.listdir(ruta) if os.path.isdir(os.path.join(ruta, d)) and "=" in d]
+            if not carpetas:
+                return particiones
+            columnas = {os.path.basename(d).split("=", 1)[0] for d in carpetas}
+            if len(columnas) > 1:
+                raise ValueError(f"La tabla {tabla} tiene particiones inconsistentes: " + ", ".join(sorted(columnas)))
+            particiones.append(columnas.pop())
+            nivel = carpetas
+
+    def guardar(self, tabla, df, campana, tarifa, escenario="base", particiones=None):
+        """
+        Guarda los resultados de una campaña, reemplazando los de la misma tarifa y escenario.
+
+        Parámetros:
+        - tabla: Nombre de la tabla (por ejemplo "lotes" o "rotaciones")
+        - df: DataFrame de resultados (debe tener las columnas de partición salvo campana)
+        - campana: Año de inicio de la campaña (2024 para la 2024/25)
+        - tarifa: Identificador de la tabla de fletes usada
+        - escenario: Nombre del escenario
+        - particiones: Columnas de partición (por defecto campana, zona y cultivo)
+
+        Retorna:
+        - Cantidad de filas guardadas
+        """
+        return self._escribir(tabla, df, campana, tarifa, escenario, particiones, solo_presentes=False)
+
+    def reemplazar_particiones(self, tabla, df, campana, tarifa, escenario="base", particiones=None):
+        """
+        Reemplaza solo las particiones presentes en df (por ejemplo, las zonas y cultivos con
+        lotes recalculados); el resto de lo guardado con la misma tarifa y escenario no se toca.
+
+        df debe traer todas las filas de cada partición que contiene. Mismos parámetros que guardar.
+
+        Retorna:
+        - Cantidad de filas guardadas
+        """
+        return self._escribir(tabla, df, campana, tarifa, escenario, particiones, solo_presentes=True)
+
+    def _escribir(self, tabla, df, campana, tarifa, escenario, particiones, solo_presentes):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        particiones = list(particiones or PARTICIONES_DEFAULT)
+        existentes = self._particiones(tabla)
+        if existentes and existentes != particiones:
+            raise ValueError(f"La tabla {tabla} está particionada por {', '.join(existentes)}")
+        df = df.assign(campana=int(campana), tarifa=str(tarifa), escenario=str(escenario),
+                       calculado=pd.Timestamp.now().floor("s"))
+        faltantes = [c for c in particiones if c not in df.columns]
+        if faltantes:
+            raise ValueError("Faltan columnas de partición: " + ", ".join(faltantes))
+
+        # Los archivos de un guardado llevan un prefijo propio de tarifa y escenario
+        prefijo = hashlib.sha1(f"{tarifa}\x00{escenario}".encode()).hexdigest()[:12]
+        patron = os.path.join(self._ruta(tabla), f"campana={int(campana)}", "**", f"{prefijo}-*.parquet")
+        otras = [c for c in particiones if c != "campana"]
+        presentes = set(df[otras].astype(str).itertuples(index=False, name=None)) if solo_presentes else None
+        for archivo in glob.glob(patron, recursive=True):
+            if presentes is None or self._valores_particion(archivo, otras) in presentes:
+                os.remove(archivo)
+
+        esquema_particion = _esquema_particion(particiones)
+        tabla_arrow = pa.Table.from_pandas(df.astype({c: str for c in otras}), preserve_index=False)
+        ds.write_dataset(
+            tabla_arrow, self._ruta(tabla), format="parquet", partitioning=esquema_particion,
+            basename_template=prefijo + "-{i}.parquet", existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_group=self.filas_por_grupo, min_rows_per_group=min(self.filas_por_grupo, len(df) or 1)
+        )
+        return len(df)
+
+    @staticmethod
+    def _valores_particion(archivo, columnas):
+        # Valores de partición de un archivo según sus carpetas columna=valor (codificadas como URI)
+        valores = dict(parte.split("=", 1) for parte in os.path.dirname(archivo).split(os.sep) if "=" in parte)
+        return tuple(unquote(valores.get(c, "")) for c in columnas)
+
+    def _dataset(self, tabla):
+        ruta = self._ruta(tabla)
+        if not os.path.isdir(ruta):
+            return None
+        import pyarrow.dataset as ds
+        # Esquema explícito: valores como zona "10" no se infieren como enteros
+        return ds.dataset(ruta, format="parquet", partitioning=_esquema_particion(self._particiones(tabla)))
+
+    def tablas(self):
+        """Tablas guardadas en el almacén."""
+        if not os.path.isdir(self.carpeta):
+            return []
+        return sorted(d for d in os.listdir(self.carpeta) if os.path.isdir(os.path.join(self.carpeta, d)))
+
+    def campanas(self, tabla):
+        """Campañas guardadas de una tabla (sin leer los datos)."""
+        ruta = self._ruta(tabla)
+        if not os.path.isdir(ruta):
+            return []
+        return sorted(int(d.split("=", 1)[1]) for d in os.listdir(ruta) if d.startswith("campana="))
+
+    def consultar(self, tabla, columnas=None, filtro=None, **filtros):
+        """
+        Lee resultados guardados, leyendo solo las particiones y columnas necesarias.
+
+        Parámetros:
+        - tabla: Nombre de la tabla
+        - columnas: Columnas a leer (None para todas)
+        - filtro: Expresión de pyarrow.dataset adicional (por ejemplo ds.field("superficie") > 100)
+        - filtros: Igualdades columna=valor (o lista de valores), por ejemplo campana=2024, cultivo="Maíz"
+
+        Retorna:
+        - DataFrame con los resultados (vacío si la tabla no existe)
+        """
+        dataset = self._dataset(tabla)
+        if dataset is None:
+            return pd.DataFrame(columns=columnas or [])
+        import pyarrow.dataset as ds
+        expresion = filtro
+        for columna, valor in filtros.items():
+            if valor is None:
+                continue
+            if isinstance(valor, (list, tuple, set)):
+                condicion = ds.field(columna).isin(list(valor))
+            else:
+                condicion = ds.field(columna) == valor
+            expresion = condicion if expresion is None else expresion & condicion
+        return dataset.to_table(columns=columnas, filter=expresion).to_pandas()
@@ -1,7 +1,33 @@
+import io
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 
+from calculos import calcular_margenes, calcular_margen_directo, matriz_escenarios, curvas_sensibilidad, calcular_elasticidades, riesgo_rotaciones, \
+    analisis_tornado, calcular_costo_flete_vectorizado, PARAMETROS_TORNADO
+from cache_calculos import obtener_cache, clave_canonica
+from actualizador_precios import obtener_actualizador, VARIABLE_FUENTE
+from arrendamientos import MotorArrendamientos, costo_contrato, factor_ocupacion, cargar_contratos, CONTRATO_DEFAULT, QQ_POR_TN
+from cartera import cargar_lotes, lotes_desde_comparativo, ESTRUCTURA_DEFAULT, COSECHA_DEFAULT, FRACCION_COMERCIALIZACION, KM_DEFAULT, \
+    PROPORCION_ARRENDADA_DEFAULT
+from tarifas import tabla_cosecha, tabla_labores, costo_labores, TARIFAS_COSECHA_DEFAULT, TARIFAS_LABORES_DEFAULT, \
+    KM_TRASLADO_DEFAULT
+from insumos import MatrizInsumos, INSUMOS_DEFAULT, RECETAS_DEFAULT, CATEGORIAS
+from comercializacion import motor_vigente, cargar_parametros, PARAMETROS_DEFAULT, PRODUCTO_CULTIVO
+from curvas_precios import CurvasPrecios, cargar_ajustes, MES_INICIO_CAMPANA
+from rendimientos_historicos import cargar_historial
+from rotaciones import ModeloRotaciones, simular_rotaciones, PLANES_DEFAULT
+from paralelo import obtener_ejecutor
+from almacen_resultados import AlmacenResultados, nombre_campana
+from vistas import VistaTabla, MedidorCarga, reducir_serie, barras_principales, FILAS_POR_PAGINA_DEFAULT
+from equilibrio import equilibrio_rendimiento, equilibrio_precio, equilibrio_flete_usd, distancia_maxima, equilibrios_cartera, margenes_lotes
+from cubo import CuboMargenes
+from memoria import huella_memoria
+from flujo_caja import FlujoCaja, escenarios_financieros, TASA_PESOS_ANUAL_DEFAULT, TASA_USD_ANUAL_DEFAULT, \
+    DEVALUACION_MENSUAL_DEFAULT, PLAZO_COBRO_DEFAULT, ESCENARIOS_DEFAULT
+from datos_base import tabla_comparativa, cargar_tabla_fletes, TIPO_CAMBIO_DEFAULT
+
 # IMPORTANTE: set_page_config DEBE ser el primer comando de Streamlit
 st.set_page_config(
     page_title="Calculadora de Márgenes Agrícolas",
@@ -10,121 +36,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Función para cargar y procesar la tabla de fletes
-def cargar_tabla_fletes():
-    # Definición de la tabla de fletes según la imagen proporcionada
-    # NOTA: La tabla indica $/TN, los valores están en pesos argentinos por tonelada
-    # El punto en estos valores es separador de miles, no decimal
-    data = """KM,$/TN,KM,$/TN,KM,$/TN,KM,$/TN,KM,$/TN,KM,$/TN
-5,7429,105,21465,205,32492,305,44598,405,54765,520,62717
-10,7429,110,21976,210,33051,310,45100,410,55135,540,63617
-15,8334,115,22487,215,33617,315,45603,415,55505,560,64494
-20,9331,120,23001,220,34186,320,46108,420,55876,580,65354
-25,10242,125,23523,225,34762,325,46613,425,56245,600,66192
-30,11267,130,24048,230,35344,330,47120,430,56615,620,67011
-35,11926,135,24576,235,35930,335,47631,435,56986,640,67811
-40,12609,140,25109,240,36519,340,48143,440,57356,660,68593
-45,13314,145,25649,245,37117,345,48654,445,57728,680,69358
-50,14048,150,26190,250,37718,350,49167,450,58095,700,70106
-55,14644,155,26742,255,38325,355,49685,455,58466,725,71509
-60,15253,160,27293,260,38942,360,50201,460,58836,750,72886
-65,15881,165,27853,265,39560,365,50718,465,59206,775,74241
-70,16526,170,28418,270,40187,370,51240,470,59574,800,75573
-75,17197,175,28988,275,40821,375,51762,475,59946,850,77598
-80,17889,180,29565,280,41460,380,52283,480,60316,900,79556
-85,18609,185,30147,285,42110,385,52809,485,60684,950,81444
-90,19359,190,30738,290,42763,390,53337,490,61054,1000,83271
-95,20141,195,31332,295,43426,395,57865,495,61426,1050,85462
-100,20962,200,31935,300,44096,400,54393,500,61794,1100,87551"""
-    
-    # Procesamos la tabla para convertirla en un DataFrame
-    # Primero construimos las listas de KM y $/TN
-    filas = data.strip().split('\n')
-    
-    # Primero procesamos el encabezado para saber cuántas columnas hay
-    encabezado = filas[0].split(',')
-    num_columnas = len(encabezado) // 2
-    
-    # Inicializamos listas para KM y tarifas
-    km_valores = []
-    tarifa_valores = []
-    
-    # Procesamos cada fila para extraer los pares KM, $/TN
-    for fila in filas[1:]:  # Saltamos la fila de encabezado
-        valores = fila.split(',')
-        for i in range(num_columnas):
-            idx_km = i * 2
-            idx_tarifa = idx_km + 1
-            if idx_tarifa < len(valores):  # Verificamos que no nos pasemos del límite
-                try:
-                    km = float(valores[idx_km])
-                    tarifa = float(valores[idx_tarifa])
-                    km_valores.append(km)
-                    tarifa_valores.append(tarifa)
-                except (ValueError, IndexError):
-                    pass  # Ignoramos valores que no podemos convertir
-    
-    # Creamos el DataFrame
-    df_fletes = pd.DataFrame({
-        'KM': km_valores,
-        'Tarifa_$/TN': tarifa_valores
-    })
-    
-    # Ordenamos por KM para asegurar que la interpolación funcione correctamente
-    df_fletes = df_fletes.sort_values('KM')
-    
-    return df_fletes
-
-# Función para calcular el costo del flete basado en la distancia
-def calcular_costo_flete(km, df_fletes, recargo=0):
-    """
-    Calcula el costo del flete por tonelada para una distancia dada.
-    Interpola valores para distancias que no están exactamente en la tabla.
-    
-    Parámetros:
-    - km: Distancia en kilómetros
-    - df_fletes: DataFrame con la tabla de fletes
-    - recargo: Porcentaje de recargo adicional (ej. girasol 20%)
-    
-    Retorna:
-    - Costo del flete por tonelada en pesos argentinos
-    """
-    try:
-        # Verificamos límites
-        if km <= df_fletes['KM'].min():
-            costo = df_fletes.loc[df_fletes['KM'] == df_fletes['KM'].min(), 'Tarifa_$/TN'].values[0]
-        elif km >= df_fletes['KM'].max():
-            costo = df_fletes.loc[df_fletes['KM'] == df_fletes['KM'].max(), 'Tarifa_$/TN'].values[0]
-        else:
-            # Buscar los valores cercanos en la tabla
-            # Encontrar el punto de la tabla más cercano por debajo
-            valor_inferior = df_fletes[df_fletes['KM'] <= km]['KM'].max()
-            # Encontrar el punto de la tabla más cercano por encima
-            valor_superior = df_fletes[df_fletes['KM'] >= km]['KM'].min()
-            
-            # Verificar que los valores no sean idénticos para evitar división por cero
-            if valor_superior == valor_inferior:
-                costo = df_fletes.loc[df_fletes['KM'] == valor_superior, 'Tarifa_$/TN'].values[0]
-            else:
-                # Obtener los costos correspondientes
-                costo_inferior = df_fletes.loc[df_fletes['KM'] == valor_inferior, 'Tarifa_$/TN'].values[0]
-                costo_superior = df_fletes.loc[df_fletes['KM'] == valor_superior, 'Tarifa_$/TN'].values[0]
-                
-                # Interpolación lineal
-                # (y - y1) / (x - x1) = (y2 - y1) / (x2 - x1)
-                # y = y1 + (x - x1) * (y2 - y1) / (x2 - x1)
-                costo = costo_inferior + (km - valor_inferior) * (costo_superior - costo_inferior) / (valor_superior - valor_inferior)
-        
-        # Aplicar recargo si corresponde
-        if recargo > 0:
-            costo = costo * (1 + recargo/100)
-        
-        return costo
-    except Exception as e:
-        # En caso de error, devolver un valor predeterminado y mostrar advertencia
-        st.warning(f"Error al calcular el costo del flete: {str(e)}. Usando valor predeterminado de 30000.")
-        return 30000.0  # Valor predeterminado en caso de error
-
 # Título y descripción
 st.title("📊 Calculadora de Márgenes Agrícolas")
 st.markdown("""
@@ -132,21 +43,60 @@ Esta aplicación te permite calcular los márgenes de diferentes cultivos,
 considerando costos directos y características específicas de cada producción.
 """)
 
-# Datos de ejemplo basados en la tabla proporcionada
-datos_cultivos = {
-    "Variable": ["Superficie Ha", "Rendimiento tn", "USD/tn", "Ingreso Bruto / ha", 
-                "Total costos directos / ha", "Margen Bruto / ha", "Margen Directo / ha"],
-    "Soja 1ra": [1199, 3.2, 290, 939, 279, 296, 137],
-    "Maíz": [1015, 7.7, 168, 1290, 456, 200, 40],
-    "Trigo": [346, 3.6, 198, 722, 312, 98, 19],
-    "Soja 2da": [309, 2.1, 290, 621, 205, 158, 78],
-    "Maíz 2da": [37, 6.5, 168, 1097, 369, 203, 123],
-    "Maíz Tardío": [120, 6.0, 168, 1008, 369, 180, 100],  # Agregamos Maíz Tardío
-    "Girasol": [101, 2.4, 293, 714, 286, 182, 23]
-}
+# Crear DataFrame (datos de ejemplo basados en la tabla proporcionada)
+df_comparativo = tabla_comparativa()
+
+# Caché compartido entre sesiones para márgenes y análisis de sensibilidad
+cache = obtener_cache()
+
+# Medidas del cubo de la cartera (montos en USD por lote)
+MEDIDAS_CUBO_CARTERA = ["superficie", "ingreso_bruto", "costos_directos", "comercializacion", "estructura",
+                        "cosecha", "flete", "arrendamiento", "margen_bruto", "margen_directo"]
+
+# Almacén de resultados guardados por campaña
+almacen = AlmacenResultados()
+hoy = pd.Timestamp.today()
+campana_actual = hoy.year if hoy.month >= MES_INICIO_CAMPANA else hoy.year - 1
+
+# Precios y tipo de cambio actualizados en segundo plano (si hay una fuente configurada).
+# Solo se lee la última instantánea: la página nunca espera a la fuente.
+actualizador = obtener_actualizador()
+tipo_cambio_referencia = actualizador.instantanea.tipo_cambio(TIPO_CAMBIO_DEFAULT) if actualizador else TIPO_CAMBIO_DEFAULT
+
+# Datos enviados al navegador en esta ejecución (tablas y gráficos)
+medidor = MedidorCarga()
+
+# Tablas grandes de la sesión (para el informe de memoria)
+tablas_sesion = {}
+
+
+def mostrar_tabla(df, clave=None, filas_por_pagina=FILAS_POR_PAGINA_DEFAULT, **kwargs):
+    """
+    Muestra una tabla registrando su tamaño. Con clave, las tablas de más de una página se
+    ordenan, filtran y paginan en el servidor y solo se envía la página visible.
+    """
+    if clave is None or len(df) <= filas_por_pagina:
+        st.dataframe(medidor.registrar(clave or "tabla", df), **kwargs)
+        return
+    vista = cache.memoizar("vista_tabla", VistaTabla, df)
+    col1, col2, col3, col4 = st.columns([3, 3, 1, 2])
+    buscar = col1.text_input("Buscar", key=clave + "_buscar")
+    orden = col2.selectbox("Ordenar por", ["(original)"] + vista.columnas, key=clave + "_orden")
+    descendente = col3.checkbox("Desc.", key=clave + "_desc")
+    total_filas = len(vista.filas(buscar))
+    paginas = max(1, -(-total_filas // filas_por_pagina))
+    numero = col4.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, step=1, key=clave + "_pagina")
+    df_pagina, total_filas, numero = vista.pagina(numero - 1, filas_por_pagina, buscar,
+                                                  None if orden == "(original)" else orden, not descendente)
+    st.dataframe(medidor.registrar(clave, df_pagina), **kwargs)
+    desde = numero * filas_por_pagina + 1 if total_filas else 0
+    st.caption(f"Filas {desde}-{min(total_filas, (numero + 1) * filas_por_pagina)} de {total_filas}")
+
+
+def mostrar_grafico(grafico, datos, nombre="gráfico"):
+    """Muestra un gráfico de Streamlit (st.bar_chart, st.line_chart) registrando su tamaño."""
+    grafico(medidor.registrar(nombre, datos))
 
-# Crear DataFrame
-df_comparativo = pd.DataFrame(datos_cultivos)
 
 # Inicializar estado para rotaciones si no existe
 if 'rotaciones' not in st.session_state:
@@ -165,7 +115,7 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs(["Tabla Comparativa", "Calculadora", "Rot
 # Pestaña 1: Tabla Comparativa
 with tab1:
     st.header("Tabla Comparativa de Cultivos")
-    st.dataframe(df_comparativo, hide_index=True, use_container_width=True)
+    mostrar_tabla(df_comparativo, hide_index=True, use_container_width=True)
     
     # Extraer datos para gráficos
     cultivos = list(df_comparativo.columns)[1:]  # Excluir la columna "Variable"
@@ -181,12 +131,12 @@ with tab1:
     # Gráfico de Margen Bruto
     st.subheader("Margen Bruto por Cultivo (USD/ha)")
     chart_data_bruto = pd.DataFrame({"Margen Bruto": margen_bruto}, index=cultivos)
-    st.bar_chart(chart_data_bruto)
+    mostrar_grafico(st.bar_chart, chart_data_bruto)
     
     # Gráfico de Margen Directo
     st.subheader("Margen Directo por Cultivo (USD/ha)")
     chart_data_directo = pd.DataFrame({"Margen Directo": margen_directo}, index=cultivos)
-    st.bar_chart(chart_data_directo)
+    mostrar_grafico(st.bar_chart, chart_data_directo)
 
 # Pestaña 2: Calculadora
 with tab2:
@@ -209,6 +159,8 @@ with tab2:
         superficie_default = df_comparativo.iloc[idx_superficie][cultivo]
         rendimiento_default = df_comparativo.iloc[idx_rendimiento][cultivo]
         precio_default = df_comparativo.iloc[idx_precio][cultivo]
+        if actualizador:
+            precio_default = actualizador.instantanea.precio(PRODUCTO_CULTIVO[cultivo], precio_default)
         
         # Campos de entrada
         superficie = st.number_input("Superficie (Ha)", min_value=0, value=int(superficie_default), step=1)
@@ -221,11 +173,27 @@ with tab2:
         idx_costos_directos = df_comparativo[df_comparativo["Variable"] == "Total costos directos / ha"].index[0]
         costos_default = df_comparativo.iloc[idx_costos_directos][cultivo]
         
-        # Desglose de costos (valores de ejemplo para esta versión simplificada)
-        costo_labranza = st.number_input("Costo Labranza (USD/ha)", min_value=0, value=int(costos_default * 0.2), step=1)
-        costo_semilla = st.number_input("Costo Semilla (USD/ha)", min_value=0, value=int(costos_default * 0.3), step=1)
-        costo_agroquimicos = st.number_input("Costo Agroquímicos (USD/ha)", min_value=0, value=int(costos_default * 0.3), step=1)
-        costo_fertilizantes = st.number_input("Costo Fertilizantes (USD/ha)", min_value=0, value=int(costos_default * 0.2), step=1)
+        # Origen de los valores por defecto del desglose de costos
+        origen_costos = st.radio("Origen de los costos", ["Desglose por defecto", "Receta de insumos"])
+        
+        # Matriz dispersa cultivo x insumo (se arma una vez y se comparte entre sesiones)
+        matriz_insumos = cache.memoizar("matriz_insumos", MatrizInsumos, RECETAS_DEFAULT, INSUMOS_DEFAULT)
+        precios_insumos_actuales = None
+        
+        if origen_costos == "Receta de insumos":
+            with st.expander("Precios de insumos (USD/unidad)"):
+                df_precios_insumos = st.data_editor(INSUMOS_DEFAULT, hide_index=True, disabled=["insumo", "categoria", "unidad"], key="precios_insumos")
+            precios_insumos_actuales = df_precios_insumos["precio"].to_numpy(dtype=float)
+            desglose_insumos = matriz_insumos.costos_por_categoria(precios_insumos_actuales).loc[cultivo]
+            costos_por_categoria = [desglose_insumos[categoria] for categoria in CATEGORIAS]
+        else:
+            # Desglose de costos (valores de ejemplo para esta versión simplificada)
+            costos_por_categoria = [costos_default * 0.2, costos_default * 0.3, costos_default * 0.3, costos_default * 0.2]
+        
+        costo_labranza = st.number_input("Costo Labranza (USD/ha)", min_value=0, value=int(costos_por_categoria[0]), step=1)
+        costo_semilla = st.number_input("Costo Semilla (USD/ha)", min_value=0, value=int(costos_por_categoria[1]), step=1)
+        costo_agroquimicos = st.number_input("Costo Agroquímicos (USD/ha)", min_value=0, value=int(costos_por_categoria[2]), step=1)
+        costo_fertilizantes = st.number_input("Costo Fertilizantes (USD/ha)", min_value=0, value=int(costos_por_categoria[3]), step=1)
         
         # Sumar todos los costos
         total_costos_directos = costo_labranza + costo_semilla + costo_agroquimicos + costo_fertilizantes
@@ -233,28 +201,68 @@ with tab2:
     with col3:
         st.subheader("Otros gastos")
         # Cálculo de otros gastos (valores de ejemplo)
-        costos_comercializacion = st.number_input("Gastos Comercialización (USD/ha)", min_value=0, value=int(precio_default * rendimiento_default * 0.1), step=1)
-        costos_estructura = st.number_input("Estructura (USD/ha)", min_value=0, value=50, step=1)
-        costos_cosecha = st.number_input("Cosecha (USD/ha)", min_value=0, value=90, step=1)
+        # Comercialización: 10% del ingreso por defecto, o retenciones y gastos de venta por cultivo
+        motor_comercializacion = cache.memoizar("motor_comercializacion", motor_vigente, PARAMETROS_DEFAULT)
+        usar_motor_comercializacion = st.checkbox("Calcular con retenciones y gastos de venta")
+        if usar_motor_comercializacion:
+            precio_es_fob = st.checkbox("El precio ingresado es FOB (descontar retenciones)")
+            comercial = motor_comercializacion.aplicar(cultivo, precio, rendimiento, precio_es_fob)
+            comercializacion_default = comercial["comercializacion_ha"][0]
+            if precio_es_fob:
+                st.info(f"Retenciones: USD {comercial['retencion_usd_tn'][0]:.1f}/tn | Precio FAS: USD {comercial['precio_fas'][0]:.1f}/tn")
+                # A partir de aquí el precio es el FAS (neto de retenciones)
+                precio = round(float(comercial["precio_fas"][0]), 2)
+        else:
+            comercializacion_default = precio_default * rendimiento_default * 0.1
+        costos_comercializacion = st.number_input("Gastos Comercialización (USD/ha)", min_value=0, value=int(comercializacion_default), step=1)
+        costos_estructura = st.number_input("Estructura (USD/ha)", min_value=0, value=ESTRUCTURA_DEFAULT, step=1)
+        
+        # Cosecha: valor fijo o tarifa del contratista según cultivo, rinde y distancia de traslado
+        tabla_tarifas_cosecha = cache.memoizar("tabla_cosecha", tabla_cosecha, TARIFAS_COSECHA_DEFAULT)
+        usar_tarifa_cosecha = st.checkbox("Cosecha según tarifa de contratista")
+        if usar_tarifa_cosecha:
+            km_contratista = st.number_input("Traslado del contratista (km)", min_value=0, value=50, step=10)
+            cosecha_default = tabla_tarifas_cosecha.consultar([[cultivo]], [rendimiento], [km_contratista])[0]
+        else:
+            cosecha_default = COSECHA_DEFAULT
+        costos_cosecha = st.number_input("Cosecha (USD/ha)", min_value=0, value=int(cosecha_default), step=1)
         
-        # Arrendamiento (simplificado)
-        tipo_arrendamiento = st.radio("Tipo de Arrendamiento", ["Dólares por hectárea", "Quintales de soja"])
+        # Arrendamiento según tipo de contrato
+        tipo_arrendamiento = st.radio("Tipo de Arrendamiento", ["Dólares por hectárea", "Quintales de soja", "Porcentaje de la cosecha", "Mixto"])
+        porcentaje_arrendamiento = 0.0
         
         if tipo_arrendamiento == "Dólares por hectárea":
             valor_arrendamiento = st.number_input("Arrendamiento (USD/ha)", min_value=0, value=160, step=10)
             arrendamiento = valor_arrendamiento
-        else:
+        elif tipo_arrendamiento == "Quintales de soja":
             qq_arrendamiento = st.number_input("Arrendamiento (qq soja/ha)", min_value=0, value=15, step=1)
             precio_qq_soja = st.number_input("Precio quintal soja (USD/qq)", min_value=0, value=29, step=1)
             arrendamiento = qq_arrendamiento * precio_qq_soja
             st.info(f"Arrendamiento equivalente: USD {arrendamiento}/ha")
+        elif tipo_arrendamiento == "Porcentaje de la cosecha":
+            porcentaje_arrendamiento = st.number_input("Arrendamiento (% de la cosecha)", min_value=0.0, max_value=100.0, value=30.0, step=1.0)
+            arrendamiento = costo_contrato(porcentaje_cosecha=porcentaje_arrendamiento, rendimiento=rendimiento, precio=precio)
+            st.info(f"Arrendamiento equivalente: USD {arrendamiento:.0f}/ha")
+        else:
+            valor_arrendamiento = st.number_input("Componente fijo (USD/ha)", min_value=0, value=50, step=10)
+            qq_arrendamiento = st.number_input("Componente en quintales (qq soja/ha)", min_value=0, value=5, step=1)
+            precio_qq_soja = st.number_input("Precio quintal soja (USD/qq)", min_value=0, value=29, step=1)
+            porcentaje_arrendamiento = st.number_input("Componente en cosecha (% de la cosecha)", min_value=0.0, max_value=100.0, value=10.0, step=1.0)
+            arrendamiento = costo_contrato(valor_arrendamiento, qq_arrendamiento, porcentaje_arrendamiento,
+                                           precio_qq_soja * QQ_POR_TN, rendimiento, precio)
+            st.info(f"Arrendamiento equivalente: USD {arrendamiento:.0f}/ha")
+        
+        # Proporción de hectáreas arrendadas
+        porcentaje_arrendadas = st.number_input("Superficie arrendada (%)", min_value=0, max_value=100, value=30, step=5)
+        proporcion_arrendadas = porcentaje_arrendadas / 100
     
     # Nueva sección: Costos de flete
     st.markdown("---")
     st.subheader("Costos de Flete")
     
-    # Cargamos la tabla de fletes
+    # Cargamos la tabla de fletes (su identificador acompaña a los resultados guardados)
     df_fletes = cargar_tabla_fletes()
+    tarifa_fletes = clave_canonica("tarifa_fletes", df_fletes)[:12]
     
     # Tipo de cálculo de flete
     tipo_flete = st.radio("Método de cálculo del flete", 
@@ -262,7 +270,7 @@ with tab2:
     
     # Contenedor para mostrar la tabla de referencia
     with st.expander("Ver tabla de referencia de fletes"):
-        st.dataframe(df_fletes, hide_index=True)
+        mostrar_tabla(df_fletes, hide_index=True)
         st.caption("Fuente: FADEEAC ABRIL 2025")
         st.caption("Recargos: girasol 20%, avena 10%, caminos de tierra 20%")
     
@@ -315,7 +323,7 @@ with tab2:
             aplicar_recargo_tierra = st.checkbox("Aplicar recargo caminos de tierra (20%)", value=False)
             
             # Tipo de cambio 
-            tipo_cambio = st.number_input("Tipo de cambio ($/USD)", min_value=1.0, value=950.0, step=10.0)
+            tipo_cambio = st.number_input("Tipo de cambio ($/USD)", min_value=1.0, value=float(tipo_cambio_referencia), step=10.0)
             
             # Determinamos el recargo según el cultivo
             recargo_total = 0
@@ -327,7 +335,7 @@ with tab2:
                 recargo_total += 20
             
             # Calculamos el costo
-            costo_ars = calcular_costo_flete(km_actual, df_fletes, recargo_total)
+            costo_ars = calcular_costo_flete_vectorizado(km_actual, df_fletes['KM'].to_numpy(), df_fletes['Tarifa_$/TN'].to_numpy(), recargo_total)
             # Convertimos de pesos a dólares usando el tipo de cambio
             costo_flete_usd_tn = costo_ars / tipo_cambio
             
@@ -346,7 +354,7 @@ with tab2:
         
         with col1:
             flete_ars = st.number_input("Costo de flete ($/tn)", min_value=0.0, value=30000.0, step=1000.0)
-            tipo_cambio = st.number_input("Tipo de cambio ($/USD)", min_value=1.0, value=950.0, step=10.0)
+            tipo_cambio = st.number_input("Tipo de cambio ($/USD)", min_value=1.0, value=float(tipo_cambio_referencia), step=10.0)
             # Convertimos de pesos a dólares
             costo_flete_usd_tn = flete_ars / tipo_cambio
             
@@ -354,15 +362,25 @@ with tab2:
     
     else:  # Ingreso manual (USD/tn)
         costo_flete_usd_tn = st.number_input("Costo de flete (USD/tn)", min_value=0.0, value=31.5, step=0.5)
-        tipo_cambio = st.number_input("Tipo de cambio ($/USD)", min_value=1.0, value=950.0, step=10.0) 
+        tipo_cambio = st.number_input("Tipo de cambio ($/USD)", min_value=1.0, value=float(tipo_cambio_referencia), step=10.0) 
         # Convertimos de dólares a pesos
         flete_ars = costo_flete_usd_tn * tipo_cambio
         
         st.info(f"Equivalente a $ {flete_ars:.2f}/tn")
     
     # Cálculos
+    # Factor de ocupación (los cultivos de 2da pagan medio año de arrendamiento)
+    arrendamiento_ajustado = arrendamiento * factor_ocupacion(cultivo)
+    
+    # Márgenes por hectárea (se reutilizan desde el caché si la configuración ya fue calculada)
+    margenes = cache.memoizar(
+        "margenes", calcular_margenes,
+        rendimiento, precio, total_costos_directos, costos_comercializacion, costos_estructura,
+        costos_cosecha, costo_flete_usd_tn, arrendamiento_ajustado * proporcion_arrendadas
+    )
+    
     # Ingresos
-    ingreso_bruto_ha = rendimiento * precio
+    ingreso_bruto_ha = margenes["ingreso_bruto_ha"]
     ingreso_bruto_total = ingreso_bruto_ha * superficie
     
     # Costos
@@ -370,32 +388,24 @@ with tab2:
     gastos_comercializacion_total = costos_comercializacion * superficie
     estructura_total = costos_estructura * superficie
     cosecha_total = costos_cosecha * superficie
-    
-    # Factor de ocupación (simplificado)
-    factor_ocupacion = 0.5 if "2da" in cultivo else 1.0
-    arrendamiento_ajustado = arrendamiento * factor_ocupacion
-    
-    # Calcular proporción de hectáreas arrendadas (simplificado para esta versión)
-    proporcion_arrendadas = 0.3  # Asumimos 30% de hectáreas arrendadas
     arrendamiento_total = arrendamiento_ajustado * superficie * proporcion_arrendadas
     
     # Costo de flete por hectárea y total
     # La tabla muestra valores en $/TN (pesos por tonelada)
     # Convertimos a USD/TN para usar en los cálculos
-    costo_flete_ha = rendimiento * costo_flete_usd_tn
+    costo_flete_ha = margenes["costo_flete_ha"]
     costo_flete_total = costo_flete_ha * superficie
     
     # Margen bruto (ahora restando el flete)
-    margen_bruto_ha = ingreso_bruto_ha - total_costos_directos - costos_comercializacion - costos_estructura - costos_cosecha - costo_flete_ha
+    margen_bruto_ha = margenes["margen_bruto_ha"]
     margen_bruto_total = margen_bruto_ha * superficie
     
     # Margen directo (considerando arrendamiento)
-    margen_directo_ha = margen_bruto_ha - (arrendamiento_ajustado * proporcion_arrendadas)
+    margen_directo_ha = margenes["margen_directo_ha"]
     margen_directo_total = margen_directo_ha * superficie
     
     # Retorno sobre costos
-    costos_totales_ha = total_costos_directos + costos_comercializacion + costos_estructura + costos_cosecha + costo_flete_ha + (arrendamiento_ajustado * proporcion_arrendadas)
-    retorno_costos = (margen_directo_ha / costos_totales_ha) * 100 if costos_totales_ha > 0 else 0
+    retorno_costos = margenes["retorno_costos"]
     
     # Mostrar resultados
     st.markdown("---")
@@ -431,7 +441,7 @@ with tab2:
     df_resultados = pd.DataFrame(data, columns=["Concepto", "Valor"])
     
     # Mostrar la tabla
-    st.dataframe(df_resultados, hide_index=True, use_container_width=True)
+    mostrar_tabla(df_resultados, hide_index=True, use_container_width=True)
     
     # Visualizaciones
     st.subheader("Visualizaciones")
@@ -449,7 +459,229 @@ with tab2:
         ]
     }, index=['Costos Directos', 'Comercialización', 'Estructura', 'Cosecha', 'Flete', 'Arrendamiento', 'Margen Directo'])
     
-    st.bar_chart(chart_data)
+    mostrar_grafico(st.bar_chart, chart_data)
+    
+    # Puntos de equilibrio (margen directo = 0) para el cultivo seleccionado
+    st.subheader("Punto de Equilibrio")
+    # El arrendamiento a porcentaje acompaña al ingreso: va como deducción y solo la parte fija como costo por hectárea
+    deduccion_arrendamiento = porcentaje_arrendamiento / 100 * factor_ocupacion(cultivo) * proporcion_arrendadas
+    arrendamiento_fijo_ha = arrendamiento_ajustado * proporcion_arrendadas - deduccion_arrendamiento * rendimiento * precio
+    costos_fijos_ha = total_costos_directos + costos_comercializacion + costos_estructura + costos_cosecha + arrendamiento_fijo_ha
+    rinde_equilibrio = equilibrio_rendimiento(precio, costos_fijos_ha, costo_flete_usd_tn, deduccion_arrendamiento)
+    precio_equilibrio = equilibrio_precio(rendimiento, costos_fijos_ha, costo_flete_usd_tn, deduccion_arrendamiento)
+    flete_maximo_usd = equilibrio_flete_usd(rendimiento, precio, costos_fijos_ha, deduccion_arrendamiento)
+    recargo_equilibrio = recargo_total if tipo_flete == "Tabla FADEEAC (por km)" else 0
+    distancia_equilibrio = distancia_maxima(flete_maximo_usd * tipo_cambio / (1 + recargo_equilibrio/100), df_fletes['KM'], df_fletes['Tarifa_$/TN'])
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Rinde de equilibrio", f"{rinde_equilibrio:.2f} tn/ha")
+    col2.metric("Precio de equilibrio", f"USD {precio_equilibrio:.0f}/tn")
+    col3.metric("Flete máximo", f"USD {flete_maximo_usd:.2f}/tn")
+    col4.metric("Distancia máxima", "Sin límite" if np.isinf(distancia_equilibrio) else f"{distancia_equilibrio:.0f} km")
+    st.caption("Cada valor se calcula manteniendo constantes las demás variables y los costos por hectárea.")
+    
+    # Arrendamientos y puntos de equilibrio de toda la cartera de lotes
+    with st.expander("Cartera de lotes: arrendamientos y puntos de equilibrio"):
+        st.markdown("""
+        Carga la tabla de lotes (columnas: lote, cultivo, superficie y opcionalmente zona, rendimiento,
+        precio, km, proporcion_arrendada, contrato) y la tabla de contratos (columnas: contrato, tipo,
+        usd_ha, qq_soja_ha, porcentaje_cosecha). Sin archivos se usa un lote por cultivo con el contrato por defecto.
+        Opcionalmente, los parámetros de comercialización (retenciones y gastos de venta) reemplazan a los de ejemplo.
+        """)
+        archivo_lotes = st.file_uploader("Tabla de lotes (CSV)", type="csv", key="archivo_lotes")
+        archivo_contratos = st.file_uploader("Tabla de contratos (CSV)", type="csv", key="archivo_contratos")
+        archivo_parametros = st.file_uploader("Parámetros de comercialización (CSV)", type="csv", key="archivo_parametros")
+        try:
+            df_lotes = cargar_lotes(archivo_lotes, df_comparativo) if archivo_lotes else lotes_desde_comparativo(df_comparativo)
+            df_contratos = cargar_contratos(archivo_contratos) if archivo_contratos else pd.DataFrame([CONTRATO_DEFAULT])
+            motor_cartera = motor_vigente(cargar_parametros(archivo_parametros)) if archivo_parametros else motor_comercializacion
+            
+            # Precios del mes de cosecha de cada lote desde las curvas de futuros (archivos de ajustes)
+            archivos_ajustes = st.file_uploader("Ajustes de futuros (CSV: fecha, producto, mes_entrega, ajuste)", type="csv",
+                                                accept_multiple_files=True, key="archivos_ajustes")
+            if archivos_ajustes:
+                df_ajustes = cargar_ajustes(archivos_ajustes)
+                curvas_precios = cache.memoizar("curvas_precios", CurvasPrecios, df_ajustes)
+                col1, col2 = st.columns(2)
+                fecha_ajuste = col1.date_input("Fecha de los precios", value=pd.Timestamp(df_ajustes["fecha"].max()).date())
+                anio_campana = col2.number_input("Campaña (año de inicio)", min_value=2000, max_value=2100, step=1,
+                                                 value=fecha_ajuste.year if fecha_ajuste.month >= MES_INICIO_CAMPANA else fecha_ajuste.year - 1)
+                precios_futuros = curvas_precios.precios_lotes(df_lotes["cultivo"], fecha_ajuste, anio_campana)
+                if np.isnan(precios_futuros).any():
+                    st.warning("Algunos cultivos no tienen ajustes a esa fecha; se mantiene su precio de la tabla.")
+                df_lotes = df_lotes.assign(precio=np.where(np.isnan(precios_futuros), df_lotes["precio"], precios_futuros))
+            motor_arrendamientos = cache.memoizar("motor_arrendamientos", MotorArrendamientos, df_lotes, df_contratos)
+            
+            precio_soja_cartera = st.number_input("Precio soja (USD/tn)", min_value=0.0, value=float(df_comparativo.iloc[idx_precio]["Soja 1ra"]), step=5.0)
+            df_arrendamientos = motor_arrendamientos.resumen(precio_soja_cartera)
+            mostrar_tabla(df_arrendamientos, "tabla_arrendamientos", hide_index=True, use_container_width=True)
+            st.info(f"Arrendamiento total de la cartera: USD {df_arrendamientos['Arrendamiento Total (USD)'].sum():,.0f}")
+            
+            # Retenciones: un cambio de alícuotas se vuelve a precificar en toda la cartera de una vez
+            st.markdown("**Retenciones por cultivo (%)**")
+            retenciones_vigentes = motor_cartera.retenciones()
+            df_retenciones = pd.DataFrame({
+                "Cultivo": list(retenciones_vigentes),
+                "Retención (%)": list(retenciones_vigentes.values())
+            })
+            df_retenciones = st.data_editor(df_retenciones, hide_index=True, disabled=["Cultivo"], key="retenciones_cartera")
+            motor_retenciones = motor_cartera.con_retenciones(dict(zip(df_retenciones["Cultivo"], df_retenciones["Retención (%)"])))
+            precios_repreciados = motor_cartera.reprecio(motor_retenciones, df_lotes["cultivo"], df_lotes["precio"])
+            if not np.allclose(precios_repreciados, df_lotes["precio"]):
+                mostrar_tabla(pd.DataFrame({
+                    "Lote": df_lotes["lote"],
+                    "Cultivo": df_lotes["cultivo"],
+                    "Precio actual (USD/tn)": df_lotes["precio"],
+                    "Precio con nuevas retenciones (USD/tn)": precios_repreciados
+                }), clave="df_repreciados", hide_index=True, use_container_width=True)
+                df_lotes = df_lotes.assign(precio=precios_repreciados)
+            
+            # Mapa de equilibrio: rinde, precio y distancia máxima de cada lote
+            arrendamiento_fijo, fraccion_arrendamiento = motor_arrendamientos.componentes(precio_soja_cartera)
+            # Con receta de insumos, los costos directos de todos los lotes salen de un único producto disperso;
+            # la labranza queda fuera porque se cotiza con la tarifa de labores del contratista
+            costos_directos_lotes = None
+            if precios_insumos_actuales is not None:
+                precios_sin_labranza = np.where(INSUMOS_DEFAULT["categoria"] == "Labranza", 0.0, precios_insumos_actuales)
+                costos_directos_lotes = matriz_insumos.costos_lotes(df_lotes["cultivo"], precios_sin_labranza)
+            
+            # Costos de contratistas por lote (cosecha por cultivo, rinde y distancia; labores por pasadas de la receta)
+            km_contratista_cartera = st.number_input("Traslado de contratistas (km)", min_value=0, value=KM_TRASLADO_DEFAULT, step=10, key="km_contratista_cartera")
+            cosecha_lotes = tabla_tarifas_cosecha.consultar([df_lotes["cultivo"]], df_lotes["rendimiento"], km_contratista_cartera)
+            tabla_tarifas_labores = cache.memoizar("tabla_labores", tabla_labores, TARIFAS_LABORES_DEFAULT)
+            pasadas = matriz_insumos.densa()[TARIFAS_LABORES_DEFAULT["labor"].unique()]
+            labores_lotes = costo_labores(tabla_tarifas_labores, pasadas, df_lotes["cultivo"], km_contratista_cartera)
+            mostrar_tabla(pd.DataFrame({
+                "Lote": df_lotes["lote"],
+                "Cultivo": df_lotes["cultivo"],
+                "Cosecha (USD/ha)": cosecha_lotes,
+                "Labores (USD/ha)": labores_lotes
+            }), clave="df_contratistas", hide_index=True, use_container_width=True)
+            
+            df_equilibrios = equilibrios_cartera(df_lotes, df_comparativo, df_fletes['KM'].to_numpy(), df_fletes['Tarifa_$/TN'].to_numpy(),
+                                                 tipo_cambio, arrendamiento_fijo, fraccion_arrendamiento, costos_directos_lotes,
+                                                 cosecha_lotes, labores_lotes, motor_retenciones)
+            mostrar_tabla(df_equilibrios, "tabla_equilibrios", hide_index=True, use_container_width=True)
+            tablas_sesion.update({"Lotes": df_lotes, "Equilibrios por lote": df_equilibrios})
+            
+            # Cubo de la cartera: se actualiza solo con los lotes que cambiaron desde la ejecución anterior
+            df_margenes_lotes = margenes_lotes(df_lotes, df_comparativo, df_fletes['KM'].to_numpy(), df_fletes['Tarifa_$/TN'].to_numpy(),
+                                               tipo_cambio, arrendamiento_fijo, fraccion_arrendamiento, costos_directos_lotes,
+                                               cosecha_lotes, labores_lotes, motor_retenciones)
+            df_margenes_lotes["id"] = df_margenes_lotes["lote"].astype(str) + " | " + df_margenes_lotes["cultivo"].astype(str)
+            if "cubo_cartera" not in st.session_state:
+                st.session_state.cubo_cartera = CuboMargenes(["zona", "lote", "cultivo"], MEDIDAS_CUBO_CARTERA)
+            cubo_cartera = st.session_state.cubo_cartera
+            cubo_cartera.quitar(set(cubo_cartera.ids) - set(df_margenes_lotes["id"]))
+            cubo_cartera.actualizar(df_margenes_lotes, "id")
+            
+            st.markdown("**Navegar la cartera (campo → zona → lote → cultivo)**")
+            col1, col2 = st.columns(2)
+            zona_cubo = col1.selectbox("Zona", ["Todas"] + cubo_cartera.valores("zona"), key="zona_cubo")
+            zona_cubo = None if zona_cubo == "Todas" else zona_cubo
+            lote_cubo = col2.selectbox("Lote", ["Todos"] + cubo_cartera.valores("lote", zona=zona_cubo), key="lote_cubo")
+            lote_cubo = None if lote_cubo == "Todos" else lote_cubo
+            nivel_cubo = "zona" if zona_cubo is None else ("lote" if lote_cubo is None else "cultivo")
+            totales_cubo = cubo_cartera.total(zona=zona_cubo, lote=lote_cubo)
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Superficie", f"{totales_cubo['superficie']:,.0f} ha")
+            col2.metric("Margen Directo Total", f"USD {totales_cubo['margen_directo']:,.0f}")
+            col3.metric("Margen Directo / ha", f"USD {totales_cubo['margen_directo'] / totales_cubo['superficie']:,.0f}"
+                        if totales_cubo["superficie"] > 0 else "-")
+            df_desglose = cubo_cartera.desglose(nivel_cubo, zona=zona_cubo, lote=lote_cubo).drop(columns="filas")
+            df_desglose["margen_directo_ha"] = df_desglose["margen_directo"] / df_desglose["superficie"].where(df_desglose["superficie"] > 0)
+            mostrar_tabla(df_desglose, "tabla_desglose", hide_index=True, use_container_width=True)
+            # Gráficos reducidos en el servidor: las categorías principales y la curva de márgenes con
+            # a lo sumo unos cientos de puntos, aunque la cartera tenga miles de lotes
+            mostrar_grafico(st.bar_chart, barras_principales(df_desglose.set_index(nivel_cubo)["margen_directo"]),
+                            "barras_desglose")
+            orden_margen = df_margenes_lotes.assign(
+                md_ha=df_margenes_lotes["margen_directo"] / df_margenes_lotes["superficie"].where(df_margenes_lotes["superficie"] > 0)
+            ).dropna(subset=["md_ha"]).sort_values("md_ha", ascending=False, kind="stable")
+            if len(orden_margen) > 1:
+                x_curva, y_curva = reducir_serie(orden_margen["superficie"].cumsum().to_numpy(), orden_margen["md_ha"].to_numpy())
+                st.caption("Margen directo por hectárea de los lotes, de mayor a menor, contra la superficie acumulada")
+                mostrar_grafico(st.line_chart, pd.DataFrame({"Superficie acumulada (ha)": x_curva,
+                                                             "Margen Directo (USD/ha)": y_curva}).set_index("Superficie acumulada (ha)"),
+                                "curva_margenes")
+            
+            # Flujo de caja mensual de la cartera y su financiamiento bajo muchos caminos de tipo de cambio y tasa
+            st.markdown("**Flujo de caja y financiamiento**")
+            col1, col2, col3, col4 = st.columns(4)
+            tasa_pesos_anual = col1.number_input("TNA en pesos (%)", min_value=0.0, value=TASA_PESOS_ANUAL_DEFAULT, step=1.0, key="tasa_pesos_anual")
+            devaluacion_mensual = col2.number_input("Devaluación mensual (%)", min_value=-10.0, value=DEVALUACION_MENSUAL_DEFAULT, step=0.5, key="devaluacion_mensual")
+            tasa_usd_anual = col3.number_input("Tasa en dólares (%)", min_value=0.0, value=TASA_USD_ANUAL_DEFAULT, step=0.5, key="tasa_usd_anual")
+            plazo_cobro = col4.number_input("Plazo de cobro (meses)", min_value=0, max_value=6, value=PLAZO_COBRO_DEFAULT, step=1, key="plazo_cobro")
+            col1, col2, col3 = st.columns(3)
+            cantidad_escenarios_caja = col1.number_input("Escenarios", min_value=1, max_value=20000, value=ESCENARIOS_DEFAULT, step=100, key="cantidad_escenarios_caja")
+            volatilidad_tipo_cambio = col2.number_input("Volatilidad mensual del tipo de cambio (%)", min_value=0.0, value=3.0, step=0.5, key="volatilidad_tipo_cambio")
+            caja_inicial = col3.number_input("Caja inicial (USD)", min_value=0.0, value=0.0, step=10000.0, key="caja_inicial")
+            flujo_caja = cache.memoizar("flujo_caja", FlujoCaja, df_margenes_lotes.drop(columns="id"), plazo_cobro)
+            tablas_sesion.update({"Márgenes por lote": df_margenes_lotes, "Flujo de caja por lote": flujo_caja})
+            escenarios_caja = cache.memoizar(
+                "escenarios_financieros", escenarios_financieros,
+                cantidad_escenarios_caja, flujo_caja.meses, tipo_cambio, devaluacion_mensual, volatilidad_tipo_cambio,
+                tasa_pesos_anual, 5.0, tasa_usd_anual
+            )
+            resultado_caja = flujo_caja.cartera(escenarios_caja, caja_inicial)
+            col1, col2, col3 = st.columns(3)
+            col1.metric("VPN de la cartera (camino esperado)", f"USD {resultado_caja['vpn'][0]:,.0f}")
+            col2.metric("Capital de trabajo máximo", f"USD {resultado_caja['capital_trabajo'][0]:,.0f}")
+            col3.metric("Costo financiero", f"USD {resultado_caja['costo_financiero'][0]:,.0f}")
+            df_flujo_mensual = flujo_caja.mensual(escenarios_caja)
+            df_flujo_mensual["Saldo con financiamiento"] = resultado_caja["saldo"][0]
+            mostrar_grafico(st.bar_chart, df_flujo_mensual.drop(columns="Saldo con financiamiento"), "flujo_mensual")
+            mostrar_grafico(st.line_chart, df_flujo_mensual[["Saldo con financiamiento"]], "saldo_mensual")
+            if cantidad_escenarios_caja > 1:
+                st.markdown(f"Distribución en {cantidad_escenarios_caja} caminos de tipo de cambio y tasa:")
+                mostrar_tabla(pd.DataFrame({
+                    "Indicador": ["VPN (USD)", "Capital de trabajo máximo (USD)", "Costo financiero (USD)", "Saldo final (USD)"],
+                    **{f"P{p}": [np.percentile(resultado_caja[clave], p)
+                                 for clave in ("vpn", "capital_trabajo", "costo_financiero", "saldo_final")]
+                       for p in (10, 50, 90)}
+                }), hide_index=True, use_container_width=True)
+            vpn_lotes = flujo_caja.vpn(escenarios_caja)
+            mostrar_tabla(pd.DataFrame({
+                "Lote": flujo_caja.lotes,
+                "Cultivo": flujo_caja.cultivos,
+                "VPN esperado (USD)": vpn_lotes[:, 0],
+                "VPN P10 (USD)": np.percentile(vpn_lotes, 10, axis=1),
+                "VPN P90 (USD)": np.percentile(vpn_lotes, 90, axis=1),
+                "Capital de trabajo máximo (USD)": flujo_caja.capital_trabajo_lotes(escenarios_caja)
+            }), "tabla_flujo_lotes", hide_index=True, use_container_width=True)
+            
+            # Guardar los resultados por lote en el almacén histórico (Parquet por campaña, zona y cultivo)
+            st.markdown("**Histórico de resultados**")
+            col1, col2, col3 = st.columns(3)
+            campana_guardar = col1.number_input("Campaña (año de inicio)", min_value=2000, max_value=2100, step=1,
+                                                value=campana_actual, key="campana_guardar")
+            escenario_guardar = col2.text_input("Escenario", value="base", key="escenario_guardar")
+            if col3.button("Guardar resultados de la cartera"):
+                df_guardar = df_equilibrios.rename(columns={"Lote": "lote", "Zona": "zona", "Cultivo": "cultivo"}).assign(
+                    superficie=df_lotes["superficie"].to_numpy(dtype=float),
+                    rendimiento=df_lotes["rendimiento"].to_numpy(dtype=float),
+                    precio=df_lotes["precio"].to_numpy(dtype=float)
+                )
+                filas = almacen.guardar("lotes", df_guardar, campana_guardar, tarifa_fletes, escenario_guardar)
+                st.success(f"Se guardaron {filas} lotes de la campaña {nombre_campana(campana_guardar)} (tarifa {tarifa_fletes}).")
+            
+            campanas_guardadas = almacen.campanas("lotes")
+            if campanas_guardadas:
+                col1, col2, col3 = st.columns(3)
+                campanas_consulta = col1.multiselect("Campañas", campanas_guardadas, default=campanas_guardadas[-1:],
+                                                     format_func=nombre_campana)
+                cultivo_consulta = col2.selectbox("Cultivo", ["Todos"] + cultivos, key="cultivo_consulta")
+                solo_tarifa = col3.checkbox("Solo la tarifa de fletes actual", value=True)
+                df_historico = almacen.consultar(
+                    "lotes",
+                    ["campana", "escenario", "tarifa", "lote", "zona", "cultivo", "superficie", "Margen Directo (USD/ha)"],
+                    campana=campanas_consulta,
+                    cultivo=None if cultivo_consulta == "Todos" else cultivo_consulta,
+                    tarifa=tarifa_fletes if solo_tarifa else None
+                )
+                mostrar_tabla(df_historico, "tabla_historico", hide_index=True, use_container_width=True)
+        except ValueError as e:
+            st.error(f"Error en las tablas de la cartera: {str(e)}")
 
 # Pestaña 3: Rotaciones
 with tab3:
@@ -562,18 +794,20 @@ with tab3:
             "Cultivo": ["Trigo", "Soja 2da", "Maíz 2da", "Soja 1ra", "Maíz", "Maíz Tardío", "Girasol"],
             "Superficie (ha)": [total_trigo, total_soja2da, total_maiz2da, total_soja1ra, total_maiz, total_maiz_tardio, total_girasol],
             "% del Total": [
-                "{:.1f}%".format((total_trigo/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0),
-                "{:.1f}%".format((total_soja2da/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0),
-                "{:.1f}%".format((total_maiz2da/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0),
-                "{:.1f}%".format((total_soja1ra/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0),
-                "{:.1f}%".format((total_maiz/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0),
-                "{:.1f}%".format((total_maiz_tardio/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0),
-                "{:.1f}%".format((total_girasol/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0)
+                (total_trigo/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0,
+                (total_soja2da/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0,
+                (total_maiz2da/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0,
+                (total_soja1ra/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0,
+                (total_maiz/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0,
+                (total_maiz_tardio/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0,
+                (total_girasol/total_superficie_efectiva*100) if total_superficie_efectiva > 0 else 0
             ]
         }
         
+        # Porcentajes como números: el formato se aplica al mostrar
         df_superficie = pd.DataFrame(superficie_cultivos)
-        st.dataframe(df_superficie, hide_index=True, use_container_width=True)
+        mostrar_tabla(df_superficie, hide_index=True, use_container_width=True,
+                      column_config={"% del Total": st.column_config.NumberColumn(format="%.1f%%")})
         
         # Mostrar totales
         st.info("Superficie física total: " + str(total_superficie) + " ha")
@@ -605,7 +839,7 @@ with tab3:
             'Superficie': filtered_values
         }, index=filtered_labels)
         
-        st.bar_chart(chart_data_cultivos)
+        mostrar_grafico(st.bar_chart, chart_data_cultivos)
     else:
         st.warning("No hay cultivos con superficie para visualizar.")
     
@@ -630,7 +864,7 @@ with tab3:
             'Superficie': filtered_values
         }, index=filtered_labels)
         
-        st.bar_chart(chart_data_rotaciones)
+        mostrar_grafico(st.bar_chart, chart_data_rotaciones)
     else:
         st.warning("No hay rotaciones con superficie para visualizar.")
     
@@ -720,9 +954,9 @@ with tab3:
     df_economia_rotaciones = pd.DataFrame(rotaciones_economico)
     
     # Agregar fila de totales
-    sum_superficie = sum(df_economia_rotaciones["Superficie (ha)"])
-    sum_margen_bruto_total = sum(df_economia_rotaciones["Margen Bruto Total (USD)"])
-    sum_margen_directo_total = sum(df_economia_rotaciones["Margen Directo Total (USD)"])
+    sum_superficie = df_economia_rotaciones["Superficie (ha)"].sum()
+    sum_margen_bruto_total = df_economia_rotaciones["Margen Bruto Total (USD)"].sum()
+    sum_margen_directo_total = df_economia_rotaciones["Margen Directo Total (USD)"].sum()
     
     # Calcular promedios ponderados por hectárea
     prom_margen_bruto_ha = sum_margen_bruto_total / sum_superficie if sum_superficie > 0 else 0
@@ -741,7 +975,12 @@ with tab3:
     df_economia_rotaciones = pd.concat([df_economia_rotaciones, total_row], ignore_index=True)
     
     # Mostrar tabla económica
-    st.dataframe(df_economia_rotaciones, hide_index=True, use_container_width=True)
+    mostrar_tabla(df_economia_rotaciones, hide_index=True, use_container_width=True)
+    if st.button("Guardar en el histórico de la campaña " + nombre_campana(campana_actual)):
+        # Sin la fila TOTAL: lo guardado se suma o agrega al consultarlo
+        almacen.guardar("rotaciones", df_economia_rotaciones[df_economia_rotaciones["Rotación"] != "TOTAL"],
+                        campana_actual, tarifa_fletes, particiones=["campana"])
+        st.success("Resultados de rotaciones guardados.")
     
     # Gráfico comparativo de márgenes por rotación
     st.subheader("Comparativa de Márgenes por Rotación")
@@ -759,7 +998,7 @@ with tab3:
             "Margen Directo (USD/ha)": df_grafico["Margen Directo (USD/ha)"]
         }, index=df_grafico["Rotación"])
         
-        st.bar_chart(chart_data)
+        mostrar_grafico(st.bar_chart, chart_data)
         
         # Obtener la rotación más rentable
         idx_max = df_grafico["Margen Directo (USD/ha)"].idxmax()
@@ -779,8 +1018,9 @@ with tab3:
     (clima, manejo, etc.) afectan el resultado económico.
     """)
     
-    # Índice para rendimiento
+    # Índices para rendimiento y precio
     idx_rendimiento = df_comparativo[df_comparativo["Variable"] == "Rendimiento tn"].index[0]
+    idx_precio_rot = df_comparativo[df_comparativo["Variable"] == "USD/tn"].index[0]
     
     # Escenarios de rendimiento
     # Para simplificar, asumimos que el rendimiento puede variar ±20%
@@ -816,7 +1056,91 @@ with tab3:
     }
     
     df_rendimientos = pd.DataFrame(rendimientos)
-    st.dataframe(df_rendimientos, hide_index=True, use_container_width=True)
+    
+    # Variabilidad histórica: reemplaza el ±20% por la distribución real de rindes por lote y campaña
+    historial = None
+    archivos_historial = st.file_uploader(
+        "Historial de rendimientos (CSV: campana, lote, zona, cultivo, rendimiento)", type="csv",
+        accept_multiple_files=True, key="archivos_historial"
+    )
+    if archivos_historial:
+        try:
+            historial = cache.memoizar(
+                "historial_rendimientos",
+                lambda datos: cargar_historial([io.BytesIO(d) for d in datos]),
+                [archivo.getvalue() for archivo in archivos_historial]
+            )
+        except ValueError as e:
+            st.error(f"Error al cargar el historial de rendimientos: {e}")
+    
+    if historial is None:
+        mostrar_tabla(df_rendimientos, hide_index=True, use_container_width=True)
+    else:
+        zona_historial = st.selectbox("Zona", ["Todas"] + historial.zonas, key="zona_historial")
+        zona_historial = None if zona_historial == "Todas" else zona_historial
+        st.caption(f"{len(historial)} observaciones, campañas {historial.campanas[0]} a {historial.campanas[-1]}.")
+        
+        df_cuantiles = historial.cuantiles(cultivos_labels, zona=zona_historial)
+        df_cuantiles.insert(1, "Rendimiento Base (tn/ha)", df_rendimientos["Rendimiento Base (tn/ha)"])
+        df_cuantiles = df_cuantiles.rename(columns={"P10": "Rinde P10 (tn/ha)", "P50": "Rinde P50 (tn/ha)", "P90": "Rinde P90 (tn/ha)"})
+        mostrar_tabla(df_cuantiles, hide_index=True, use_container_width=True)
+        
+        # Margen directo de cada rotación con rindes remuestreados por campaña (conserva la correlación entre cultivos)
+        st.write("**Margen directo por rotación con rindes históricos (bootstrap por campaña):**")
+        n_remuestras = st.select_slider("Remuestras", options=[1000, 5000, 20000], value=5000, key="remuestras_historial")
+        rindes_simulados = historial.bootstrap(cultivos_labels, n_remuestras, zona=zona_historial, semilla=0)
+        composicion = [[1 if c in rotacion.split(" + ") else 0 for c in cultivos_labels]
+                       for rotacion in rotaciones_economico["Rotación"]]
+        df_riesgo = riesgo_rotaciones(
+            rotaciones_economico["Rotación"], composicion, rindes_simulados,
+            df_rendimientos["Rendimiento Base (tn/ha)"],
+            [df_comparativo.iloc[idx_precio_rot][c] for c in cultivos_labels],
+            [df_comparativo.iloc[idx_margen_directo][c] for c in cultivos_labels],
+            rotaciones_economico["Superficie (ha)"]
+        )
+        mostrar_tabla(df_riesgo, hide_index=True, use_container_width=True)
+        st.caption("Los cultivos sin historial en la zona se toman con su rendimiento base.")
+    
+    # Simulación plurianual: secuencias de campañas con reglas de transición
+    st.subheader("Simulación plurianual de rotaciones")
+    st.markdown("""
+    Compara secuencias de 3 a 10 campañas (incluyendo barbecho) con penalidades por repetir cultivo
+    y bonificaciones por rotar, sobre escenarios de rendimiento simulados (o históricos, si se cargó el historial).
+    """)
+    if st.checkbox("Ejecutar simulación plurianual", key="simular_rotaciones"):
+        col_sim1, col_sim2, col_sim3, col_sim4 = st.columns(4)
+        with col_sim1:
+            anios_simulacion = st.slider("Campañas", min_value=3, max_value=10, value=5)
+        with col_sim2:
+            tasa_descuento = st.number_input("Tasa de descuento anual (%)", min_value=0.0, max_value=50.0, value=8.0, step=0.5)
+        with col_sim3:
+            n_escenarios = st.selectbox("Escenarios", [250, 500, 1000, 2000], index=2)
+        with col_sim4:
+            plan_inicial = st.selectbox("Campaña anterior", ["Sin dato"] + list(PLANES_DEFAULT))
+        plan_inicial = None if plan_inicial == "Sin dato" else plan_inicial
+        
+        rendimientos_rot = [df_comparativo.iloc[idx_rendimiento][c] for c in cultivos_labels]
+        precios_rot = [df_comparativo.iloc[idx_precio_rot][c] for c in cultivos_labels]
+        margenes_rot = [df_comparativo.iloc[idx_margen_directo][c] for c in cultivos_labels]
+        modelo_rotaciones = ModeloRotaciones(cultivos_labels, rendimientos_rot, precios_rot, margenes_rot)
+        rindes_escenarios = modelo_rotaciones.escenarios_rendimiento(n_escenarios, anios_simulacion, historial=historial, semilla=0)
+        ejecutor_rotaciones = obtener_ejecutor()
+        usar_procesos = st.checkbox(
+            f"Repartir en varios procesos ({ejecutor_rotaciones.procesos} núcleos)", value=False,
+            disabled=ejecutor_rotaciones.serial,
+            help="Conviene en secuencias largas con muchos escenarios. Se desactiva con MARGENES_PARALELO=0."
+        )
+        df_simulacion = cache.memoizar(
+            "simulacion_rotaciones",
+            lambda cultivos_sim, rend, prec, marg, rindes, anios, tasa, inicial: simular_rotaciones(
+                ModeloRotaciones(cultivos_sim, rend, prec, marg), rindes, anios, tasa, plan_inicial=inicial, semilla=0,
+                ejecutor=ejecutor_rotaciones if usar_procesos else None),
+            cultivos_labels, rendimientos_rot, precios_rot, margenes_rot, rindes_escenarios,
+            anios_simulacion, tasa_descuento / 100, plan_inicial
+        )
+        mostrar_tabla(df_simulacion, hide_index=True, use_container_width=True)
+        st.caption("Mejores 20 secuencias por margen directo descontado medio (USD/ha acumulados en el horizonte). "
+                   "Con más de 20.000 secuencias posibles se evalúa una muestra.")
 
 # Pestaña 4: Análisis de Sensibilidad
 with tab4:
@@ -856,6 +1180,14 @@ with tab4:
             help="Define el porcentaje de variación (hacia arriba y abajo) para el análisis de sensibilidad del rendimiento."
         )
         
+        # Variabilidad histórica (si se cargó el historial en la pestaña Rotaciones): P10 y P90
+        # relativos a la mediana, aplicados al rendimiento base como rango simétrico equivalente
+        factores_historicos = historial.factores_relativos(cultivo_sensibilidad) if historial is not None else None
+        if factores_historicos is not None and st.checkbox("Usar la variabilidad histórica (P10-P90)", key="rango_historico"):
+            rango_rendimiento = round((factores_historicos[2] - factores_historicos[0]) / 2 * 100, 1)
+            st.caption(f"Rango histórico equivalente: ±{rango_rendimiento}% "
+                       f"(P10 {factores_historicos[0]:.0%} y P90 {factores_historicos[2]:.0%} de la mediana)")
+        
         # Calcular los escenarios de rendimiento
         rendimiento_bajo = rendimiento_base * (1 - rango_rendimiento/100)
         rendimiento_alto = rendimiento_base * (1 + rango_rendimiento/100)
@@ -869,7 +1201,7 @@ with tab4:
         }
         
         df_escenarios_rendimiento = pd.DataFrame(escenarios_rendimiento)
-        st.dataframe(df_escenarios_rendimiento, hide_index=True, use_container_width=True)
+        mostrar_tabla(df_escenarios_rendimiento, hide_index=True, use_container_width=True)
     
     with col2:
         st.subheader("Variaciones en Flete")
@@ -891,8 +1223,8 @@ with tab4:
             df_fletes_analisis = cargar_tabla_fletes()
             # Usamos un valor promedio de la tabla como base
             flete_base_pesos = df_fletes_analisis['Tarifa_$/TN'].median()
-            # Convertir a USD (asumiendo tipo de cambio de 950)
-            flete_base_usd = flete_base_pesos / 950
+            # Convertir a USD con el tipo de cambio de referencia
+            flete_base_usd = flete_base_pesos / tipo_cambio_referencia
         except:
             # Si hay algún error, mantenemos el valor predeterminado
             pass
@@ -910,55 +1242,17 @@ with tab4:
         }
         
         df_escenarios_flete = pd.DataFrame(escenarios_flete)
-        st.dataframe(df_escenarios_flete, hide_index=True, use_container_width=True)
-    
-    # Función para calcular el margen directo en diferentes escenarios
-    def calcular_margen_directo(rendimiento, precio, costos_directos, flete, otros_costos=140, arrendamiento=160*0.3):
-        """
-        Calcula el margen directo por hectárea para los diferentes escenarios.
-        
-        Parámetros:
-        - rendimiento: Rendimiento en tn/ha
-        - precio: Precio en USD/tn
-        - costos_directos: Costos directos en USD/ha
-        - flete: Costo de flete en USD/tn
-        - otros_costos: Otros costos (comercialización, estructura, cosecha) en USD/ha
-        - arrendamiento: Costo de arrendamiento en USD/ha (ajustado por proporción)
-        
-        Retorna:
-        - Margen directo en USD/ha
-        """
-        costo_flete_ha = rendimiento * flete
-        ingreso_bruto = rendimiento * precio
-        margen_bruto = ingreso_bruto - costos_directos - otros_costos - costo_flete_ha
-        margen_directo = margen_bruto - arrendamiento
-        return margen_directo
+        mostrar_tabla(df_escenarios_flete, hide_index=True, use_container_width=True)
     
     # Matriz de escenarios - combinaciones de rendimiento y flete
     st.subheader("Matriz de Escenarios: Margen Directo (USD/ha)")
     
     # Crear matriz de escenarios
-    escenarios_matriz = {
-        "Escenario": ["Rendimiento Bajo", "Rendimiento Base", "Rendimiento Alto"],
-        "Flete Bajo": [
-            calcular_margen_directo(rendimiento_bajo, precio_base, costos_directos_base, flete_bajo),
-            calcular_margen_directo(rendimiento_base, precio_base, costos_directos_base, flete_bajo),
-            calcular_margen_directo(rendimiento_alto, precio_base, costos_directos_base, flete_bajo)
-        ],
-        "Flete Base": [
-            calcular_margen_directo(rendimiento_bajo, precio_base, costos_directos_base, flete_base_usd),
-            calcular_margen_directo(rendimiento_base, precio_base, costos_directos_base, flete_base_usd),
-            calcular_margen_directo(rendimiento_alto, precio_base, costos_directos_base, flete_base_usd)
-        ],
-        "Flete Alto": [
-            calcular_margen_directo(rendimiento_bajo, precio_base, costos_directos_base, flete_alto),
-            calcular_margen_directo(rendimiento_base, precio_base, costos_directos_base, flete_alto),
-            calcular_margen_directo(rendimiento_alto, precio_base, costos_directos_base, flete_alto)
-        ]
-    }
-    
-    df_matriz = pd.DataFrame(escenarios_matriz)
-    st.dataframe(df_matriz, hide_index=True, use_container_width=True)
+    df_matriz = cache.memoizar(
+        "matriz_escenarios", matriz_escenarios,
+        rendimiento_base, rango_rendimiento, precio_base, costos_directos_base, flete_base_usd, rango_flete
+    )
+    mostrar_tabla(df_matriz, hide_index=True, use_container_width=True)
     
     # Análisis gráfico
     st.subheader("Análisis Gráfico de Sensibilidad")
@@ -966,19 +1260,13 @@ with tab4:
     # Datos para el gráfico
     base_margin = calcular_margen_directo(rendimiento_base, precio_base, costos_directos_base, flete_base_usd)
     
-    # Impacto de variaciones en rendimiento (con flete base)
+    # Impacto de variaciones en rendimiento (con flete base) y en flete (con rendimiento base)
     rend_variations = [-30, -20, -10, 0, 10, 20, 30]
-    margins_by_rend = [
-        calcular_margen_directo(rendimiento_base * (1 + var/100), precio_base, costos_directos_base, flete_base_usd)
-        for var in rend_variations
-    ]
-    
-    # Impacto de variaciones en flete (con rendimiento base)
     flete_variations = [-30, -20, -10, 0, 10, 20, 30]
-    margins_by_flete = [
-        calcular_margen_directo(rendimiento_base, precio_base, costos_directos_base, flete_base_usd * (1 + var/100))
-        for var in flete_variations
-    ]
+    margins_by_rend, margins_by_flete = cache.memoizar(
+        "curvas_sensibilidad", curvas_sensibilidad,
+        rendimiento_base, precio_base, costos_directos_base, flete_base_usd, rend_variations
+    )
     
     # Crear DataFrame para gráfico
     df_rend_chart = pd.DataFrame({
@@ -995,7 +1283,7 @@ with tab4:
     
     with col1:
         st.subheader("Impacto del Rendimiento")
-        st.line_chart(df_rend_chart)
+        mostrar_grafico(st.line_chart, df_rend_chart)
         
         # Calcular la elasticidad (cambio porcentual en margen / cambio porcentual en rendimiento)
         rend_elasticity = ((margins_by_rend[5] - margins_by_rend[1]) / base_margin) / 0.4  # cambio de -20% a +20%
@@ -1004,7 +1292,7 @@ with tab4:
     
     with col2:
         st.subheader("Impacto del Flete")
-        st.line_chart(df_flete_chart)
+        mostrar_grafico(st.line_chart, df_flete_chart)
         
         # Calcular la elasticidad (cambio porcentual en margen / cambio porcentual en flete)
         # Tomamos el valor absoluto porque la relación es inversa
@@ -1015,51 +1303,64 @@ with tab4:
     # Tabla de análisis comparativo entre cultivos
     st.subheader("Análisis Comparativo de Sensibilidad entre Cultivos")
     
-    # Calcular elasticidad para cada cultivo
-    elasticidades = {
-        "Cultivo": [],
-        "Elasticidad Rendimiento": [],
-        "Elasticidad Flete": [],
-        "Relación Rendimiento/Flete": []  # Cuánto más importante es el rendimiento vs el flete
+    # Calcular elasticidad para todos los cultivos a la vez
+    df_elasticidades = cache.memoizar(
+        "elasticidades", calcular_elasticidades,
+        cultivos,
+        [df_comparativo.iloc[idx_rendimiento][cult] for cult in cultivos],
+        [df_comparativo.iloc[idx_precio][cult] for cult in cultivos],
+        [df_comparativo.iloc[idx_costos_directos][cult] for cult in cultivos],
+        flete_base_usd
+    )
+    mostrar_tabla(df_elasticidades, hide_index=True, use_container_width=True)
+    
+    # Tornado: cada parámetro se varía por separado para todos los cultivos a la vez
+    st.subheader("Análisis Tornado: ¿qué parámetros mueven más el margen directo?")
+    st.caption("Cada parámetro se lleva a su valor bajo y alto manteniendo los demás en su valor base "
+               "(valores de la tabla comparativa y de la Calculadora por defecto).")
+    with st.expander("Rangos de variación (%)"):
+        columnas_tornado = st.columns(4)
+        variaciones_tornado = {
+            parametro: columnas_tornado[i % 4].slider(etiqueta, min_value=0, max_value=50, value=variacion, step=5,
+                                                      key="tornado_" + parametro)
+            for i, (parametro, (etiqueta, variacion)) in enumerate(PARAMETROS_TORNADO.items())
+        }
+    costos_directos_cultivos = np.array([df_comparativo.iloc[idx_costos_directos][cult] for cult in cultivos], dtype=float)
+    base_tornado = {
+        "rendimiento": np.array([df_comparativo.iloc[idx_rendimiento][cult] for cult in cultivos], dtype=float),
+        "precio": np.array([df_comparativo.iloc[idx_precio][cult] for cult in cultivos], dtype=float),
+        # Mismo desglose de costos directos que la Calculadora por defecto
+        "labranza": costos_directos_cultivos * 0.2,
+        "semilla": costos_directos_cultivos * 0.3,
+        "agroquimicos": costos_directos_cultivos * 0.3,
+        "fertilizantes": costos_directos_cultivos * 0.2,
+        "comercializacion": FRACCION_COMERCIALIZACION,
+        "estructura": ESTRUCTURA_DEFAULT,
+        "cosecha": COSECHA_DEFAULT,
+        "arrendamiento": CONTRATO_DEFAULT["usd_ha"] * PROPORCION_ARRENDADA_DEFAULT * factor_ocupacion(cultivos),
+        "tipo_cambio": tipo_cambio_referencia,
+        "km": KM_DEFAULT,
     }
-    
-    for cult in cultivos:
-        # Obtener valores base para el cultivo
-        rend = df_comparativo.iloc[idx_rendimiento][cult]
-        prec = df_comparativo.iloc[idx_precio][cult]
-        cost = df_comparativo.iloc[idx_costos_directos][cult]
-        
-        # Calcular elasticidades
-        base_marg = calcular_margen_directo(rend, prec, cost, flete_base_usd)
-        
-        # Evitar división por cero
-        if base_marg == 0:
-            elast_rend = float('nan')
-            elast_flete = float('nan')
-            relation = float('nan')
-        else:
-            # Rendimiento +20%
-            marg_rend_up = calcular_margen_directo(rend * 1.2, prec, cost, flete_base_usd)
-            # Rendimiento -20%
-            marg_rend_down = calcular_margen_directo(rend * 0.8, prec, cost, flete_base_usd)
-            elast_rend = ((marg_rend_up - marg_rend_down) / base_marg) / 0.4
-            
-            # Flete +20%
-            marg_flete_up = calcular_margen_directo(rend, prec, cost, flete_base_usd * 1.2)
-            # Flete -20%
-            marg_flete_down = calcular_margen_directo(rend, prec, cost, flete_base_usd * 0.8)
-            elast_flete = abs((marg_flete_up - marg_flete_down) / base_marg) / 0.4
-            
-            # Relación entre elasticidades (cuán importante es el rendimiento vs el flete)
-            relation = elast_rend / elast_flete if elast_flete != 0 else float('inf')
-        
-        elasticidades["Cultivo"].append(cult)
-        elasticidades["Elasticidad Rendimiento"].append(elast_rend)
-        elasticidades["Elasticidad Flete"].append(elast_flete)
-        elasticidades["Relación Rendimiento/Flete"].append(relation)
-    
-    df_elasticidades = pd.DataFrame(elasticidades)
-    st.dataframe(df_elasticidades, hide_index=True, use_container_width=True)
+    df_fletes_tornado = cargar_tabla_fletes()
+    df_tornado = cache.memoizar(
+        "tornado", analisis_tornado,
+        cultivos, base_tornado, df_fletes_tornado["KM"].to_numpy(), df_fletes_tornado["Tarifa_$/TN"].to_numpy(),
+        variaciones_tornado
+    )
+    df_tornado_cultivo = df_tornado[df_tornado["Cultivo"] == cultivo_sensibilidad]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(f"**{cultivo_sensibilidad}: cambio del margen directo (USD/ha) respecto de la base**")
+        mostrar_grafico(st.bar_chart, pd.DataFrame({
+            "Valor bajo": (df_tornado_cultivo["Margen Bajo (USD/ha)"] - df_tornado_cultivo["Margen Base (USD/ha)"]).to_numpy(),
+            "Valor alto": (df_tornado_cultivo["Margen Alto (USD/ha)"] - df_tornado_cultivo["Margen Base (USD/ha)"]).to_numpy()
+        }, index=df_tornado_cultivo["Parámetro"]), "tornado")
+    with col2:
+        mostrar_tabla(df_tornado_cultivo.drop(columns=["Cultivo", "Margen Base (USD/ha)"]), hide_index=True, use_container_width=True)
+    st.markdown("**Ranking de parámetros por cultivo (1 = mayor impacto)**")
+    mostrar_tabla(df_tornado.pivot(index="Parámetro", columns="Cultivo", values="Ranking")
+                  .reindex(index=[etiqueta for etiqueta, _ in PARAMETROS_TORNADO.values()], columns=cultivos)
+                  .rename_axis(columns=None).reset_index(), hide_index=True, use_container_width=True)
     
     # Interpretación del análisis
     st.subheader("Interpretación de Resultados")
@@ -1185,6 +1486,41 @@ with tab4:
     para obtener el costo por hectárea.
     """)
 
+# Métricas del caché de cálculos
+with st.sidebar.expander("Métricas del caché"):
+    metricas_cache = cache.metricas()
+    st.write(f"Aciertos: {metricas_cache['hits']} | Fallos: {metricas_cache['misses']} | Desalojos: {metricas_cache['evictions']}")
+    st.write(f"Tasa de aciertos: {metricas_cache['tasa_hits']:.0%}")
+    st.write(f"Entradas: {metricas_cache['entradas']} | Memoria: {metricas_cache['bytes'] / 1024:.1f} KB de {metricas_cache['max_bytes'] / 1024 / 1024:.0f} MB")
+
+# Estado de la actualización de precios
+with st.sidebar.expander("Actualización de precios"):
+    if actualizador is None:
+        st.write(f"Sin fuente configurada (variable {VARIABLE_FUENTE}). Se usan los valores de la tabla.")
+    else:
+        metricas_precios = actualizador.metricas()
+        if metricas_precios["antiguedad"] is None:
+            st.write("Todavía no se recibieron datos de la fuente.")
+        else:
+            estado = "vigentes" if metricas_precios["vigente"] else "vencidos (se usan los valores de la tabla)"
+            st.write(f"Datos {estado}, actualizados hace {metricas_precios['antiguedad']:.0f} s")
+        st.write(f"Tipo de cambio de referencia: ${tipo_cambio_referencia:,.0f}/USD")
+        st.write(f"Consultas correctas: {metricas_precios['consultas_ok']} | Errores: {metricas_precios['errores']}")
+        if metricas_precios["ultimo_error"]:
+            st.caption(f"Último error: {metricas_precios['ultimo_error']}")
+
+# Datos enviados al navegador en esta ejecución (se registran al mostrar tablas y gráficos)
+with st.sidebar.expander("Datos enviados al navegador"):
+    st.write(f"Total: {medidor.total / 1024:.1f} KB")
+    st.dataframe(medidor.resumen(), hide_index=True, use_container_width=True)
+
+# Memoria de las tablas grandes y los cubos de esta sesión
+with st.sidebar.expander("Memoria de la sesión"):
+    df_memoria = huella_memoria({**tablas_sesion,
+                                 "Cubo de la cartera": st.session_state.get("cubo_cartera")})
+    st.write(f"Total: {df_memoria['Bytes'].sum() / 1024:.1f} KB")
+    st.dataframe(df_memoria, hide_index=True, use_container_width=True)
+
 # Pie de página
 st.markdown("---")
 st.markdown("© 2025 Calculadora de Márgenes Agrícolas | Desarrollado para Ingenieros Agrónomos")
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+# Motor de contratos de arrendamiento.
+# Cada contrato se describe con tres componentes que se suman:
+# - usd_ha: monto fijo en USD/ha
+# - qq_soja_ha: quintales de soja por hectárea (valuados al precio de la soja)
+# - porcentaje_cosecha: porcentaje de la cosecha del lote (valuado al precio del cultivo)
+# Un contrato "mixto" combina más de un componente.
+TIPOS_CONTRATO = ["usd_ha", "qq_soja", "porcentaje_cosecha", "mixto"]
+COLUMNAS_CONTRATOS = ["contrato", "tipo", "usd_ha", "qq_soja_ha", "porcentaje_cosecha"]
+
+# Contrato por defecto (el arrendamiento de referencia de la Calculadora)
+CONTRATO_DEFAULT = {"contrato": "default", "tipo": "usd_ha", "usd_ha": 160.0, "qq_soja_ha": 0.0,
+                    "porcentaje_cosecha": 0.0}
+
+# Quintales por tonelada
+QQ_POR_TN = 10
+
+
+def factor_ocupacion(cultivos):
+    """
+    Factor de ocupación del lote: los cultivos de segunda pagan medio año de arrendamiento.
+
+    Parámetros:
+    - cultivos: Nombre de cultivo o lista de nombres
+
+    Retorna:
+    - Factor (0.5 para cultivos de 2da, 1.0 para el resto), escalar o array
+    """
+    if isinstance(cultivos, str):
+        return 0.5 if "2da" in cultivos else 1.0
+    return np.array([0.5 if "2da" in c else 1.0 for c in cultivos])
+
+
+def costo_contrato(usd_ha=0.0, qq_soja_ha=0.0, porcentaje_cosecha=0.0, precio_soja_tn=0.0,
+                   rendimiento=0.0, precio=0.0):
+    """
+    Costo de arrendamiento por hectárea arrendada de un contrato (escalares o arrays).
+
+    Parámetros:
+    - usd_ha: Componente fijo en USD/ha
+    - qq_soja_ha: Quintales de soja por hectárea
+    - porcentaje_cosecha: Porcentaje de la cosecha (0-100)
+    - precio_soja_tn: Precio de la soja en USD/tn
+    - rendimiento: Rendimiento del lote en tn/ha
+    - precio: Precio del cultivo del lote en USD/tn
+
+    Retorna:
+    - Costo en USD/ha (antes de aplicar ocupación y proporción arrendada)
+    """
+    return (usd_ha
+            + np.multiply(qq_soja_ha, precio_soja_tn) / QQ_POR_TN
+            + np.multiply(porcentaje_cosecha, np.multiply(rendimiento, precio)) / 100)
+
+
+def completar_contratos(df_contratos):
+    """
+    Valida una tabla de contratos y completa los componentes faltantes con cero.
+
+    Parámetros:
+    - df_contratos: DataFrame con al menos la columna contrato
+
+    Retorna:
+    - DataFrame con las columnas de COLUMNAS_CONTRATOS
+    """
+    df = df_contratos.copy()
+    if "contrato" not in df.columns:
+        raise ValueError("Falta la columna 'contrato' en la tabla de contratos")
+    df["contrato"] = df["contrato"].astype(str)
+    if df["contrato"].duplicated().any():
+        raise ValueError("Hay contratos duplicados: " + ", ".join(df.loc[df["contrato"].duplicated(), "contrato"]))
+    for columna in ("usd_ha", "qq_soja_ha", "porcentaje_cosecha"):
+        if columna not in df.columns:
+            df[columna] = 0.0
+        df[columna] = df[columna].fillna(0.0).astype(float)
+    if "tipo" not in df.columns:
+        df["tipo"] = "mixto"
+    tipos_invalidos = sorted(set(df["tipo"]) - set(TIPOS_CONTRATO))
+    if tipos_invalidos:
+        raise ValueError("Tipos de contrato desconocidos: " + ", ".join(tipos_invalidos))
+    return df[COLUMNAS_CONTRATOS].reset_index(drop=True)
+
+
+def cargar_contratos(ruta):
+    """Carga la tabla de contratos desde un archivo CSV."""
+    return completar_contratos(pd.read_csv(ruta))
+
+
+class MotorArrendamientos:
+    """
+    Evalúa todos los contratos de la cartera contra vectores de precios y rendimientos.
+
+    Al construirse resuelve una sola vez la relación lote -> contrato y arma arrays
+    por lote; cada evaluación posterior es aritmética vectorizada, de modo que un cambio
+    en el precio de la soja se recalcula para toda la cartera en una sola pasada.
+    """
+
+    def __init__(self, df_lotes, df_contratos):
+        df_contratos = completar_contratos(df_contratos)
+        if CONTRATO_DEFAULT["contrato"] not in set(df_contratos["contrato"]):
+            df_contratos = pd.concat([df_contratos, pd.DataFrame([CONTRATO_DEFAULT])], ignore_index=True)
+
+        # Los lotes propios (sin contrato o sin superficie arrendada) no pagan arrendamiento
+        contratos_lote = df_lotes["contrato"].fillna("").astype(str)
+        propios = (contratos_lote == "") | (df_lotes["proporcion_arrendada"].to_numpy(dtype=float) == 0)
+        idx = pd.Index(df_contratos["contrato"]).get_indexer(contratos_lote)
+        desconocidos = (idx < 0) & ~propios
+        if desconocidos.any():
+            raise ValueError("Contratos no definidos: " + ", ".join(sorted(set(contratos_lote[desconocidos]))))
+        idx = np.where(idx < 0, 0, idx)
+
+        self.lotes = df_lotes["lote"].to_numpy()
+        self.superficie = df_lotes["superficie"].to_numpy(dtype=float)
+        self.rendimiento = df_lotes["rendimiento"].to_numpy(dtype=float)
+        self.precio = df_lotes["precio"].to_numpy(dtype=float)
+        self.proporcion_arrendada = np.where(propios, 0.0, df_lotes["proporcion_arrendada"].to_numpy(dtype=float))
+        self.factor_ocupacion = factor_ocupacion(df_lotes["cultivo"].tolist())
+
+        self.usd_ha = np.where(propios, 0.0, df_contratos["usd_ha"].to_numpy()[idx])
+        self.qq_soja_ha = np.where(propios, 0.0, df_contratos["qq_soja_ha"].to_numpy()[idx])
+        self.porcentaje_cosecha = np.where(propios, 0.0, df_contratos["porcentaje_cosecha"].to_numpy()[idx])
+
+    def evaluar(self, precio_soja_tn, rendimientos=None, precios=None):
+        """
+        Calcula el arrendamiento de todos los lotes.
+
+        Parámetros:
+        - precio_soja_tn: Precio de la soja en USD/tn; escalar o array de escenarios (S,)
+        - rendimientos: Rendimientos por lote (N,) o por escenario y lote (S, N); por defecto los de la cartera
+        - precios: Precios por lote (N,) o (S, N); por defecto los de la cartera
+
+        Retorna:
+        - Diccionario con:
+          - arrendamiento_ha: Costo por hectárea arrendada, ajustado por ocupación
+          - arrendamiento_lote_ha: Costo por hectárea del lote (ponderado por proporción arrendada)
+          - arrendamiento_total: Costo total del lote en USD
+          Con forma (N,) para un precio escalar o (S, N) para un vector de escenarios
+        """
+        rendimientos = self.rendimiento if rendimientos is None else np.asarray(rendimientos, dtype=float)
+        precios = self.precio if precios is None else np.asarray(precios, dtype=float)
+        precio_soja = np.asarray(precio_soja_tn, dtype=float)
+        if precio_soja.ndim == 1:
+            precio_soja = precio_soja[:, None]  # Escenarios en el primer eje
+
+        costo = costo_contrato(self.usd_ha, self.qq_soja_ha, self.porcentaje_cosecha, precio_soja,
+                               rendimientos, precios)
+        arrendamiento_ha = costo * self.factor_ocupacion
+        arrendamiento_lote_ha = arrendamiento_ha * self.proporcion_arrendada
+        return {
+            "arrendamiento_ha": arrendamiento_ha,
+            "arrendamiento_lote_ha": arrendamiento_lote_ha,
+            "arrendamiento_total": arrendamiento_lote_ha * self.superficie,
+        }
+
+    def componentes(self, precio_soja_tn):
+        """
+        Separa el arrendamiento por hectárea de lote en una parte fija y una proporcional al ingreso.
+
+        Parámetros:
+        - precio_soja_tn: Precio de la soja en USD/tn
+
+        Retorna:
+        - Tupla (parte fija en USD/ha, fracción del ingreso bruto), arrays por lote
+        """
+        ajuste = self.factor_ocupacion * self.proporcion_arrendada
+        fijo = costo_contrato(self.usd_ha, self.qq_soja_ha, 0.0, precio_soja_tn) * ajuste
+        fraccion_ingreso = self.porcentaje_cosecha / 100 * ajuste
+        return fijo, fraccion_ingreso
+
+    def resumen(self, precio_soja_tn):
+        """
+        Tabla por lote con el arrendamiento para un precio de soja dado.
+
+        Parámetros:
+        - precio_soja_tn: Precio de la soja en USD/tn
+
+        Retorna:
+        - DataFrame con lote, proporción arrendada y costos de arrendamiento
+        """
+        resultado = self.evaluar(precio_soja_tn)
+        return pd.DataFrame({
+            "Lote": self.lotes,
+            "Superficie (ha)": self.superficie,
+            "Proporción arrendada": self.proporcion_arrendada,
+            "Arrendamiento (USD/ha arrendada)": resultado["arrendamiento_ha"],
+            "Arrendamiento (USD/ha lote)": resultado["arrendamiento_lote_ha"],
+            "Arrendamiento Total (USD)": resultado["arrendamiento_total"]
+        })
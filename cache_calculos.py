@@ -0,0 +1,234 @@
+import hashlib
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Caché compartido entre sesiones para los resultados de los cálculos de márgenes.
+# Streamlit vuelve a ejecutar app.py en cada interacción, pero los módulos importados
+# se cargan una sola vez por proceso: el caché global de este módulo es compartido
+# por todas las sesiones del servidor.
+
+# Límites por defecto
+MAX_ENTRADAS_DEFAULT = 1024
+TTL_SEGUNDOS_DEFAULT = 6 * 3600
+MAX_BYTES_DEFAULT = 64 * 1024 * 1024
+
+
+def _alimentar_hash(h, valor):
+    # Serializa el valor de forma canónica (independiente del orden de diccionarios
+    # y del tipo numérico: 100 y 100.0 generan la misma clave)
+    if valor is None:
+        h.update(b"N")
+    elif isinstance(valor, (bool, np.bool_)):
+        h.update(b"B1" if valor else b"B0")
+    elif isinstance(valor, (int, float, np.integer, np.floating)):
+        numero = float(valor)
+        if numero == 0:
+            numero = 0.0  # Normalizamos -0.0
+        h.update(b"F" + struct.pack("<d", numero))
+    elif isinstance(valor, str):
+        datos = valor.encode("utf-8")
+        h.update(b"S" + struct.pack("<q", len(datos)) + datos)
+    elif isinstance(valor, bytes):
+        h.update(b"Y" + struct.pack("<q", len(valor)) + valor)
+    elif isinstance(valor, (list, tuple)):
+        h.update(b"L" + struct.pack("<q", len(valor)))
+        for elemento in valor:
+            _alimentar_hash(h, elemento)
+    elif isinstance(valor, dict):
+        h.update(b"D" + struct.pack("<q", len(valor)))
+        for clave in sorted(valor, key=str):
+            _alimentar_hash(h, str(clave))
+            _alimentar_hash(h, valor[clave])
+    elif isinstance(valor, np.ndarray):
+        if valor.dtype.kind in "biuf":
+            arr = np.ascontiguousarray(valor, dtype=np.float64)
+            arr = np.where(arr == 0, 0.0, arr)
+            h.update(b"A" + str(arr.shape).encode() + arr.tobytes())
+        else:
+            _alimentar_hash(h, valor.tolist())
+    elif isinstance(valor, pd.DataFrame):
+        h.update(b"P")
+        _alimentar_hash(h, [str(c) for c in valor.columns])
+        h.update(pd.util.hash_pandas_object(valor, index=True).values.tobytes())
+    elif isinstance(valor, pd.Series):
+        h.update(b"R")
+        _alimentar_hash(h, str(valor.name))
+        h.update(pd.util.hash_pandas_object(valor, index=True).values.tobytes())
+    else:
+        raise TypeError(f"Tipo no soportado para la clave del caché: {type(valor).__name__}")
+
+
+def clave_canonica(nombre, *args, **kwargs):
+    """
+    Genera una clave hash canónica para un cálculo y sus parámetros.
+
+    Parámetros:
+    - nombre: Nombre del cálculo (distingue funciones con los mismos parámetros)
+    - args, kwargs: Parámetros del cálculo
+
+    Retorna:
+    - Cadena hexadecimal SHA-256
+    """
+    h = hashlib.sha256()
+    _alimentar_hash(h, nombre)
+    _alimentar_hash(h, list(args))
+    _alimentar_hash(h, kwargs)
+    return h.hexdigest()
+
+
+def estimar_tamano(valor):
+    """
+    Estima la memoria ocupada por un resultado (en bytes).
+
+    Parámetros:
+    - valor: Resultado a medir (DataFrame, array, diccionario, lista, objeto o escalar)
+
+    Retorna:
+    - Tamaño aproximado en bytes
+    """
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True, index=True)
+        return int(uso.sum()) if isinstance(uso, pd.Series) else int(uso)
+    if isinstance(valor, pd.Index):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes) + sys.getsizeof(valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(estimar_tamano(k) + estimar_tamano(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(estimar_tamano(v) for v in valor)
+    if hasattr(valor, "__dict__"):
+        # Objetos (por ejemplo, motores de cálculo): sumamos sus atributos
+        return sys.getsizeof(valor) + estimar_tamano(vars(valor))
+    return sys.getsizeof(valor)
+
+
+class CacheCalculos:
+    """
+    Caché LRU con vencimiento (TTL) y techo de memoria para resultados de cálculos.
+
+    Los valores guardados se comparten entre sesiones: deben tratarse como de solo lectura.
+    """
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_DEFAULT, ttl_segundos=TTL_SEGUNDOS_DEFAULT,
+                 max_bytes=MAX_BYTES_DEFAULT):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()  # clave -> (valor, tamaño, vencimiento)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._vencidas = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _quitar(self, clave):
+        _, tamano, _ = self._entradas.pop(clave)
+        self._bytes -= tamano
+
+    def obtener(self, clave, default=None):
+        """Devuelve el valor guardado para la clave, o default si no existe o venció."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._misses += 1
+                return default
+            valor, _, vencimiento = entrada
+            if vencimiento < time.monotonic():
+                self._quitar(clave)
+                self._vencidas += 1
+                self._misses += 1
+                return default
+            self._entradas.move_to_end(clave)
+            self._hits += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        """Guarda un valor, desalojando las entradas menos usadas si se superan los límites."""
+        tamano = estimar_tamano(valor)
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            # Un resultado más grande que el techo de memoria no se guarda
+            if tamano > self.max_bytes:
+                return
+            self._entradas[clave] = (valor, tamano, time.monotonic() + self.ttl_segundos)
+            self._bytes += tamano
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                clave_vieja = next(iter(self._entradas))
+                self._quitar(clave_vieja)
+                self._evictions += 1
+
+    def memoizar(self, nombre, funcion, *args, **kwargs):
+        """
+        Devuelve el resultado de funcion(*args, **kwargs), calculándolo solo si no está en caché.
+
+        Parámetros:
+        - nombre: Nombre del cálculo (parte de la clave)
+        - funcion: Función a evaluar
+        - args, kwargs: Parámetros de la función
+
+        Retorna:
+        - Resultado de la función (posiblemente compartido con otras sesiones)
+        """
+        clave = clave_canonica(nombre, *args, **kwargs)
+        faltante = object()
+        valor = self.obtener(clave, faltante)
+        if valor is faltante:
+            valor = funcion(*args, **kwargs)
+            self.guardar(clave, valor)
+        return valor
+
+    def purgar_vencidas(self):
+        """Elimina las entradas vencidas y devuelve cuántas se eliminaron."""
+        ahora = time.monotonic()
+        with self._lock:
+            vencidas = [clave for clave, (_, _, vencimiento) in self._entradas.items() if vencimiento < ahora]
+            for clave in vencidas:
+                self._quitar(clave)
+            self._vencidas += len(vencidas)
+            return len(vencidas)
+
+    def limpiar(self):
+        """Vacía el caché (las métricas acumuladas se conservan)."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def metricas(self):
+        """
+        Retorna:
+        - Diccionario con aciertos, fallos, desalojos, vencidas, tasa de aciertos,
+          cantidad de entradas y memoria ocupada
+        """
+        with self._lock:
+            consultas = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "vencidas": self._vencidas,
+                "tasa_hits": self._hits / consultas if consultas > 0 else 0.0,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Caché global del proceso (compartido por todas las sesiones)
+_cache_global = CacheCalculos()
+
+
+def obtener_cache():
+    """Devuelve el caché compartido del proceso."""
+    return _cache_global
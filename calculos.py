@@ -0,0 +1,330 @@
+import numpy as np
+import pandas as pd
+
+from tarifas import interpolar_tramos
+
+# Funciones de cálculo de márgenes sin dependencias de Streamlit.
+# Todas aceptan escalares o arrays de numpy (se aplica broadcasting), de modo que
+# sirven tanto para la calculadora interactiva como para evaluar muchos lotes a la vez.
+
+# Variaciones (%) usadas en los gráficos de sensibilidad
+VARIACIONES_SENSIBILIDAD = [-30, -20, -10, 0, 10, 20, 30]
+
+# Recargos de flete por cultivo (%), según la tabla FADEEAC
+RECARGOS_FLETE_CULTIVO = {"Girasol": 20, "Avena": 10}
+
+# Parámetros del análisis tornado: nombre -> (etiqueta, variación por defecto en %, hacia arriba y abajo).
+# Los costos están en USD/ha, la comercialización como fracción del ingreso bruto y el flete
+# sale de la tabla según km y tipo de cambio.
+PARAMETROS_TORNADO = {
+    "rendimiento": ("Rendimiento", 20),
+    "precio": ("Precio", 15),
+    "labranza": ("Labranza", 20),
+    "semilla": ("Semilla", 20),
+    "agroquimicos": ("Agroquímicos", 20),
+    "fertilizantes": ("Fertilizantes", 20),
+    "comercializacion": ("Comercialización", 20),
+    "estructura": ("Estructura", 20),
+    "cosecha": ("Cosecha", 20),
+    "arrendamiento": ("Arrendamiento", 20),
+    "tipo_cambio": ("Tipo de cambio", 20),
+    "km": ("Distancia (km)", 30),
+}
+
+
+def _como_salida(valor):
+    # Devuelve un float de Python si el resultado es escalar, o el array tal cual
+    if np.ndim(valor) == 0:
+        return float(valor)
+    return valor
+
+
+def calcular_margenes(rendimiento, precio, costos_directos, comercializacion, estructura,
+                      cosecha, flete_usd_tn, arrendamiento_ha):
+    """
+    Calcula ingresos, márgenes y retorno por hectárea (misma lógica que la Calculadora).
+
+    Parámetros:
+    - rendimiento: Rendimiento en tn/ha
+    - precio: Precio en USD/tn
+    - costos_directos: Total de costos directos en USD/ha
+    - comercializacion: Gastos de comercialización en USD/ha
+    - estructura: Gastos de estructura en USD/ha
+    - cosecha: Costo de cosecha en USD/ha
+    - flete_usd_tn: Costo de flete en USD/tn
+    - arrendamiento_ha: Arrendamiento por hectárea ya ajustado (ocupación y proporción arrendada)
+
+    Retorna:
+    - Diccionario con ingreso_bruto_ha, costo_flete_ha, margen_bruto_ha,
+      margen_directo_ha, costos_totales_ha y retorno_costos (%)
+    """
+    rendimiento = np.asarray(rendimiento, dtype=float)
+    ingreso_bruto_ha = rendimiento * np.asarray(precio, dtype=float)
+    costo_flete_ha = rendimiento * np.asarray(flete_usd_tn, dtype=float)
+
+    margen_bruto_ha = ingreso_bruto_ha - costos_directos - comercializacion - estructura - cosecha - costo_flete_ha
+    margen_directo_ha = margen_bruto_ha - arrendamiento_ha
+
+    costos_totales_ha = costos_directos + comercializacion + estructura + cosecha + costo_flete_ha + arrendamiento_ha
+    # Evitamos la división por cero: sin costos el retorno se informa como 0
+    hay_costos = costos_totales_ha > 0
+    retorno_costos = np.where(hay_costos, margen_directo_ha / np.where(hay_costos, costos_totales_ha, 1.0) * 100, 0.0)
+
+    return {
+        "ingreso_bruto_ha": _como_salida(ingreso_bruto_ha),
+        "costo_flete_ha": _como_salida(costo_flete_ha),
+        "margen_bruto_ha": _como_salida(margen_bruto_ha),
+        "margen_directo_ha": _como_salida(margen_directo_ha),
+        "costos_totales_ha": _como_salida(costos_totales_ha),
+        "retorno_costos": _como_salida(retorno_costos),
+    }
+
+
+def calcular_costo_flete_vectorizado(km, km_tabla, tarifa_tabla, recargo=0):
+    """
+    Costo del flete por tonelada para muchas distancias a la vez (interpolación lineal).
+
+    Usa la interpolación por tramos de las tarifas: fuera del rango de la tabla se usa la tarifa del extremo.
+
+    Parámetros:
+    - km: Distancia(s) en kilómetros
+    - km_tabla: Kilómetros de la tabla de fletes (ordenados)
+    - tarifa_tabla: Tarifas en $/tn correspondientes
+    - recargo: Porcentaje de recargo (escalar o uno por distancia)
+
+    Retorna:
+    - Costo del flete en $/tn (escalar o array)
+    """
+    costo = interpolar_tramos(km, km_tabla, tarifa_tabla)
+    costo = np.where(np.asarray(recargo) > 0, costo * (1 + np.asarray(recargo, dtype=float)/100), costo)
+    return _como_salida(costo)
+
+
+def recargos_por_cultivo(cultivos):
+    """Recargo de flete (%) correspondiente a cada cultivo."""
+    return np.array([RECARGOS_FLETE_CULTIVO.get(c, 0) for c in cultivos], dtype=float)
+
+
+def calcular_margen_directo(rendimiento, precio, costos_directos, flete, otros_costos=140, arrendamiento=160*0.3):
+    """
+    Calcula el margen directo por hectárea para los diferentes escenarios.
+
+    Parámetros:
+    - rendimiento: Rendimiento en tn/ha
+    - precio: Precio en USD/tn
+    - costos_directos: Costos directos en USD/ha
+    - flete: Costo de flete en USD/tn
+    - otros_costos: Otros costos (comercialización, estructura, cosecha) en USD/ha
+    - arrendamiento: Costo de arrendamiento en USD/ha (ajustado por proporción)
+
+    Retorna:
+    - Margen directo en USD/ha
+    """
+    costo_flete_ha = rendimiento * flete
+    ingreso_bruto = rendimiento * precio
+    margen_bruto = ingreso_bruto - costos_directos - otros_costos - costo_flete_ha
+    margen_directo = margen_bruto - arrendamiento
+    return margen_directo
+
+
+def matriz_escenarios(rendimiento_base, rango_rendimiento, precio, costos_directos, flete_base, rango_flete):
+    """
+    Arma la matriz 3x3 de margen directo (rendimiento bajo/base/alto x flete bajo/base/alto).
+
+    Parámetros:
+    - rendimiento_base: Rendimiento base en tn/ha
+    - rango_rendimiento: Variación del rendimiento en % (hacia arriba y abajo)
+    - precio: Precio en USD/tn
+    - costos_directos: Costos directos en USD/ha
+    - flete_base: Flete base en USD/tn
+    - rango_flete: Variación del flete en % (hacia arriba y abajo)
+
+    Retorna:
+    - DataFrame con la matriz de escenarios
+    """
+    factores_rend = np.array([1 - rango_rendimiento/100, 1.0, 1 + rango_rendimiento/100])
+    factores_flete = np.array([1 - rango_flete/100, 1.0, 1 + rango_flete/100])
+
+    # Filas: rendimiento; columnas: flete
+    margenes = calcular_margen_directo(
+        rendimiento_base * factores_rend[:, None], precio, costos_directos, flete_base * factores_flete[None, :]
+    )
+
+    return pd.DataFrame({
+        "Escenario": ["Rendimiento Bajo", "Rendimiento Base", "Rendimiento Alto"],
+        "Flete Bajo": margenes[:, 0],
+        "Flete Base": margenes[:, 1],
+        "Flete Alto": margenes[:, 2]
+    })
+
+
+def curvas_sensibilidad(rendimiento_base, precio, costos_directos, flete_base, variaciones=VARIACIONES_SENSIBILIDAD):
+    """
+    Calcula el margen directo ante variaciones porcentuales de rendimiento y de flete.
+
+    Parámetros:
+    - rendimiento_base: Rendimiento base en tn/ha
+    - precio: Precio en USD/tn
+    - costos_directos: Costos directos en USD/ha
+    - flete_base: Flete base en USD/tn
+    - variaciones: Lista de variaciones en %
+
+    Retorna:
+    - Tupla (márgenes por variación de rendimiento, márgenes por variación de flete)
+    """
+    factores = 1 + np.asarray(variaciones, dtype=float) / 100
+    margenes_rend = calcular_margen_directo(rendimiento_base * factores, precio, costos_directos, flete_base)
+    margenes_flete = calcular_margen_directo(rendimiento_base, precio, costos_directos, flete_base * factores)
+    return margenes_rend, margenes_flete
+
+
+def calcular_elasticidades(cultivos, rendimientos, precios, costos_directos, flete_base):
+    """
+    Calcula las elasticidades del margen directo (rendimiento y flete, ±20%) para todos los cultivos a la vez.
+
+    Parámetros:
+    - cultivos: Lista de nombres de cultivos
+    - rendimientos: Rendimientos base en tn/ha (uno por cultivo)
+    - precios: Precios en USD/tn (uno por cultivo)
+    - costos_directos: Costos directos en USD/ha (uno por cultivo)
+    - flete_base: Flete base en USD/tn
+
+    Retorna:
+    - DataFrame con las elasticidades por cultivo (NaN si el margen base es cero)
+    """
+    rend = np.asarray(rendimientos, dtype=float)
+    prec = np.asarray(precios, dtype=float)
+    cost = np.asarray(costos_directos, dtype=float)
+
+    base_marg = calcular_margen_directo(rend, prec, cost, flete_base)
+    marg_rend_up = calcular_margen_directo(rend * 1.2, prec, cost, flete_base)
+    marg_rend_down = calcular_margen_directo(rend * 0.8, prec, cost, flete_base)
+    marg_flete_up = calcular_margen_directo(rend, prec, cost, flete_base * 1.2)
+    marg_flete_down = calcular_margen_directo(rend, prec, cost, flete_base * 0.8)
+
+    # Evitar división por cero: sin margen base las elasticidades no están definidas
+    margen_nulo = base_marg == 0
+    divisor = np.where(margen_nulo, 1.0, base_marg)
+    elast_rend = np.where(margen_nulo, np.nan, ((marg_rend_up - marg_rend_down) / divisor) / 0.4)
+    elast_flete = np.where(margen_nulo, np.nan, np.abs((marg_flete_up - marg_flete_down) / divisor) / 0.4)
+
+    # Relación entre elasticidades (cuán importante es el rendimiento vs el flete)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relation = np.where(elast_flete != 0, elast_rend / elast_flete, np.inf)
+    relation = np.where(margen_nulo, np.nan, relation)
+
+    return pd.DataFrame({
+        "Cultivo": list(cultivos),
+        "Elasticidad Rendimiento": elast_rend,
+        "Elasticidad Flete": elast_flete,
+        "Relación Rendimiento/Flete": relation
+    })
+
+
+def _margen_parametros(valores, km_tabla, tarifa_tabla, recargos):
+    # valores: array (..., parámetros, cultivos) en el orden de PARAMETROS_TORNADO
+    v = dict(zip(PARAMETROS_TORNADO, np.moveaxis(valores, -2, 0)))
+    flete_usd_tn = interpolar_tramos(v["km"], km_tabla, tarifa_tabla) * (1 + recargos / 100) / v["tipo_cambio"]
+    ingreso = v["rendimiento"] * v["precio"]
+    return (ingreso * (1 - v["comercializacion"])
+            - v["labranza"] - v["semilla"] - v["agroquimicos"] - v["fertilizantes"]
+            - v["estructura"] - v["cosecha"] - v["arrendamiento"]
+            - v["rendimiento"] * flete_usd_tn)
+
+
+def analisis_tornado(cultivos, base, km_tabla, tarifa_tabla, variaciones=None, recargos=None):
+    """
+    Análisis tornado: varía cada parámetro por separado (bajo y alto) para todos los cultivos
+    y ordena los parámetros según su impacto sobre el margen directo.
+
+    Todas las perturbaciones se evalúan juntas: se apila un array (parámetro variado, nivel,
+    parámetro, cultivo) con los valores base y solo la diagonal modificada, y el margen se
+    calcula en una única pasada vectorizada.
+
+    Parámetros:
+    - cultivos: Lista de nombres de cultivos
+    - base: Diccionario parámetro -> valor base (escalar o uno por cultivo), con las claves de PARAMETROS_TORNADO
+    - km_tabla, tarifa_tabla: Tabla de fletes ($/tn por km)
+    - variaciones: Diccionario parámetro -> variación en % (por defecto la de PARAMETROS_TORNADO)
+    - recargos: Recargo de flete (%) por cultivo (por defecto según RECARGOS_FLETE_CULTIVO)
+
+    Retorna:
+    - DataFrame con una fila por cultivo y parámetro: valores bajo/alto, margen directo en cada
+      extremo, margen base, impacto (diferencia absoluta) y ranking dentro del cultivo
+    """
+    faltantes = [p for p in PARAMETROS_TORNADO if p not in base]
+    if faltantes:
+        raise ValueError("Faltan valores base para: " + ", ".join(faltantes))
+    variaciones = {**{p: v for p, (_, v) in PARAMETROS_TORNADO.items()}, **(variaciones or {})}
+    recargos = recargos_por_cultivo(cultivos) if recargos is None else np.asarray(recargos, dtype=float)
+    n_parametros, n_cultivos = len(PARAMETROS_TORNADO), len(cultivos)
+
+    valores_base = np.stack([np.broadcast_to(np.asarray(base[p], dtype=float), (n_cultivos,)) for p in PARAMETROS_TORNADO])
+    porcentajes = np.array([variaciones[p] for p in PARAMETROS_TORNADO], dtype=float) / 100
+    factores = np.stack([1 - porcentajes, 1 + porcentajes], axis=1)                  # (P, 2)
+
+    # Escenarios (P, 2, P, C): copia de la base con el parámetro p escalado en el escenario p
+    escenarios = np.broadcast_to(valores_base, (n_parametros, 2, n_parametros, n_cultivos)).copy()
+    diagonal = np.arange(n_parametros)
+    escenarios[diagonal, :, diagonal, :] *= factores[:, :, None]
+    margenes = _margen_parametros(escenarios, km_tabla, tarifa_tabla, recargos)       # (P, 2, C)
+    margen_base = _margen_parametros(valores_base, km_tabla, tarifa_tabla, recargos)  # (C,)
+
+    impacto = np.abs(margenes[:, 1, :] - margenes[:, 0, :])
+    # Ranking por cultivo (1 = parámetro de mayor impacto)
+    ranking = np.empty_like(impacto, dtype=int)
+    ranking[np.argsort(-impacto, axis=0, kind="stable"), np.arange(n_cultivos)] = np.arange(1, n_parametros + 1)[:, None]
+
+    df = pd.DataFrame({
+        "Cultivo": np.tile(np.asarray(cultivos, dtype=object), n_parametros),
+        "Parámetro": np.repeat([etiqueta for etiqueta, _ in PARAMETROS_TORNADO.values()], n_cultivos),
+        "Variación (%)": np.repeat(porcentajes * 100, n_cultivos),
+        "Valor Bajo": (valores_base * factores[:, :1]).ravel(),
+        "Valor Alto": (valores_base * factores[:, 1:]).ravel(),
+        "Margen Bajo (USD/ha)": margenes[:, 0, :].ravel(),
+        "Margen Alto (USD/ha)": margenes[:, 1, :].ravel(),
+        "Margen Base (USD/ha)": np.tile(margen_base, n_parametros),
+        "Impacto (USD/ha)": impacto.ravel(),
+        "Ranking": ranking.ravel(),
+    })
+    # Orden de los cultivos como se recibieron y, dentro de cada uno, por ranking
+    orden = np.lexsort((df["Ranking"].to_numpy(), np.tile(np.arange(n_cultivos), n_parametros)))
+    return df.iloc[orden].reset_index(drop=True)
+
+
+def riesgo_rotaciones(rotaciones, composicion, rendimientos, rendimientos_base, precios, margenes_base,
+                      superficies, percentiles=(10, 50, 90)):
+    """
+    Distribución del margen directo por rotación a partir de rendimientos simulados.
+
+    El margen de cada cultivo se ajusta por la diferencia de rendimiento valuada al precio:
+    margen = margen_base + (rendimiento - rendimiento_base) * precio.
+
+    Parámetros:
+    - rotaciones: Nombres de las rotaciones
+    - composicion: Matriz (rotaciones x cultivos) con 1 si el cultivo integra la rotación
+    - rendimientos: Array (remuestras x cultivos) de rendimientos simulados (NaN usa el base)
+    - rendimientos_base, precios, margenes_base: Valores base por cultivo
+    - superficies: Superficie de cada rotación en ha (para la fila TOTAL)
+    - percentiles: Percentiles a informar
+
+    Retorna:
+    - DataFrame con media, percentiles y probabilidad de quebranto del margen directo (USD/ha) por rotación
+    """
+    rendimientos_base = np.asarray(rendimientos_base, dtype=float)
+    rendimientos = np.where(np.isnan(rendimientos), rendimientos_base, rendimientos)
+    margenes = np.asarray(margenes_base, dtype=float) + (rendimientos - rendimientos_base) * np.asarray(precios, dtype=float)
+    margenes_rotacion = margenes @ np.asarray(composicion, dtype=float).T
+
+    # TOTAL: promedio por hectárea ponderado por la superficie de cada rotación
+    superficies = np.asarray(superficies, dtype=float)
+    if superficies.sum() > 0:
+        total = margenes_rotacion @ superficies / superficies.sum()
+        margenes_rotacion = np.column_stack([margenes_rotacion, total])
+        rotaciones = list(rotaciones) + ["TOTAL"]
+
+    df = pd.DataFrame({"Rotación": list(rotaciones), "Margen Directo Medio (USD/ha)": margenes_rotacion.mean(axis=0)})
+    for q, valores in zip(percentiles, np.percentile(margenes_rotacion, percentiles, axis=0)):
+        df[f"P{int(q)} (USD/ha)"] = valores
+    df["Prob. Quebranto (%)"] = (margenes_rotacion < 0).mean(axis=0) * 100
+    return df
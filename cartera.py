@@ -0,0 +1,173 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from comercializacion import motor_vigente, PARAMETROS_DEFAULT
+
+# Tabla de lotes de la cartera (un registro por lote y cultivo de la campaña).
+# Columnas:
+# - lote: Identificador del lote
+# - zona: Zona o establecimiento
+# - cultivo: Nombre del cultivo (mismos nombres que datos_cultivos)
+# - superficie: Hectáreas
+# - rendimiento: Rendimiento esperado en tn/ha
+# - precio: Precio en USD/tn
+# - km: Distancia al punto de entrega
+# - proporcion_arrendada: Fracción de la superficie arrendada (0 = propio, 1 = arrendado)
+# - contrato: Identificador del contrato de arrendamiento (vacío si es propio)
+COLUMNAS_LOTES = ["lote", "zona", "cultivo", "superficie", "rendimiento", "precio", "km",
+                  "proporcion_arrendada", "contrato"]
+
+# Valores por defecto para columnas opcionales
+KM_DEFAULT = 100
+PROPORCION_ARRENDADA_DEFAULT = 0.3
+CONTRATO_DEFAULT = "default"
+
+# Costos por defecto de la Calculadora
+ESTRUCTURA_DEFAULT = 50            # USD/ha
+COSECHA_DEFAULT = 90               # USD/ha
+FRACCION_COMERCIALIZACION = 0.1    # Fracción del ingreso bruto (campo de la Calculadora sin motor)
+FRACCION_LABRANZA = 0.2            # Parte de los costos directos por defecto que corresponde a labranza
+
+
+def _valores_por_cultivo(df_comparativo, variable):
+    # Devuelve un diccionario cultivo -> valor para una fila de la tabla comparativa
+    fila = df_comparativo[df_comparativo["Variable"] == variable].iloc[0]
+    return {cultivo: float(fila[cultivo]) for cultivo in df_comparativo.columns[1:]}
+
+
+@lru_cache(maxsize=None)
+def _motor_comercializacion_default():
+    return motor_vigente(PARAMETROS_DEFAULT)
+
+
+def completar_lotes(df_lotes, df_comparativo):
+    """
+    Completa las columnas faltantes de una tabla de lotes con los valores por defecto.
+
+    Parámetros:
+    - df_lotes: DataFrame con al menos las columnas lote, cultivo y superficie
+    - df_comparativo: Tabla comparativa de cultivos (fuente de rendimiento y precio por defecto)
+
+    Retorna:
+    - DataFrame con todas las columnas de COLUMNAS_LOTES
+    """
+    df = df_lotes.copy()
+    faltantes = [c for c in ("lote", "cultivo", "superficie") if c not in df.columns]
+    if faltantes:
+        raise ValueError("Faltan columnas obligatorias en la tabla de lotes: " + ", ".join(faltantes))
+
+    rendimientos = _valores_por_cultivo(df_comparativo, "Rendimiento tn")
+    precios = _valores_por_cultivo(df_comparativo, "USD/tn")
+    desconocidos = sorted(set(df["cultivo"]) - set(rendimientos))
+    if desconocidos:
+        raise ValueError("Cultivos desconocidos en la tabla de lotes: " + ", ".join(desconocidos))
+
+    duplicados = df.duplicated(["lote", "cultivo"], keep=False)
+    if duplicados.any():
+        pares = sorted(set(df.loc[duplicados, "lote"].astype(str) + " | " + df.loc[duplicados, "cultivo"].astype(str)))
+        raise ValueError("Lotes repetidos (lote y cultivo) en la tabla de lotes: " + ", ".join(pares))
+
+    if "zona" not in df.columns:
+        df["zona"] = "General"
+    if "rendimiento" not in df.columns:
+        df["rendimiento"] = np.nan
+    df["rendimiento"] = df["rendimiento"].fillna(df["cultivo"].map(rendimientos))
+    if "precio" not in df.columns:
+        df["precio"] = np.nan
+    df["precio"] = df["precio"].fillna(df["cultivo"].map(precios))
+    if "km" not in df.columns:
+        df["km"] = np.nan
+    df["km"] = df["km"].fillna(KM_DEFAULT)
+    if "proporcion_arrendada" not in df.columns:
+        df["proporcion_arrendada"] = np.nan
+    df["proporcion_arrendada"] = df["proporcion_arrendada"].fillna(PROPORCION_ARRENDADA_DEFAULT)
+    if "contrato" not in df.columns:
+        df["contrato"] = CONTRATO_DEFAULT
+    # Un lote con superficie arrendada y la celda de contrato vacía usa el contrato por defecto
+    df["contrato"] = df["contrato"].fillna("").astype(str).str.strip()
+    df.loc[(df["contrato"] == "") & (df["proporcion_arrendada"].astype(float) > 0), "contrato"] = CONTRATO_DEFAULT
+
+    for columna in ("superficie", "rendimiento", "precio", "km", "proporcion_arrendada"):
+        df[columna] = df[columna].astype(float)
+    if ((df["proporcion_arrendada"] < 0) | (df["proporcion_arrendada"] > 1)).any():
+        raise ValueError("La proporción arrendada debe estar entre 0 y 1")
+
+    return df[COLUMNAS_LOTES].reset_index(drop=True)
+
+
+def cargar_lotes(ruta, df_comparativo):
+    """
+    Carga la tabla de lotes desde un archivo CSV.
+
+    Parámetros:
+    - ruta: Ruta o archivo CSV (separado por comas, con encabezado)
+    - df_comparativo: Tabla comparativa de cultivos (valores por defecto)
+
+    Retorna:
+    - DataFrame de lotes completo
+    """
+    return completar_lotes(pd.read_csv(ruta), df_comparativo)
+
+
+def lotes_desde_comparativo(df_comparativo):
+    """
+    Arma una cartera de ejemplo con un lote por cultivo de la tabla comparativa.
+
+    Parámetros:
+    - df_comparativo: Tabla comparativa de cultivos
+
+    Retorna:
+    - DataFrame de lotes completo
+    """
+    superficies = _valores_por_cultivo(df_comparativo, "Superficie Ha")
+    df = pd.DataFrame({
+        "lote": ["Lote " + cultivo for cultivo in superficies],
+        "cultivo": list(superficies),
+        "superficie": list(superficies.values())
+    })
+    return completar_lotes(df, df_comparativo)
+
+
+def costos_lotes(df_lotes, df_comparativo, costos_directos=None, cosecha=None, labores=None, comercializacion=None):
+    """
+    Costos por hectárea de cada lote con los mismos valores por defecto que la Calculadora.
+
+    Parámetros:
+    - df_lotes: DataFrame de lotes completo
+    - df_comparativo: Tabla comparativa de cultivos (fuente de los costos directos)
+    - costos_directos: Costos directos por lote en USD/ha (opcional, por ejemplo desde la receta de insumos;
+      si se indican labores, sin la categoría Labranza)
+    - cosecha: Costo de cosecha por lote en USD/ha (opcional, por ejemplo desde la tarifa del contratista)
+    - labores: Costo de labores por lote en USD/ha (opcional, por ejemplo desde la tarifa del contratista);
+      reemplaza la parte de labranza de los costos directos
+    - comercializacion: MotorComercializacion para los gastos de venta (por defecto, los parámetros vigentes)
+
+    Retorna:
+    - Diccionario de arrays por lote: costos_directos, estructura, cosecha, comercializacion (USD/ha),
+      fraccion_comercializacion (corretaje, fracción del ingreso bruto) y comercializacion_usd_tn (cargos fijos)
+    """
+    if costos_directos is None:
+        costos_cultivo = _valores_por_cultivo(df_comparativo, "Total costos directos / ha")
+        costos_directos = df_lotes["cultivo"].map(costos_cultivo).to_numpy(dtype=float)
+        if labores is not None:
+            costos_directos = costos_directos * (1 - FRACCION_LABRANZA)
+    costos_directos = np.asarray(costos_directos, dtype=float)
+    if labores is not None:
+        costos_directos = costos_directos + np.asarray(labores, dtype=float)
+    # Gastos de venta por lote con el motor de comercialización (los precios de los lotes son FAS)
+    if comercializacion is None:
+        comercializacion = _motor_comercializacion_default()
+    comercial = comercializacion.aplicar(df_lotes["cultivo"], df_lotes["precio"].to_numpy(dtype=float),
+                                         df_lotes["rendimiento"].to_numpy(dtype=float))
+    corretaje, cargos_tn = comercializacion.gastos_venta(df_lotes["cultivo"])
+    n = len(df_lotes)
+    return {
+        "costos_directos": costos_directos,
+        "estructura": np.full(n, float(ESTRUCTURA_DEFAULT)),
+        "cosecha": np.full(n, float(COSECHA_DEFAULT)) if cosecha is None else np.asarray(cosecha, dtype=float),
+        "comercializacion": comercial["comercializacion_ha"],
+        "fraccion_comercializacion": corretaje,
+        "comercializacion_usd_tn": cargos_tn,
+    }
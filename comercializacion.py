@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+# Motor de comercialización: derechos de exportación (retenciones) y gastos de venta.
+# Los parámetros son datos versionados: cada versión tiene una fecha de vigencia y las
+# alícuotas por cultivo, de modo que un cambio de retenciones es una nueva versión.
+#
+# Precio FAS (puesto en el campo/puerto, neto de retenciones) a partir del FOB:
+#   precio_fas = precio_fob * (1 - retencion_pct/100) - gastos_fobbing_usd_tn
+# Gastos de comercialización por tonelada:
+#   corretaje (% del precio FAS) + paritaria + secada + acondicionamiento (USD/tn)
+
+COLUMNAS_PARAMETROS = ["version", "vigencia_desde", "cultivo", "retencion_pct", "gastos_fobbing_usd_tn",
+                       "corretaje_pct", "paritaria_usd_tn", "secada_usd_tn", "acondicionamiento_usd_tn"]
+
+# Producto comercial de cada cultivo de la tabla comparativa
+PRODUCTO_CULTIVO = {"Soja 1ra": "Soja", "Soja 2da": "Soja", "Maíz": "Maíz", "Maíz 2da": "Maíz",
+                    "Maíz Tardío": "Maíz", "Trigo": "Trigo", "Girasol": "Girasol"}
+
+# Valores de ejemplo por producto: (retención %, fobbing, corretaje %, paritaria, secada, acondicionamiento).
+# Deben verificarse contra la normativa y los contratos vigentes antes de usarse.
+_VERSIONES = {
+    ("2024", "2024-01-01"): {
+        "Soja": (33.0, 12.0, 1.0, 0.5, 0.0, 1.5),
+        "Maíz": (12.0, 12.0, 1.0, 0.5, 6.0, 1.5),
+        "Trigo": (12.0, 12.0, 1.0, 0.5, 0.0, 1.5),
+        "Girasol": (7.0, 12.0, 1.0, 0.5, 2.0, 1.5),
+    },
+    ("2025-reduccion", "2025-01-27"): {
+        "Soja": (26.0, 12.0, 1.0, 0.5, 0.0, 1.5),
+        "Maíz": (9.5, 12.0, 1.0, 0.5, 6.0, 1.5),
+        "Trigo": (9.5, 12.0, 1.0, 0.5, 0.0, 1.5),
+        "Girasol": (5.5, 12.0, 1.0, 0.5, 2.0, 1.5),
+    },
+}
+PARAMETROS_DEFAULT = pd.DataFrame(
+    [(version, vigencia, cultivo) + valores[producto]
+     for (version, vigencia), valores in _VERSIONES.items()
+     for cultivo, producto in PRODUCTO_CULTIVO.items()],
+    columns=COLUMNAS_PARAMETROS
+)
+
+
+def cargar_parametros(ruta):
+    """Carga versiones de parámetros de comercialización desde un archivo CSV."""
+    df = pd.read_csv(ruta)
+    faltantes = [c for c in COLUMNAS_PARAMETROS if c not in df.columns]
+    if faltantes:
+        raise ValueError("Faltan columnas en los parámetros de comercialización: " + ", ".join(faltantes))
+    return df[COLUMNAS_PARAMETROS]
+
+
+def parametros_vigentes(df_parametros, fecha=None):
+    """
+    Parámetros vigentes por cultivo a una fecha (la última versión con vigencia anterior o igual).
+
+    Parámetros:
+    - df_parametros: Tabla de versiones de parámetros
+    - fecha: Fecha de referencia (por defecto, la versión más reciente)
+
+    Retorna:
+    - DataFrame con una fila por cultivo
+    """
+    df = df_parametros.copy()
+    df["vigencia_desde"] = pd.to_datetime(df["vigencia_desde"])
+    if fecha is not None:
+        df = df[df["vigencia_desde"] <= pd.Timestamp(fecha)]
+    if df.empty:
+        raise ValueError("No hay parámetros de comercialización vigentes a la fecha indicada")
+    df = df.sort_values("vigencia_desde").groupby("cultivo", sort=False).tail(1)
+    return df.reset_index(drop=True)
+
+
+class MotorComercializacion:
+    """
+    Aplica retenciones y gastos de comercialización a muchos lotes a la vez.
+
+    Las alícuotas se guardan como arrays por cultivo; cada evaluación toma los valores de
+    cada lote por índice y aplica las deducciones en forma vectorizada.
+    """
+
+    def __init__(self, df_vigentes):
+        self.cultivos = df_vigentes["cultivo"].tolist()
+        self.version = dict(zip(df_vigentes["cultivo"], df_vigentes["version"]))
+        self._retencion = df_vigentes["retencion_pct"].to_numpy(dtype=float) / 100
+        self._fobbing = df_vigentes["gastos_fobbing_usd_tn"].to_numpy(dtype=float)
+        self._corretaje = df_vigentes["corretaje_pct"].to_numpy(dtype=float) / 100
+        self._cargos_tn = (df_vigentes["paritaria_usd_tn"].to_numpy(dtype=float)
+                           + df_vigentes["secada_usd_tn"].to_numpy(dtype=float)
+                           + df_vigentes["acondicionamiento_usd_tn"].to_numpy(dtype=float))
+
+    def _indices(self, cultivos):
+        idx = pd.Index(self.cultivos).get_indexer(list(np.atleast_1d(cultivos)))
+        if (idx < 0).any():
+            raise ValueError("Cultivos sin parámetros de comercialización: "
+                             + ", ".join(sorted(set(np.atleast_1d(cultivos)[idx < 0]))))
+        return idx
+
+    def retenciones(self):
+        """Alícuotas de retención vigentes (%) por cultivo."""
+        return dict(zip(self.cultivos, self._retencion * 100))
+
+    def con_retenciones(self, retenciones):
+        """
+        Devuelve un motor nuevo con otras alícuotas de retención.
+
+        Parámetros:
+        - retenciones: Diccionario cultivo -> retención en %
+
+        Retorna:
+        - MotorComercializacion con las alícuotas modificadas
+        """
+        nuevo = object.__new__(MotorComercializacion)
+        nuevo.__dict__.update(self.__dict__)
+        nuevo._retencion = self._retencion.copy()
+        nuevo._retencion[self._indices(list(retenciones))] = np.array(list(retenciones.values()), dtype=float) / 100
+        return nuevo
+
+    def precio_fas(self, cultivos, precio_fob):
+        """Precio FAS (USD/tn) a partir del precio FOB, neto de retenciones y gastos de exportación."""
+        idx = self._indices(cultivos)
+        return np.asarray(precio_fob, dtype=float) * (1 - self._retencion[idx]) - self._fobbing[idx]
+
+    def precio_fob_implicito(self, cultivos, precio_fas):
+        """Precio FOB (USD/tn) que corresponde a un precio FAS con las alícuotas actuales."""
+        idx = self._indices(cultivos)
+        return (np.asarray(precio_fas, dtype=float) + self._fobbing[idx]) / (1 - self._retencion[idx])
+
+    def gastos_venta(self, cultivos):
+        """
+        Componentes de los gastos de comercialización de cada lote.
+
+        Parámetros:
+        - cultivos: Cultivo de cada lote
+
+        Retorna:
+        - Tupla (corretaje como fracción del precio FAS, cargos fijos en USD/tn) con arrays por lote
+        """
+        idx = self._indices(cultivos)
+        return self._corretaje[idx], self._cargos_tn[idx]
+
+    def aplicar(self, cultivos, precio, rendimiento, precio_es_fob=False):
+        """
+        Calcula el precio neto y los gastos de comercialización de todos los lotes.
+
+        Parámetros:
+        - cultivos: Cultivo de cada lote
+        - precio: Precio por lote en USD/tn (FAS, o FOB si precio_es_fob)
+        - rendimiento: Rendimiento por lote en tn/ha
+        - precio_es_fob: Si es True se descuentan retenciones y fobbing para llegar al FAS
+
+        Retorna:
+        - Diccionario de arrays por lote: precio_fas, retencion_usd_tn, gastos_usd_tn,
+          comercializacion_ha (USD/ha) e ingreso_neto_ha (USD/ha)
+        """
+        idx = self._indices(cultivos)
+        precio = np.asarray(precio, dtype=float) + np.zeros(len(idx))
+        if precio_es_fob:
+            retencion_usd_tn = precio * self._retencion[idx]
+            fas = precio - retencion_usd_tn - self._fobbing[idx]
+        else:
+            retencion_usd_tn = np.zeros_like(precio)
+            fas = precio
+        gastos_usd_tn = fas * self._corretaje[idx] + self._cargos_tn[idx]
+        rendimiento = np.asarray(rendimiento, dtype=float)
+        return {
+            "precio_fas": fas,
+            "retencion_usd_tn": retencion_usd_tn,
+            "gastos_usd_tn": gastos_usd_tn,
+            "comercializacion_ha": gastos_usd_tn * rendimiento,
+            "ingreso_neto_ha": (fas - gastos_usd_tn) * rendimiento,
+        }
+
+    def reprecio(self, otro, cultivos, precio_fas):
+        """
+        Lleva precios FAS calculados con este motor a los de otro motor (por ejemplo, nuevas retenciones).
+
+        Parámetros:
+        - otro: MotorComercializacion con los parámetros nuevos
+        - cultivos: Cultivo de cada lote
+        - precio_fas: Precio FAS actual por lote
+
+        Retorna:
+        - Array con el precio FAS nuevo por lote (mismo FOB implícito)
+        """
+        return otro.precio_fas(cultivos, self.precio_fob_implicito(cultivos, precio_fas))
+
+
+def motor_vigente(df_parametros, fecha=None):
+    """Arma el motor de comercialización con los parámetros vigentes a una fecha."""
+    return MotorComercializacion(parametros_vigentes(df_parametros, fecha))
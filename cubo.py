@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+
+# Cubo de márgenes preagregado para navegar la cartera (zona → lote → cultivo, campañas).
+# Se guardan las sumas de todas las combinaciones de dimensiones: para cada
+# fila se acumula en cada subconjunto de dimensiones, con TODOS en las que no participan.
+# Un total con cualquier filtro es entonces una búsqueda de una clave, y el desglose de
+# una celda filtra las celdas hijas. El cubo se actualiza en forma incremental: agregar
+# suma filas nuevas y actualizar reemplaza las filas de los ids que cambiaron (resta lo
+# anterior y suma lo nuevo), sin reagrupar la tabla completa.
+#
+# Representación compacta (una cartera de miles de lotes tiene decenas de miles de celdas):
+# cada valor de dimensión se guarda una sola vez y se codifica con un entero, como en una
+# columna categórica; la clave de una celda es un único entero con los códigos de sus
+# dimensiones empaquetados; y las claves y las sumas de todas las celdas están en dos
+# arrays ordenados por clave, sin objetos por celda.
+
+TODOS = "*"
+
+# Bits de la clave empaquetada (se reparten entre las dimensiones)
+BITS_CLAVE = 63
+
+
+class CuboMargenes:
+    """
+    Cubo de sumas por todas las combinaciones de dimensiones.
+
+    Parámetros:
+    - dimensiones: Columnas categóricas (por ejemplo zona, lote, cultivo)
+    - medidas: Columnas numéricas a sumar (hectáreas, ingresos, costos, márgenes en USD)
+    """
+
+    def __init__(self, dimensiones, medidas):
+        self.dimensiones = list(dimensiones)
+        self.medidas = list(medidas)
+        d = len(self.dimensiones)
+        self._bits = BITS_CLAVE // max(1, d)
+        self._categorias = [[] for _ in range(d)]    # código -> valor de cada dimensión
+        self._codigos = [{} for _ in range(d)]       # valor -> código de cada dimensión
+        # Celdas ordenadas por clave: sumas de las medidas (+ cantidad de filas al final)
+        self._claves = np.empty(0, dtype=np.int64)
+        self._sumas = np.empty((0, len(self.medidas) + 1))
+        # Filas cargadas con actualizar: ids, códigos de sus dimensiones y sus medidas
+        self._ids = pd.Index([], dtype=object)
+        self._filas_codigos = np.empty((0, d), dtype=np.int64)
+        self._filas_valores = np.empty((0, len(self.medidas) + 1))
+
+    def __len__(self):
+        return len(self._claves)
+
+    @property
+    def ids(self):
+        """Ids de las filas cargadas con actualizar."""
+        return list(self._ids)
+
+    def _codificar(self, dims):
+        # Códigos de las dimensiones de cada fila (los valores nuevos reciben el código siguiente)
+        codigos = np.empty((len(dims), len(self.dimensiones)), dtype=np.int64)
+        for j in range(len(self.dimensiones)):
+            locales, unicos = pd.factorize(dims.iloc[:, j])
+            tabla = self._codigos[j]
+            for valor in unicos:
+                if valor not in tabla:
+                    tabla[valor] = len(self._categorias[j])
+                    self._categorias[j].append(valor)
+            if len(self._categorias[j]) >= 2 ** self._bits - 1:
+                raise ValueError(f"Demasiados valores distintos en la dimensión {self.dimensiones[j]}")
+            codigos[:, j] = np.array([tabla[valor] for valor in unicos], dtype=np.int64)[locales]
+        return codigos
+
+    def _empaquetar(self, codigos):
+        # Una clave entera por fila de códigos (-1 = TODOS); cada dimensión ocupa self._bits bits
+        desplazamientos = self._bits * np.arange(len(self.dimensiones), dtype=np.int64)
+        return ((codigos + 1) << desplazamientos).sum(axis=1)
+
+    def _desempaquetar(self, claves):
+        desplazamientos = self._bits * np.arange(len(self.dimensiones), dtype=np.int64)
+        return ((claves[:, None] >> desplazamientos) & (2 ** self._bits - 1)) - 1
+
+    def _acumular(self, codigos, valores, signo):
+        # codigos: array (n, dimensiones); valores: array (n, medidas + 1) con la cantidad al final
+        if len(codigos) == 0:
+            return
+        d = len(self.dimensiones)
+        lote = pd.DataFrame(valores * signo)
+        claves, sumas = [], []
+        for mascara in range(2 ** d):
+            incluidas = np.array([mascara >> j & 1 for j in range(d)], dtype=bool)
+            if incluidas.any():
+                grupos = lote.groupby(self._empaquetar(np.where(incluidas, codigos, -1)), sort=True).sum()
+                claves.append(grupos.index.to_numpy(dtype=np.int64))
+                sumas.append(grupos.to_numpy())
+            else:
+                claves.append(np.zeros(1, dtype=np.int64))
+                sumas.append(lote.sum().to_numpy()[None, :])
+        claves = np.concatenate(claves)
+        sumas = np.concatenate(sumas)
+        orden = np.argsort(claves, kind="stable")
+        claves, sumas = claves[orden], sumas[orden]
+
+        # Las celdas existentes se suman en su lugar; las nuevas se insertan manteniendo el orden
+        posiciones = np.searchsorted(self._claves, claves)
+        existe = posiciones < len(self._claves)
+        existe[existe] = self._claves[posiciones[existe]] == claves[existe]
+        self._sumas[posiciones[existe]] += sumas[existe]
+        nuevas = ~existe
+        if nuevas.any():
+            self._claves = np.insert(self._claves, posiciones[nuevas], claves[nuevas])
+            self._sumas = np.insert(self._sumas, posiciones[nuevas], sumas[nuevas], axis=0)
+        # Celdas sin filas: se eliminan
+        vacias = self._sumas[:, -1] <= 0
+        if vacias.any():
+            self._claves = self._claves[~vacias]
+            self._sumas = self._sumas[~vacias]
+
+    def _preparar(self, df):
+        dims = df[self.dimensiones].astype(str)
+        valores = np.column_stack([df[self.medidas].to_numpy(dtype=float), np.ones(len(df))])
+        return self._codificar(dims), valores
+
+    def agregar(self, df):
+        """Suma filas nuevas al cubo."""
+        codigos, valores = self._preparar(df)
+        self._acumular(codigos, valores, 1.0)
+
+    def actualizar(self, df, columna_id):
+        """
+        Reemplaza en el cubo las filas identificadas por columna_id (por ejemplo el lote).
+
+        Solo se tocan los ids nuevos o cuyas dimensiones o medidas cambiaron; los ids que
+        ya no están en df no se modifican (usar quitar).
+
+        Retorna:
+        - Cantidad de filas que cambiaron
+        """
+        codigos, valores = self._preparar(df)
+        ids = pd.Index(df[columna_id].astype(str).to_numpy(dtype=object))
+        posiciones = self._ids.get_indexer(ids)
+        existe = posiciones >= 0
+        previas = posiciones[existe]
+        iguales = np.zeros(len(ids), dtype=bool)
+        iguales[existe] = ((self._filas_codigos[previas] == codigos[existe]).all(axis=1)
+                           & (self._filas_valores[previas] == valores[existe]).all(axis=1))
+        cambiadas = ~iguales
+        reemplazadas = cambiadas & existe
+        if reemplazadas.any():
+            filas = posiciones[reemplazadas]
+            self._acumular(self._filas_codigos[filas], self._filas_valores[filas], -1.0)
+            self._filas_codigos[filas] = codigos[reemplazadas]
+            self._filas_valores[filas] = valores[reemplazadas]
+        if cambiadas.any():
+            self._acumular(codigos[cambiadas], valores[cambiadas], 1.0)
+        nuevas = cambiadas & ~existe
+        if nuevas.any():
+            self._ids = self._ids.append(ids[nuevas])
+            self._filas_codigos = np.concatenate([self._filas_codigos, codigos[nuevas]])
+            self._filas_valores = np.concatenate([self._filas_valores, valores[nuevas]])
+        return int(cambiadas.sum())
+
+    def quitar(self, ids):
+        """Quita del cubo las filas con los ids indicados (cargadas con actualizar)."""
+        posiciones = self._ids.get_indexer(pd.Index([str(i) for i in ids], dtype=object))
+        posiciones = posiciones[posiciones >= 0]
+        if len(posiciones):
+            self._acumular(self._filas_codigos[posiciones], self._filas_valores[posiciones], -1.0)
+            self._ids = self._ids.delete(posiciones)
+            self._filas_codigos = np.delete(self._filas_codigos, posiciones, axis=0)
+            self._filas_valores = np.delete(self._filas_valores, posiciones, axis=0)
+
+    def _clave(self, filtros):
+        # Códigos de la celda (-1 = TODOS); None si algún valor no está en el cubo
+        desconocidas = set(filtros) - set(self.dimensiones)
+        if desconocidas:
+            raise KeyError("Dimensiones inexistentes: " + ", ".join(sorted(desconocidas)))
+        codigos = []
+        for j, dimension in enumerate(self.dimensiones):
+            if filtros.get(dimension) is None:
+                codigos.append(-1)
+            elif str(filtros[dimension]) in self._codigos[j]:
+                codigos.append(self._codigos[j][str(filtros[dimension])])
+            else:
+                return None
+        return np.array(codigos, dtype=np.int64)
+
+    def _fila(self, codigos):
+        # Posición de una celda en los arrays (None si no existe)
+        if codigos is None:
+            return None
+        clave = self._empaquetar(codigos[None, :])[0]
+        posicion = np.searchsorted(self._claves, clave)
+        return posicion if posicion < len(self._claves) and self._claves[posicion] == clave else None
+
+    def _hijas(self, dimension, filtros):
+        # Posiciones de las celdas que abren la celda de filtros por dimension, ordenadas por valor
+        j = self.dimensiones.index(dimension)
+        padre = self._clave(filtros)
+        if padre is None or padre[j] != -1:
+            return j, np.empty(0, dtype=np.int64)
+        codigos = self._desempaquetar(self._claves)
+        otras = np.arange(len(self.dimensiones)) != j
+        posiciones = np.flatnonzero((codigos[:, otras] == padre[otras]).all(axis=1) & (codigos[:, j] >= 0))
+        valores = [self._categorias[j][c] for c in codigos[posiciones, j]]
+        return j, posiciones[sorted(range(len(valores)), key=valores.__getitem__)]
+
+    def total(self, **filtros):
+        """
+        Sumas de una celda del cubo (búsqueda directa, sin recorrer filas).
+
+        Parámetros:
+        - filtros: dimension=valor (las dimensiones omitidas se suman completas)
+
+        Retorna:
+        - Diccionario medida -> suma, más "filas" (cantidad de filas agregadas)
+        """
+        posicion = self._fila(self._clave(filtros))
+        celda = np.zeros(len(self.medidas) + 1) if posicion is None else self._sumas[posicion]
+        return dict(zip(self.medidas + ["filas"], celda.tolist()))
+
+    def valores(self, dimension, **filtros):
+        """Valores presentes de una dimensión dentro de una celda."""
+        j, posiciones = self._hijas(dimension, filtros)
+        return [self._categorias[j][c] for c in self._desempaquetar(self._claves[posiciones])[:, j]]
+
+    def desglose(self, dimension, **filtros):
+        """
+        Desglose de una celda por una dimensión (drill-down).
+
+        Parámetros:
+        - dimension: Dimensión por la que abrir la celda
+        - filtros: dimension=valor que definen la celda
+
+        Retorna:
+        - DataFrame con una fila por valor de la dimensión y las sumas de cada medida
+        """
+        j, posiciones = self._hijas(dimension, filtros)
+        df = pd.DataFrame(self._sumas[posiciones], columns=self.medidas + ["filas"])
+        df.insert(0, dimension, [self._categorias[j][c] for c in self._desempaquetar(self._claves[posiciones])[:, j]])
+        return df
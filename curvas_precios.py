@@ -0,0 +1,174 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_calculos import CacheCalculos
+from comercializacion import PRODUCTO_CULTIVO
+
+# Curvas de precios futuros por mes de entrega, a partir de archivos de ajustes locales.
+# Cada archivo CSV de ajustes tiene las columnas:
+# - fecha: Fecha del ajuste (AAAA-MM-DD)
+# - producto: Soja, Maíz, Trigo o Girasol
+# - mes_entrega: Mes de entrega del contrato (AAAA-MM)
+# - ajuste: Precio de ajuste en USD/tn
+# Opcionalmente la columna contrato (por ejemplo "SOJ.ROS/MAY26"), que solo se informa.
+COLUMNAS_AJUSTES = ["fecha", "producto", "mes_entrega", "ajuste"]
+
+# Mes de cosecha (entrega) de cada cultivo
+MES_COSECHA = {"Soja 1ra": 5, "Soja 2da": 6, "Maíz": 4, "Maíz 2da": 7, "Maíz Tardío": 7,
+               "Trigo": 12, "Girasol": 3}
+
+# Las campañas empiezan en julio: los meses de julio a diciembre pertenecen al primer año
+MES_INICIO_CAMPANA = 7
+
+
+def _mes_ordinal(anio, mes):
+    # Mes como número entero consecutivo (para interpolar en el tiempo)
+    return np.asarray(anio) * 12 + np.asarray(mes) - 1
+
+
+def cargar_ajustes(archivos):
+    """
+    Carga archivos de ajustes de futuros.
+
+    Parámetros:
+    - archivos: Directorio, ruta, o lista de rutas/archivos CSV
+
+    Retorna:
+    - DataFrame con fecha, producto, mes_entrega (ordinal) y ajuste
+    """
+    if isinstance(archivos, (str, os.PathLike)) and os.path.isdir(archivos):
+        archivos = sorted(glob.glob(os.path.join(archivos, "*.csv")))
+    elif isinstance(archivos, (str, os.PathLike)) or hasattr(archivos, "read"):
+        archivos = [archivos]
+    if not archivos:
+        raise ValueError("No se encontraron archivos de ajustes")
+
+    df = pd.concat([pd.read_csv(archivo) for archivo in archivos], ignore_index=True)
+    faltantes = [c for c in COLUMNAS_AJUSTES if c not in df.columns]
+    if faltantes:
+        raise ValueError("Faltan columnas en los archivos de ajustes: " + ", ".join(faltantes))
+
+    entrega = pd.to_datetime(df["mes_entrega"], format="%Y-%m")
+    return pd.DataFrame({
+        "fecha": pd.to_datetime(df["fecha"]).to_numpy(dtype="datetime64[D]"),
+        "producto": df["producto"].astype(str),
+        "mes_entrega": _mes_ordinal(entrega.dt.year.to_numpy(), entrega.dt.month.to_numpy()),
+        "ajuste": df["ajuste"].to_numpy(dtype=float),
+    })
+
+
+def mes_entrega_cultivo(cultivos, anio_inicio_campana):
+    """
+    Mes de entrega (ordinal) de cada cultivo para una campaña.
+
+    Parámetros:
+    - cultivos: Cultivo de cada lote
+    - anio_inicio_campana: Primer año de la campaña (2025 para la 2025/26)
+
+    Retorna:
+    - Array de meses ordinales
+    """
+    meses = np.array([MES_COSECHA[c] for c in cultivos])
+    anios = np.where(meses >= MES_INICIO_CAMPANA, anio_inicio_campana, anio_inicio_campana + 1)
+    return _mes_ordinal(anios, meses)
+
+
+class CurvasPrecios:
+    """
+    Índice de ajustes por contrato (producto y mes de entrega) y fecha.
+
+    Los ajustes se ordenan una vez por producto, mes de entrega y fecha; cada contrato
+    queda como un tramo contiguo de los arrays, de modo que la consulta "al día" es una
+    búsqueda binaria. Las curvas armadas a una fecha se guardan en un caché.
+    """
+
+    def __init__(self, df_ajustes, max_curvas_cache=256):
+        df = df_ajustes.sort_values(["producto", "mes_entrega", "fecha"]).drop_duplicates(
+            ["producto", "mes_entrega", "fecha"], keep="last")
+        self._fechas = df["fecha"].to_numpy(dtype="datetime64[D]")
+        self._ajustes = df["ajuste"].to_numpy(dtype=float)
+        self._contratos = {}  # producto -> (meses de entrega, inicios, fines)
+        productos = df["producto"].to_numpy()
+        meses = df["mes_entrega"].to_numpy()
+        cortes = np.flatnonzero((productos[1:] != productos[:-1]) | (meses[1:] != meses[:-1])) + 1
+        inicios = np.concatenate([[0], cortes])
+        fines = np.concatenate([cortes, [len(df)]])
+        for producto in pd.unique(productos):
+            tramos = productos[inicios] == producto
+            self._contratos[producto] = (meses[inicios[tramos]], inicios[tramos], fines[tramos])
+        self._cache = CacheCalculos(max_entradas=max_curvas_cache)
+
+    @property
+    def productos(self):
+        return list(self._contratos)
+
+    def _curva_sin_cache(self, producto, fecha):
+        if producto not in self._contratos:
+            # Sin ajustes para el producto: curva vacía (precio() devuelve NaN)
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        meses, inicios, fines = self._contratos[producto]
+        fecha = np.datetime64(fecha, "D")
+        precios = np.full(len(meses), np.nan)
+        for i, (inicio, fin) in enumerate(zip(inicios, fines)):
+            # Último ajuste con fecha anterior o igual a la consultada
+            pos = np.searchsorted(self._fechas[inicio:fin], fecha, side="right") - 1
+            if pos >= 0:
+                precios[i] = self._ajustes[inicio + pos]
+        validos = ~np.isnan(precios)
+        return meses[validos], precios[validos]
+
+    def curva(self, producto, fecha):
+        """
+        Curva de precios de un producto al día indicado.
+
+        Parámetros:
+        - producto: Soja, Maíz, Trigo o Girasol
+        - fecha: Fecha de consulta
+
+        Retorna:
+        - Tupla (meses de entrega ordinales, precios USD/tn), con el último ajuste conocido de cada contrato
+        """
+        return self._cache.memoizar("curva", self._curva_sin_cache, producto, str(np.datetime64(fecha, "D")))
+
+    def precio(self, productos, meses_entrega, fecha):
+        """
+        Precio al día para muchos productos y meses de entrega, interpolando entre contratos.
+
+        Fuera del rango de contratos listados se usa el contrato más cercano.
+
+        Parámetros:
+        - productos: Producto de cada consulta
+        - meses_entrega: Mes de entrega ordinal de cada consulta
+        - fecha: Fecha de consulta
+
+        Retorna:
+        - Array de precios en USD/tn (NaN si el producto no tiene ajustes a esa fecha)
+        """
+        productos = np.asarray(productos)
+        meses_entrega = np.asarray(meses_entrega, dtype=float)
+        resultado = np.full(len(productos), np.nan)
+        for producto in pd.unique(productos):
+            mascara = productos == producto
+            meses, precios = self.curva(producto, fecha)
+            if len(meses):
+                resultado[mascara] = np.interp(meses_entrega[mascara], meses, precios)
+        return resultado
+
+    def precios_lotes(self, cultivos, fecha, anio_inicio_campana):
+        """
+        Precio del mes de cosecha de cada lote al día indicado.
+
+        Parámetros:
+        - cultivos: Cultivo de cada lote
+        - fecha: Fecha de consulta
+        - anio_inicio_campana: Primer año de la campaña
+
+        Retorna:
+        - Array de precios en USD/tn
+        """
+        cultivos = list(cultivos)
+        productos = [PRODUCTO_CULTIVO[c] for c in cultivos]
+        return self.precio(productos, mes_entrega_cultivo(cultivos, anio_inicio_campana), fecha)
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+from calculos import calcular_costo_flete_vectorizado, recargos_por_cultivo
+from cartera import costos_lotes
+
+# Puntos de equilibrio (margen directo = 0) resueltos en forma cerrada.
+# El margen directo por hectárea es lineal en rendimiento y precio:
+#   MD = rendimiento * (precio * (1 - deduccion_ingreso) - flete_usd_tn) - costos_fijos_ha
+# donde deduccion_ingreso agrupa los costos proporcionales al ingreso (corretaje,
+# arrendamiento a porcentaje) y costos_fijos_ha el resto de los costos por hectárea.
+# En la cartera, los cargos de venta por tonelada se suman al flete como costo por tonelada.
+
+# Lotes procesados por bloque al invertir la tabla de fletes (acota la memoria temporal)
+TAMANO_BLOQUE_FLETE = 4096
+
+
+def equilibrio_rendimiento(precio, costos_fijos_ha, flete_usd_tn=0.0, deduccion_ingreso=0.0):
+    """
+    Rendimiento de equilibrio en tn/ha.
+
+    Parámetros:
+    - precio: Precio en USD/tn
+    - costos_fijos_ha: Costos por hectárea que no dependen del rendimiento (USD/ha)
+    - flete_usd_tn: Flete en USD/tn
+    - deduccion_ingreso: Fracción del ingreso bruto que se va en costos proporcionales
+
+    Retorna:
+    - Rendimiento en tn/ha (inf si cada tonelada no cubre su propio costo variable)
+    """
+    neto_tn = np.asarray(precio, dtype=float) * (1 - np.asarray(deduccion_ingreso)) - flete_usd_tn
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rinde = np.where(neto_tn > 0, costos_fijos_ha / neto_tn, np.inf)
+    return rinde if rinde.ndim else float(rinde)
+
+
+def equilibrio_precio(rendimiento, costos_fijos_ha, flete_usd_tn=0.0, deduccion_ingreso=0.0):
+    """
+    Precio de equilibrio en USD/tn.
+
+    Parámetros:
+    - rendimiento: Rendimiento en tn/ha
+    - costos_fijos_ha: Costos por hectárea que no dependen del precio (USD/ha)
+    - flete_usd_tn: Flete en USD/tn
+    - deduccion_ingreso: Fracción del ingreso bruto que se va en costos proporcionales
+
+    Retorna:
+    - Precio en USD/tn (inf si el rendimiento es cero o las deducciones absorben todo el ingreso)
+    """
+    rendimiento = np.asarray(rendimiento, dtype=float)
+    retenido = 1 - np.asarray(deduccion_ingreso, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precio = np.where((rendimiento > 0) & (retenido > 0),
+                          (costos_fijos_ha / rendimiento + flete_usd_tn) / retenido, np.inf)
+    return precio if precio.ndim else float(precio)
+
+
+def equilibrio_flete_usd(rendimiento, precio, costos_fijos_ha, deduccion_ingreso=0.0):
+    """
+    Flete máximo en USD/tn que deja el margen directo en cero.
+
+    Parámetros:
+    - rendimiento: Rendimiento en tn/ha
+    - precio: Precio en USD/tn
+    - costos_fijos_ha: Costos por hectárea sin el flete (USD/ha)
+    - deduccion_ingreso: Fracción del ingreso bruto que se va en costos proporcionales
+
+    Retorna:
+    - Flete en USD/tn (negativo si el lote no es rentable ni con flete cero)
+    """
+    rendimiento = np.asarray(rendimiento, dtype=float)
+    neto_tn = np.asarray(precio, dtype=float) * (1 - np.asarray(deduccion_ingreso))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flete = np.where(rendimiento > 0, neto_tn - costos_fijos_ha / np.where(rendimiento > 0, rendimiento, 1.0), -np.inf)
+    return flete if flete.ndim else float(flete)
+
+
+def distancia_maxima(tarifa_max, km_tabla, tarifa_tabla):
+    """
+    Distancia máxima cuya tarifa no supera un valor, invirtiendo la tabla de fletes lineal por tramos.
+
+    La tabla no es estrictamente creciente, así que se busca el último tramo donde la tarifa
+    queda por debajo del umbral (no el primero). Más allá del último kilómetro la tarifa es
+    constante, igual que en interpolar_tramos.
+
+    Parámetros:
+    - tarifa_max: Tarifa máxima admisible en $/tn (escalar o array, ya sin recargos)
+    - km_tabla: Kilómetros de la tabla de fletes (ordenados)
+    - tarifa_tabla: Tarifas en $/tn correspondientes
+
+    Retorna:
+    - Distancia en km: 0 si ni la distancia mínima es viable, inf si cualquier distancia lo es
+    """
+    umbral = np.atleast_1d(np.asarray(tarifa_max, dtype=float))
+    x = np.asarray(km_tabla, dtype=float)
+    y = np.asarray(tarifa_tabla, dtype=float)
+    x0, x1, y0, y1 = x[:-1], x[1:], y[:-1], y[1:]
+    pendiente = (y1 - y0) / (x1 - x0)
+
+    resultado = np.empty_like(umbral)
+    for inicio in range(0, len(umbral), TAMANO_BLOQUE_FLETE):
+        u = umbral[inicio:inicio + TAMANO_BLOQUE_FLETE, None]
+        # Extremo derecho de la parte viable de cada tramo (-inf si el tramo no es viable)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cruce = x0 + (u - y0) / pendiente
+        extremo = np.where(y1 <= u, x1, np.where(y0 <= u, cruce, -np.inf))
+        km_max = extremo.max(axis=1)
+        km_max = np.where(u[:, 0] < y[0], 0.0, km_max)
+        resultado[inicio:inicio + TAMANO_BLOQUE_FLETE] = np.where(u[:, 0] >= y[-1], np.inf, km_max)
+
+    return resultado if np.ndim(tarifa_max) else float(resultado[0])
+
+
+def _lineas_lotes(df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio, arrendamiento_fijo_ha,
+                  fraccion_arrendamiento, costos_directos, cosecha, labores, comercializacion):
+    # Componentes por hectárea de cada lote, comunes al margen y a los puntos de equilibrio
+    costos = costos_lotes(df_lotes, df_comparativo, costos_directos, cosecha, labores, comercializacion)
+    rendimiento = df_lotes["rendimiento"].to_numpy(dtype=float)
+    precio = df_lotes["precio"].to_numpy(dtype=float)
+    recargo = recargos_por_cultivo(df_lotes["cultivo"])
+    flete_usd_tn = calcular_costo_flete_vectorizado(df_lotes["km"].to_numpy(dtype=float), km_tabla, tarifa_tabla, recargo) / tipo_cambio
+    return costos, rendimiento, precio, recargo, flete_usd_tn
+
+
+def margenes_lotes(df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio,
+                   arrendamiento_fijo_ha=0.0, fraccion_arrendamiento=0.0, costos_directos=None, cosecha=None,
+                   labores=None, comercializacion=None):
+    """
+    Ingresos, cada línea de costo y márgenes totales (USD) de cada lote.
+
+    Mismos parámetros que equilibrios_cartera; los totales se obtienen multiplicando
+    los valores por hectárea por la superficie del lote.
+
+    Retorna:
+    - DataFrame con lote, zona, cultivo, superficie y los montos en USD por lote
+    """
+    costos, rendimiento, precio, _, flete_usd_tn = _lineas_lotes(
+        df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio, arrendamiento_fijo_ha,
+        fraccion_arrendamiento, costos_directos, cosecha, labores, comercializacion)
+    superficie = df_lotes["superficie"].to_numpy(dtype=float)
+    ingreso = rendimiento * precio
+    lineas = {
+        "ingreso_bruto": ingreso,
+        "costos_directos": costos["costos_directos"],
+        "comercializacion": costos["comercializacion"],
+        "estructura": costos["estructura"],
+        "cosecha": costos["cosecha"],
+        "flete": rendimiento * flete_usd_tn,
+        "arrendamiento": arrendamiento_fijo_ha + ingreso * fraccion_arrendamiento + np.zeros(len(df_lotes)),
+    }
+    lineas["margen_bruto"] = (lineas["ingreso_bruto"] - lineas["costos_directos"] - lineas["comercializacion"]
+                              - lineas["estructura"] - lineas["cosecha"] - lineas["flete"])
+    lineas["margen_directo"] = lineas["margen_bruto"] - lineas["arrendamiento"]
+    return pd.DataFrame({
+        "lote": df_lotes["lote"].to_numpy(),
+        "zona": df_lotes["zona"].to_numpy(),
+        "cultivo": df_lotes["cultivo"].to_numpy(),
+        "superficie": superficie,
+        **{linea: valores * superficie for linea, valores in lineas.items()}
+    })
+
+
+def equilibrios_cartera(df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio,
+                        arrendamiento_fijo_ha=0.0, fraccion_arrendamiento=0.0, costos_directos=None,
+                        cosecha=None, labores=None, comercializacion=None):
+    """
+    Calcula rendimiento, precio y distancia de equilibrio para todos los lotes a la vez.
+
+    Parámetros:
+    - df_lotes: DataFrame de lotes completo
+    - df_comparativo: Tabla comparativa de cultivos (costos por defecto)
+    - km_tabla, tarifa_tabla: Tabla de fletes
+    - tipo_cambio: Tipo de cambio en $/USD
+    - arrendamiento_fijo_ha: Arrendamiento fijo por hectárea de lote (escalar o array por lote)
+    - fraccion_arrendamiento: Fracción del ingreso pagada como arrendamiento (escalar o array por lote)
+    - costos_directos: Costos directos por lote en USD/ha (opcional; por defecto los de la tabla comparativa)
+    - cosecha: Costo de cosecha por lote en USD/ha (opcional; por defecto el de la Calculadora)
+    - labores: Costo de labores por lote en USD/ha (opcional; reemplaza la parte de labranza de los costos directos)
+    - comercializacion: MotorComercializacion para los gastos de venta (opcional; por defecto los parámetros vigentes)
+
+    Retorna:
+    - DataFrame con el margen directo actual y los puntos de equilibrio por lote
+    """
+    costos, rendimiento, precio, recargo, flete_usd_tn = _lineas_lotes(
+        df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio, arrendamiento_fijo_ha,
+        fraccion_arrendamiento, costos_directos, cosecha, labores, comercializacion)
+    costos_fijos = costos["costos_directos"] + costos["estructura"] + costos["cosecha"] + arrendamiento_fijo_ha
+    deduccion = costos["fraccion_comercializacion"] + fraccion_arrendamiento
+    cargos_tn = costos["comercializacion_usd_tn"]
+
+    margen_directo = rendimiento * (precio * (1 - deduccion) - flete_usd_tn - cargos_tn) - costos_fijos
+    flete_max_usd = equilibrio_flete_usd(rendimiento, precio, costos_fijos, deduccion) - cargos_tn
+    # Pasamos el flete máximo a $/tn sin recargo para invertir la tabla
+    tarifa_max = flete_max_usd * tipo_cambio / (1 + recargo/100)
+
+    return pd.DataFrame({
+        "Lote": df_lotes["lote"].to_numpy(),
+        "Zona": df_lotes["zona"].to_numpy(),
+        "Cultivo": df_lotes["cultivo"].to_numpy(),
+        "Distancia (km)": df_lotes["km"].to_numpy(dtype=float),
+        "Margen Directo (USD/ha)": margen_directo,
+        "Rinde Equilibrio (tn/ha)": equilibrio_rendimiento(precio, costos_fijos, flete_usd_tn + cargos_tn, deduccion),
+        "Precio Equilibrio (USD/tn)": equilibrio_precio(rendimiento, costos_fijos, flete_usd_tn + cargos_tn, deduccion),
+        "Flete Máximo (USD/tn)": flete_max_usd,
+        "Distancia Máxima (km)": distancia_maxima(tarifa_max, km_tabla, tarifa_tabla)
+    })
@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+
+from curvas_precios import MES_COSECHA, MES_INICIO_CAMPANA
+
+# Flujo de caja mensual de la campaña y su financiamiento.
+# Cada línea del margen (ingreso, costos directos, arrendamiento, estructura, cosecha, flete,
+# comercialización) se reparte en un calendario mensual según la siembra y la cosecha de cada
+# cultivo. El mes 0 es el inicio de la campaña (julio).
+#
+# Las líneas que se pagan en pesos a precios de hoy (PESOS) cambian su valor en dólares con el
+# camino del tipo de cambio: en el mes m valen monto * tc[0] / tc[m]. El resto está en dólares.
+# Así el flujo de cada lote en un escenario es dolares + pesos * k[escenario], con
+# k = tc[0] / tc, y el VPN de todos los lotes en todos los escenarios son dos productos de
+# matrices. El saldo de la cartera se financia mes a mes: los saldos negativos pagan la tasa
+# en pesos (convertida a dólares con la variación del tipo de cambio) y los positivos rinden
+# la tasa en dólares.
+
+# Mes de siembra de cada cultivo (compra de insumos y labores)
+MES_SIEMBRA = {"Trigo": 7, "Maíz": 9, "Girasol": 9, "Soja 1ra": 11, "Maíz Tardío": 12,
+               "Soja 2da": 12, "Maíz 2da": 12}
+
+# Cronograma de cada línea: lista de (referencia, meses de desplazamiento, fracción del monto).
+# Referencias: "inicio" (mes 0 de la campaña), "siembra", "cosecha", "cobro" (cosecha + plazo
+# de cobro) y "mensual" (partes iguales en los 12 meses de la campaña).
+CRONOGRAMA_DEFAULT = {
+    "ingreso_bruto": [("cobro", 0, 1.0)],
+    "costos_directos": [("siembra", -1, 0.3), ("siembra", 0, 0.5), ("siembra", 2, 0.2)],
+    "arrendamiento": [("inicio", 0, 0.5), ("cosecha", 0, 0.5)],
+    "estructura": [("mensual", 0, 1.0)],
+    "cosecha": [("cosecha", 0, 1.0)],
+    "flete": [("cosecha", 0, 1.0)],
+    "comercializacion": [("cobro", 0, 1.0)],
+}
+
+# Líneas que se pagan en pesos a precios de hoy
+LINEAS_PESOS = ("estructura", "cosecha", "flete")
+
+PLAZO_COBRO_DEFAULT = 1            # Meses entre la cosecha y el cobro
+TASA_PESOS_ANUAL_DEFAULT = 40.0    # TNA (%) del financiamiento en pesos
+TASA_USD_ANUAL_DEFAULT = 8.0       # Tasa anual (%) en dólares (descuento y colocación)
+DEVALUACION_MENSUAL_DEFAULT = 2.0  # Variación mensual esperada del tipo de cambio (%)
+ESCENARIOS_DEFAULT = 500
+
+
+def meses_cultivo(cultivo):
+    """
+    Mes de siembra y de cosecha de un cultivo, contados desde el inicio de la campaña.
+
+    Retorna:
+    - Tupla (mes de siembra, mes de cosecha)
+    """
+    siembra = (MES_SIEMBRA[cultivo] - MES_INICIO_CAMPANA) % 12
+    ciclo = (MES_COSECHA[cultivo] - MES_SIEMBRA[cultivo]) % 12 or 12
+    return siembra, siembra + ciclo
+
+
+class FlujoCaja:
+    """
+    Flujos mensuales de una cartera de lotes, listos para evaluar muchos escenarios.
+
+    Al construirse reparte una sola vez cada línea de cada lote en el calendario (un perfil
+    mensual por cultivo y línea, aplicado por producto de matrices a los lotes de ese cultivo).
+
+    Parámetros:
+    - df_margenes: DataFrame de margenes_lotes (lote, cultivo y montos totales en USD por línea)
+    - plazo_cobro: Meses entre la cosecha y el cobro
+    - cronograma: Diccionario línea -> lista de (referencia, desplazamiento, fracción)
+    """
+
+    def __init__(self, df_margenes, plazo_cobro=PLAZO_COBRO_DEFAULT, cronograma=None):
+        cronograma = cronograma or CRONOGRAMA_DEFAULT
+        self.lineas = list(cronograma)
+        self.lotes = df_margenes["lote"].to_numpy()
+        self.cultivos = df_margenes["cultivo"].to_numpy()
+        cultivos_unicos = list(dict.fromkeys(self.cultivos))
+        cosechas = {c: meses_cultivo(c)[1] for c in cultivos_unicos}
+        self.meses = max(12, max(cosechas.values(), default=0) + plazo_cobro + 1)
+
+        # Perfil (líneas, meses) de cada cultivo: fracción de cada línea pagada en cada mes
+        perfiles = {}
+        for cultivo in cultivos_unicos:
+            siembra, cosecha = meses_cultivo(cultivo)
+            referencias = {"inicio": 0, "siembra": siembra, "cosecha": cosecha, "cobro": cosecha + plazo_cobro}
+            perfil = np.zeros((len(self.lineas), self.meses))
+            for i, linea in enumerate(self.lineas):
+                for referencia, desplazamiento, fraccion in cronograma[linea]:
+                    if referencia == "mensual":
+                        perfil[i, :12] += fraccion / 12
+                    else:
+                        perfil[i, min(max(referencias[referencia] + desplazamiento, 0), self.meses - 1)] += fraccion
+            perfiles[cultivo] = perfil
+
+        # Ingresos positivos, costos negativos; separados en la parte en dólares y la parte en pesos
+        signos = np.array([1.0 if linea == "ingreso_bruto" else -1.0 for linea in self.lineas])
+        en_pesos = np.array([linea in LINEAS_PESOS for linea in self.lineas])
+        montos = df_margenes[self.lineas].to_numpy(dtype=float) * signos
+        self.dolares = np.zeros((len(df_margenes), self.meses))
+        self.pesos = np.zeros((len(df_margenes), self.meses))
+        for cultivo, perfil in perfiles.items():
+            filas = np.flatnonzero(self.cultivos == cultivo)
+            self.dolares[filas] = montos[filas][:, ~en_pesos] @ perfil[~en_pesos]
+            self.pesos[filas] = montos[filas][:, en_pesos] @ perfil[en_pesos]
+
+    def __len__(self):
+        return len(self.lotes)
+
+    def _factores(self, escenarios):
+        tipo_cambio = np.atleast_2d(escenarios["tipo_cambio"])
+        if tipo_cambio.shape[1] < self.meses:
+            raise ValueError(f"Los escenarios deben cubrir al menos {self.meses} meses")
+        tipo_cambio = tipo_cambio[:, :self.meses]
+        k = tipo_cambio[:, :1] / tipo_cambio                                         # (S, M)
+        tasa_usd = np.atleast_1d(np.asarray(escenarios["tasa_usd"], dtype=float))[:, None]
+        descuento = (1 + tasa_usd) ** -np.arange(self.meses)                         # (S, M)
+        return tipo_cambio, k, descuento
+
+    def flujos(self, escenarios, escenario=0):
+        """Flujos mensuales en USD de cada lote (lotes, meses) en un escenario."""
+        _, k, _ = self._factores(escenarios)
+        return self.dolares + self.pesos * k[escenario]
+
+    def vpn(self, escenarios):
+        """
+        Valor presente neto (USD, descontado a la tasa en dólares) de cada lote en cada escenario.
+
+        Retorna:
+        - Array (lotes, escenarios)
+        """
+        _, k, descuento = self._factores(escenarios)
+        return self.dolares @ descuento.T + self.pesos @ (k * descuento).T
+
+    def cartera(self, escenarios, caja_inicial=0.0):
+        """
+        Saldo mensual de la cartera con financiamiento, para todos los escenarios a la vez.
+
+        Parámetros:
+        - escenarios: Diccionario de escenarios_financieros
+        - caja_inicial: Saldo disponible al inicio de la campaña (USD)
+
+        Retorna:
+        - Diccionario con:
+          - flujo, saldo: Arrays (escenarios, meses) en USD
+          - capital_trabajo: Máximo saldo negativo (USD, positivo) por escenario
+          - costo_financiero: Intereses pagados (USD) por escenario
+          - vpn: VPN de la cartera sin financiamiento por escenario
+          - saldo_final: Saldo al final del horizonte por escenario
+        """
+        tipo_cambio, k, descuento = self._factores(escenarios)
+        flujo = self.dolares.sum(axis=0) + self.pesos.sum(axis=0) * k                # (S, M)
+        tasa_pesos = np.atleast_2d(escenarios["tasa_pesos"])[:, :self.meses]
+        tasa_usd = np.atleast_1d(np.asarray(escenarios["tasa_usd"], dtype=float))
+        # Costo en dólares de tomar pesos un mes: tasa en pesos menos la variación del tipo de cambio
+        tasa_deuda = (1 + tasa_pesos[:, 1:]) * tipo_cambio[:, :-1] / tipo_cambio[:, 1:] - 1
+
+        saldo = np.empty_like(flujo)
+        costo_financiero = np.zeros(len(flujo))
+        anterior = np.full(len(flujo), float(caja_inicial))
+        for m in range(self.meses):
+            if m > 0:
+                interes = np.where(anterior < 0, anterior * tasa_deuda[:, m - 1], anterior * tasa_usd)
+                costo_financiero -= np.minimum(interes, 0)
+                anterior = anterior + interes
+            anterior = anterior + flujo[:, m]
+            saldo[:, m] = anterior
+        return {
+            "flujo": flujo,
+            "saldo": saldo,
+            "capital_trabajo": np.maximum(-saldo.min(axis=1), 0.0),
+            "costo_financiero": costo_financiero,
+            "vpn": (flujo * descuento).sum(axis=1),
+            "saldo_final": saldo[:, -1],
+        }
+
+    def capital_trabajo_lotes(self, escenarios, escenario=0):
+        """Capital de trabajo máximo (USD, sin intereses) de cada lote en un escenario."""
+        acumulado = np.cumsum(self.flujos(escenarios, escenario), axis=1)
+        return np.maximum(-acumulado.min(axis=1), 0.0)
+
+    def mensual(self, escenarios, escenario=0):
+        """
+        Flujo mensual neto (USD) de un escenario, por cultivo.
+
+        Retorna:
+        - DataFrame con un mes por fila (etiquetado "00 Jul", "01 Ago", ...) y una columna por cultivo
+        """
+        nombres_meses = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+        etiquetas = [f"{m:02d} {nombres_meses[(MES_INICIO_CAMPANA - 1 + m) % 12]}" for m in range(self.meses)]
+        flujos = self.flujos(escenarios, escenario)
+        return pd.DataFrame({c: flujos[self.cultivos == c].sum(axis=0) for c in dict.fromkeys(self.cultivos)},
+                            index=pd.Index(etiquetas, name="Mes"))
+
+
+def escenarios_financieros(n=ESCENARIOS_DEFAULT, meses=18, tipo_cambio_inicial=950.0,
+                           devaluacion_mensual=DEVALUACION_MENSUAL_DEFAULT, volatilidad_tipo_cambio=3.0,
+                           tasa_pesos_anual=TASA_PESOS_ANUAL_DEFAULT, volatilidad_tasa=5.0,
+                           tasa_usd_anual=TASA_USD_ANUAL_DEFAULT, semilla=0):
+    """
+    Caminos de tipo de cambio y tasa en pesos para evaluar la cartera.
+
+    El escenario 0 es el camino esperado (sin ruido); el resto sigue una caminata aleatoria
+    lognormal para el tipo de cambio y una tasa en pesos que fluctúa alrededor de la TNA.
+
+    Parámetros:
+    - n: Cantidad de escenarios
+    - meses: Meses del horizonte
+    - tipo_cambio_inicial: Tipo de cambio de hoy ($/USD)
+    - devaluacion_mensual: Variación mensual esperada del tipo de cambio (%)
+    - volatilidad_tipo_cambio: Desvío mensual del tipo de cambio (%)
+    - tasa_pesos_anual: TNA del financiamiento en pesos (%)
+    - volatilidad_tasa: Desvío de la TNA (puntos porcentuales, persistente en cada escenario)
+    - tasa_usd_anual: Tasa anual en dólares (%)
+    - semilla: Semilla del generador aleatorio
+
+    Retorna:
+    - Diccionario con tipo_cambio (n, meses), tasa_pesos mensual (n, meses) y tasa_usd mensual (n,)
+    """
+    rng = np.random.default_rng(semilla)
+    deriva = np.log1p(devaluacion_mensual / 100)
+    choques = rng.normal(0.0, volatilidad_tipo_cambio / 100, (n, meses - 1))
+    choques[0] = 0.0
+    log_tc = np.concatenate([np.zeros((n, 1)), np.cumsum(deriva + choques, axis=1)], axis=1)
+    tna = tasa_pesos_anual + rng.normal(0.0, volatilidad_tasa, (n, 1)) + rng.normal(0.0, volatilidad_tasa / 2, (n, meses))
+    tna[0] = tasa_pesos_anual
+    return {
+        "tipo_cambio": tipo_cambio_inicial * np.exp(log_tc),
+        "tasa_pesos": np.maximum(tna, 0.0) / 100 / 12,
+        "tasa_usd": np.full(n, (1 + tasa_usd_anual / 100) ** (1 / 12) - 1),
+    }
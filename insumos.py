@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# Modelo de costos directos por insumos (receta por cultivo).
+# Cada cultivo tiene una receta de productos y dosis por hectárea; el costo directo es
+# el producto de la matriz cultivo x insumo (dispersa) por el vector de precios de los insumos.
+
+# Categorías de costo (coinciden con los campos de la Calculadora)
+CATEGORIAS = ["Labranza", "Semilla", "Agroquímicos", "Fertilizantes"]
+
+# Catálogo de insumos de ejemplo: precio en USD por unidad
+INSUMOS_DEFAULT = pd.DataFrame([
+    ("Siembra directa", "Labranza", "ha", 35.0),
+    ("Pulverización terrestre", "Labranza", "ha", 7.0),
+    ("Fertilización", "Labranza", "ha", 6.0),
+    ("Semilla soja", "Semilla", "kg", 0.85),
+    ("Semilla maíz", "Semilla", "bolsa 80.000", 180.0),
+    ("Semilla trigo", "Semilla", "kg", 0.45),
+    ("Semilla girasol", "Semilla", "bolsa 150.000", 230.0),
+    ("Glifosato", "Agroquímicos", "l", 4.5),
+    ("Atrazina", "Agroquímicos", "l", 6.0),
+    ("2,4-D", "Agroquímicos", "l", 5.0),
+    ("Herbicida residual", "Agroquímicos", "l", 18.0),
+    ("Insecticida", "Agroquímicos", "l", 10.0),
+    ("Fungicida", "Agroquímicos", "l", 28.0),
+    ("Urea", "Fertilizantes", "kg", 0.6),
+    ("Fosfato monoamónico", "Fertilizantes", "kg", 0.75),
+], columns=["insumo", "categoria", "unidad", "precio"])
+
+# Recetas de ejemplo: dosis por hectárea (en la unidad del catálogo)
+_RECETAS = {
+    "Soja 1ra": {"Siembra directa": 1, "Pulverización terrestre": 4, "Fertilización": 1, "Semilla soja": 75,
+                 "Glifosato": 4, "2,4-D": 1, "Herbicida residual": 1, "Insecticida": 0.5, "Fungicida": 0.6,
+                 "Fosfato monoamónico": 70},
+    "Maíz": {"Siembra directa": 1, "Pulverización terrestre": 4, "Fertilización": 2, "Semilla maíz": 1,
+             "Glifosato": 3, "Atrazina": 2, "Herbicida residual": 1, "Insecticida": 0.3,
+             "Urea": 150, "Fosfato monoamónico": 90},
+    "Trigo": {"Siembra directa": 1, "Pulverización terrestre": 3, "Fertilización": 2, "Semilla trigo": 120,
+              "Glifosato": 2, "2,4-D": 0.8, "Fungicida": 0.8, "Urea": 150, "Fosfato monoamónico": 80},
+    "Soja 2da": {"Siembra directa": 1, "Pulverización terrestre": 3, "Semilla soja": 80,
+                 "Glifosato": 3, "Insecticida": 0.5, "Fungicida": 0.5, "Fosfato monoamónico": 30},
+    "Maíz 2da": {"Siembra directa": 1, "Pulverización terrestre": 3, "Fertilización": 1, "Semilla maíz": 0.8,
+                 "Glifosato": 2, "Atrazina": 2, "Insecticida": 0.3, "Urea": 120, "Fosfato monoamónico": 60},
+    "Maíz Tardío": {"Siembra directa": 1, "Pulverización terrestre": 4, "Fertilización": 1, "Semilla maíz": 0.8,
+                    "Glifosato": 3, "Atrazina": 2, "Herbicida residual": 0.5, "Insecticida": 0.3,
+                    "Urea": 120, "Fosfato monoamónico": 60},
+    "Girasol": {"Siembra directa": 1, "Pulverización terrestre": 3, "Fertilización": 1, "Semilla girasol": 0.35,
+                "Glifosato": 3, "Herbicida residual": 1, "Insecticida": 0.4, "Fungicida": 0.5,
+                "Urea": 80, "Fosfato monoamónico": 60},
+}
+RECETAS_DEFAULT = pd.DataFrame(
+    [(cultivo, insumo, float(dosis)) for cultivo, receta in _RECETAS.items() for insumo, dosis in receta.items()],
+    columns=["cultivo", "insumo", "dosis"]
+)
+
+
+class MatrizInsumos:
+    """
+    Matriz dispersa cultivo x insumo en formato CSR (filas comprimidas) construida con numpy.
+
+    Solo se guardan las dosis no nulas, de modo que recalcular el costo directo de todos los
+    cultivos ante un cambio de precios es un único producto matriz-vector disperso.
+    """
+
+    def __init__(self, df_recetas, df_insumos):
+        self.insumos = df_insumos["insumo"].tolist()
+        self.cultivos = list(dict.fromkeys(df_recetas["cultivo"]))
+        categorias = df_insumos["categoria"].tolist()
+        desconocidas = sorted(set(categorias) - set(CATEGORIAS))
+        if desconocidas:
+            raise ValueError("Categorías de insumo desconocidas: " + ", ".join(desconocidas))
+
+        idx_insumo = pd.Index(self.insumos).get_indexer(df_recetas["insumo"])
+        if (idx_insumo < 0).any():
+            faltantes = sorted(set(df_recetas["insumo"][idx_insumo < 0]))
+            raise ValueError("Insumos sin precio en el catálogo: " + ", ".join(faltantes))
+        idx_cultivo = pd.Index(self.cultivos).get_indexer(df_recetas["cultivo"])
+
+        # Ordenamos por fila para armar el CSR
+        orden = np.argsort(idx_cultivo, kind="stable")
+        self.filas = idx_cultivo[orden]
+        self.indices = idx_insumo[orden]
+        self.data = df_recetas["dosis"].to_numpy(dtype=float)[orden]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(self.filas, minlength=len(self.cultivos)))])
+        # Categoría de cada elemento no nulo (para el desglose por categoría)
+        self.idx_categoria = pd.Index(CATEGORIAS).get_indexer([categorias[i] for i in self.indices])
+
+    @property
+    def forma(self):
+        return (len(self.cultivos), len(self.insumos))
+
+    def densa(self):
+        """Devuelve la matriz como DataFrame denso (cultivos x insumos), para mostrarla."""
+        matriz = np.zeros(self.forma)
+        np.add.at(matriz, (self.filas, self.indices), self.data)
+        return pd.DataFrame(matriz, index=self.cultivos, columns=self.insumos)
+
+    def costos(self, precios):
+        """
+        Costo directo por cultivo (producto matriz-vector disperso).
+
+        Parámetros:
+        - precios: Precios de los insumos (n_insumos,) o escenarios de precios (S, n_insumos)
+
+        Retorna:
+        - Costos en USD/ha con forma (n_cultivos,) o (S, n_cultivos)
+        """
+        precios = np.asarray(precios, dtype=float)
+        aportes = self.data * precios[..., self.indices]
+        if precios.ndim == 1:
+            return np.bincount(self.filas, weights=aportes, minlength=len(self.cultivos))
+        # Con escenarios sumamos por tramos de filas (las filas vacías quedan en cero)
+        resultado = np.zeros(precios.shape[:-1] + (len(self.cultivos),))
+        no_vacias = np.diff(self.indptr) > 0
+        if aportes.shape[-1] > 0:
+            resultado[..., no_vacias] = np.add.reduceat(aportes, self.indptr[:-1][no_vacias], axis=-1)
+        return resultado
+
+    def costos_por_categoria(self, precios):
+        """
+        Costo directo por cultivo desglosado por categoría.
+
+        Parámetros:
+        - precios: Precios de los insumos (n_insumos,)
+
+        Retorna:
+        - DataFrame cultivos x categorías (USD/ha) con una columna Total
+        """
+        aportes = self.data * np.asarray(precios, dtype=float)[self.indices]
+        claves = self.filas * len(CATEGORIAS) + self.idx_categoria
+        tabla = np.bincount(claves, weights=aportes, minlength=len(self.cultivos) * len(CATEGORIAS))
+        df = pd.DataFrame(tabla.reshape(len(self.cultivos), len(CATEGORIAS)), index=self.cultivos, columns=CATEGORIAS)
+        df["Total"] = df.sum(axis=1)
+        return df
+
+    def costos_lotes(self, cultivos_lotes, precios):
+        """
+        Costo directo de cada lote según la receta de su cultivo.
+
+        Parámetros:
+        - cultivos_lotes: Cultivo de cada lote
+        - precios: Precios de los insumos (n_insumos,) o (S, n_insumos)
+
+        Retorna:
+        - Costos en USD/ha por lote, (N,) o (S, N)
+        """
+        idx = pd.Index(self.cultivos).get_indexer(list(cultivos_lotes))
+        if (idx < 0).any():
+            raise ValueError("Cultivos sin receta de insumos: " + ", ".join(sorted(set(np.asarray(cultivos_lotes)[idx < 0]))))
+        return self.costos(precios)[..., idx]
@@ -0,0 +1,125 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from paralelo import EjecutorParalelo
+
+# Medición del arranque en frío: importación de los módulos de cálculo sin interfaz (cada
+# medición en un proceso nuevo), latencia de la primera tarea del pool de procesos y una
+# ejecución completa de la página sin navegador. Se informa la mediana de varias corridas y
+# se compara con un presupuesto en segundos; si alguna medición lo supera, termina con código 1
+# (para usarlo como control antes de publicar).
+#
+# La página (app.py) sigue armándose al importarse (st.set_page_config y los datos de cada
+# pestaña): se mide completa, sin navegador. Lo reutilizable sin interfaz son los módulos de
+# MODULOS_SIN_INTERFAZ (datos_base tiene las tablas de la página).
+#
+#   python medir_inicio.py --corridas 5
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+
+MODULOS_SIN_INTERFAZ = [
+    "calculos", "cartera", "rotaciones", "arrendamientos", "flujo_caja", "datos_base",
+    "almacen_resultados", "reportes",
+]
+
+# Presupuesto por medición (segundos, mediana)
+PRESUPUESTO = {
+    "importar modulos de calculo": 1.0,
+    "primera tarea en paralelo": 2.0,
+    "pagina completa": 6.0,
+}
+
+_PROGRAMA_IMPORTAR = """
+import time
+t = time.perf_counter()
+import {modulos}
+print(time.perf_counter() - t)
+"""
+
+_PROGRAMA_PRIMERA_TAREA = """
+from medir_inicio import _primera_tarea
+print(_primera_tarea({procesos}))
+"""
+
+_PROGRAMA_PAGINA = """
+import time
+from streamlit.testing.v1 import AppTest
+t = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=300).run()
+assert not at.exception, at.exception
+print(time.perf_counter() - t)
+"""
+
+
+def _tarea_vacia(entradas, salidas, particion):
+    salidas["x"][particion] = os.getpid()
+
+
+def _en_proceso_nuevo(programa):
+    salida = subprocess.run([sys.executable, "-c", programa], cwd=CARPETA, capture_output=True, text=True, check=True)
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def medir_importacion():
+    """Segundos para importar los módulos de cálculo en un intérprete recién iniciado."""
+    return _en_proceso_nuevo(_PROGRAMA_IMPORTAR.format(modulos=", ".join(MODULOS_SIN_INTERFAZ)))
+
+
+def _primera_tarea(procesos):
+    t = time.perf_counter()
+    with EjecutorParalelo(procesos, serial=False) as ejecutor:
+        ejecutor.mapear(_tarea_vacia, list(range(procesos)), salidas={"x": ((procesos,), np.int64)})
+        return time.perf_counter() - t
+
+
+def medir_primera_tarea(procesos=2):
+    """Segundos desde crear el ejecutor hasta tener el resultado de la primera tanda de tareas (en un proceso nuevo)."""
+    return _en_proceso_nuevo(_PROGRAMA_PRIMERA_TAREA.format(procesos=procesos))
+
+
+def medir_pagina():
+    """Segundos de una ejecución completa de app.py sin navegador (en un proceso nuevo)."""
+    return _en_proceso_nuevo(_PROGRAMA_PAGINA)
+
+
+def medir(corridas=3, procesos=2):
+    """
+    Mide el arranque en frío.
+
+    Parámetros:
+    - corridas: Cantidad de corridas por medición (se informa la mediana)
+    - procesos: Procesos del pool para la primera tarea
+
+    Retorna:
+    - Diccionario medición -> mediana en segundos
+    """
+    mediciones = {
+        "importar modulos de calculo": medir_importacion,
+        "primera tarea en paralelo": lambda: medir_primera_tarea(procesos),
+        "pagina completa": medir_pagina,
+    }
+    return {nombre: statistics.median(f() for _ in range(corridas)) for nombre, f in mediciones.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mide el arranque en frío de la aplicación.")
+    parser.add_argument("--corridas", type=int, default=3, help="Corridas por medición (mediana)")
+    parser.add_argument("--procesos", type=int, default=2, help="Procesos para la primera tarea en paralelo")
+    argumentos = parser.parse_args()
+
+    excedidas = []
+    for nombre, segundos in medir(argumentos.corridas, argumentos.procesos).items():
+        limite = PRESUPUESTO[nombre]
+        print(f"{nombre:<30} {segundos:7.3f} s  (presupuesto {limite:.1f} s)")
+        if segundos > limite:
+            excedidas.append(nombre)
+    if excedidas:
+        print("Fuera de presupuesto: " + ", ".join(excedidas))
+        sys.exit(1)
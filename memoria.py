@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from cache_calculos import estimar_tamano
+
+# Representación compacta de las tablas grandes de la cartera y medición de la memoria que
+# ocupan. Las columnas de texto con pocos valores distintos (cultivo, zona, contrato) pasan
+# a categóricas: cada valor se guarda una vez y cada fila lleva solo un código entero. Las
+# columnas float64 pasan a float32 solo si el error que introduce no supera la tolerancia.
+# Los datos se guardan como números: el formato (porcentajes, decimales) se aplica al mostrar.
+
+# Máxima proporción de valores distintos para pasar una columna de texto a categórica
+FRACCION_CATEGORIAS = 0.5
+
+# Error absoluto admitido al pasar a float32 (medio centésimo de USD, ha, tn o km): con
+# valores de hasta unos 65.000 el error de float32 queda por debajo
+TOLERANCIA_FLOAT32 = 0.005
+
+
+def _es_texto(serie):
+    return serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype)
+
+
+def compactar(df, tolerancia=TOLERANCIA_FLOAT32, categorias=None):
+    """
+    Copia de una tabla con tipos compactos (mismas columnas, mismos valores a la tolerancia indicada).
+
+    Parámetros:
+    - df: DataFrame
+    - tolerancia: Error absoluto máximo al pasar una columna float64 a float32 (0 solo convierte
+      las columnas que float32 representa sin pérdida, por ejemplo hectáreas o km enteros)
+    - categorias: Columnas a pasar a categóricas (por defecto, las de texto con pocos valores distintos)
+
+    Retorna:
+    - DataFrame compacto
+    """
+    columnas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        if columna in (categorias or ()) or (categorias is None and _es_texto(serie) and len(serie)
+                                            and serie.nunique() <= FRACCION_CATEGORIAS * len(serie)):
+            columnas[columna] = "category"
+        elif serie.dtype == np.float64:
+            valores = serie.to_numpy()
+            reducidos = valores.astype(np.float32).astype(np.float64)
+            with np.errstate(invalid="ignore"):
+                conserva = (reducidos == valores) | np.isnan(valores) | (np.abs(reducidos - valores) <= tolerancia)
+            if conserva.all():
+                columnas[columna] = np.float32
+    return df.astype(columnas) if columnas else df.copy()
+
+
+def huella_memoria(tablas):
+    """
+    Memoria ocupada por cada tabla u objeto de la sesión.
+
+    Parámetros:
+    - tablas: Diccionario nombre -> DataFrame, array u objeto (por ejemplo, el cubo de la cartera)
+
+    Retorna:
+    - DataFrame con Tabla, Filas y Bytes, de mayor a menor
+    """
+    filas = [(nombre, len(valor) if hasattr(valor, "__len__") else None, estimar_tamano(valor))
+             for nombre, valor in tablas.items() if valor is not None]
+    df = pd.DataFrame(filas, columns=["Tabla", "Filas", "Bytes"])
+    return df.sort_values("Bytes", ascending=False, kind="stable").reset_index(drop=True)
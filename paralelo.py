@@ -0,0 +1,214 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Ejecución en varios procesos para barridos grandes de escenarios, lotes o secuencias.
+# Las entradas de solo lectura (tablas, parámetros, escenarios) y las salidas se ubican en
+# memoria compartida: los procesos reciben solo el nombre, la forma y el tipo de cada
+# array (no se copian ni se serializan los datos), y cada tarea escribe su tramo de la
+# salida en su lugar, así que el resultado queda armado sin un paso de unión.
+#
+# La función de cada tarea debe estar definida a nivel de módulo (se importa en el proceso
+# hijo) y recibe: funcion(entradas, salidas, particion, **parametros), donde entradas y
+# salidas son diccionarios nombre -> array de numpy.
+
+# MARGENES_PARALELO=0 fuerza la ejecución en serie (útil para depurar)
+VARIABLE_PARALELO = "MARGENES_PARALELO"
+VARIABLE_PROCESOS = "MARGENES_PROCESOS"
+
+# Módulos que se importan una sola vez en el servidor de procesos (forkserver): cada proceso
+# hijo se crea por fork desde ese servidor y arranca con ellos ya cargados. "__main__" evita que
+# cada hijo vuelva a importar el programa principal (por ejemplo, todo Streamlit).
+# El forkserver es uno solo por proceso y la precarga se fija al arrancarlo: vale la del primer
+# ejecutor que crea su pool. Los módulos que pidan ejecutores posteriores no se precargan (los
+# hijos los importan al recibir la primera tarea, con el mismo resultado pero más lento).
+MODULOS_PRECARGA = ["__main__", "numpy", "pandas"]
+
+
+def particionar(n, partes):
+    """
+    Divide range(n) en tramos contiguos de tamaño parecido.
+
+    Retorna:
+    - Lista de tuplas (inicio, fin)
+    """
+    partes = max(1, min(partes, n))
+    limites = np.linspace(0, n, partes + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+
+
+# Precarga fijada para el forkserver de este proceso (None mientras no se creó ningún pool)
+_precarga_forkserver = None
+
+
+def _contexto(precarga):
+    # "forkserver" donde existe: el servidor no tiene hilos (a diferencia del proceso principal,
+    # con Streamlit y el actualizador de precios), así que el fork es seguro. Si no, "spawn".
+    global _precarga_forkserver
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        if _precarga_forkserver is None:
+            # Solo la primera vez: después el servidor ya está corriendo y la precarga no cambia
+            _precarga_forkserver = list(dict.fromkeys(precarga))
+            contexto.set_forkserver_preload(_precarga_forkserver)
+        return contexto
+    return multiprocessing.get_context("spawn")
+
+
+def _crear_compartido(array):
+    array = np.ascontiguousarray(array)
+    memoria = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memoria.buf)[...] = array
+    return memoria, (memoria.name, array.shape, array.dtype.str)
+
+
+# Memoria compartida abierta en cada proceso hijo (nombre -> SharedMemory)
+_adjuntas = {}
+
+
+def _vistas(descriptores):
+    # Arrays sobre la memoria compartida, abriendo cada bloque una sola vez por proceso
+    vigentes = {nombre for nombre, _, _ in descriptores.values()}
+    for nombre in list(_adjuntas):
+        if nombre not in vigentes:
+            _adjuntas.pop(nombre).close()
+    vistas = {}
+    for clave, (nombre, forma, tipo) in descriptores.items():
+        if nombre not in _adjuntas:
+            _adjuntas[nombre] = shared_memory.SharedMemory(name=nombre)
+        vistas[clave] = np.ndarray(forma, dtype=np.dtype(tipo), buffer=_adjuntas[nombre].buf)
+    return vistas
+
+
+def _solo_lectura(array):
+    # Vista de solo lectura (sin copiar): una tarea que modifica sus entradas falla igual en serie y en paralelo
+    vista = np.asarray(array).view()
+    vista.flags.writeable = False
+    return vista
+
+
+def _ejecutar_tarea(funcion, entradas, salidas, particion, parametros):
+    vistas = _vistas({**{("e", c): d for c, d in entradas.items()}, **{("s", c): d for c, d in salidas.items()}})
+    vistas_entradas = {c: _solo_lectura(vistas[("e", c)]) for c in entradas}
+    return funcion(vistas_entradas, {c: vistas[("s", c)] for c in salidas}, particion, **parametros)
+
+
+class EjecutorParalelo:
+    """
+    Pool de procesos reutilizable con entradas y salidas en memoria compartida.
+
+    Con serial=True (o MARGENES_PARALELO=0) las tareas se ejecutan en el mismo proceso,
+    una tras otra, con los mismos arrays (las entradas también de solo lectura): el
+    resultado es idéntico y se puede depurar.
+
+    Parámetros:
+    - procesos: Cantidad de procesos (por defecto MARGENES_PROCESOS o la cantidad de CPUs)
+    - serial: Ejecutar en el mismo proceso (por defecto según MARGENES_PARALELO)
+    - precarga: Módulos adicionales a precargar en el servidor de procesos (el módulo de la
+      función del primer mapear se agrega solo). Solo tiene efecto en el primer ejecutor del
+      proceso que crea su pool: ver MODULOS_PRECARGA
+    """
+
+    def __init__(self, procesos=None, serial=None, precarga=()):
+        if serial is None:
+            serial = os.environ.get(VARIABLE_PARALELO, "1") == "0"
+        if procesos is None:
+            procesos = int(os.environ.get(VARIABLE_PROCESOS, 0)) or os.cpu_count() or 1
+        self.procesos = max(1, procesos)
+        self.serial = serial or self.procesos == 1
+        self.precarga = MODULOS_PRECARGA + list(precarga)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _obtener_pool(self, modulo=None):
+        with self._lock:
+            if self._pool is None:
+                precarga = self.precarga + ([modulo] if modulo and modulo != "__main__" else [])
+                self._pool = ProcessPoolExecutor(self.procesos, mp_context=_contexto(precarga))
+            return self._pool
+
+    def iniciar(self):
+        """Crea los procesos por adelantado (para no pagar el arranque en el primer mapear)."""
+        if not self.serial:
+            pool = self._obtener_pool()
+            for futuro in [pool.submit(os.getpid) for _ in range(self.procesos)]:
+                futuro.result()
+        return self
+
+    def mapear(self, funcion, particiones, entradas=None, salidas=None, **parametros):
+        """
+        Ejecuta funcion sobre cada partición.
+
+        Parámetros:
+        - funcion: Función de módulo funcion(entradas, salidas, particion, **parametros)
+        - particiones: Lista de particiones (por ejemplo, tramos de particionar())
+        - entradas: Diccionario nombre -> array de solo lectura
+        - salidas: Diccionario nombre -> (forma, dtype) de los arrays de resultado
+        - parametros: Parámetros chicos que se envían a cada tarea
+
+        Retorna:
+        - Tupla (salidas, resultados): diccionario de arrays de salida y lista con lo que
+          devolvió cada tarea, en el orden de las particiones
+        """
+        entradas = entradas or {}
+        salidas = salidas or {}
+        if self.serial:
+            arrays_salida = {clave: np.zeros(forma, dtype=tipo) for clave, (forma, tipo) in salidas.items()}
+            vistas_entradas = {clave: _solo_lectura(array) for clave, array in entradas.items()}
+            resultados = [funcion(vistas_entradas, arrays_salida, particion, **parametros) for particion in particiones]
+            return arrays_salida, resultados
+
+        bloques = []
+        try:
+            descriptores_entrada = {}
+            for clave, array in entradas.items():
+                memoria, descriptor = _crear_compartido(np.asarray(array))
+                bloques.append(memoria)
+                descriptores_entrada[clave] = descriptor
+            descriptores_salida = {}
+            for clave, (forma, tipo) in salidas.items():
+                memoria, descriptor = _crear_compartido(np.zeros(forma, dtype=tipo))
+                bloques.append(memoria)
+                descriptores_salida[clave] = descriptor
+
+            pool = self._obtener_pool(funcion.__module__)
+            futuros = [pool.submit(_ejecutar_tarea, funcion, descriptores_entrada, descriptores_salida, particion, parametros)
+                       for particion in particiones]
+            resultados = [futuro.result() for futuro in futuros]
+            arrays_salida = {clave: np.ndarray(forma, dtype=np.dtype(tipo), buffer=bloques[len(entradas) + i].buf).copy()
+                             for i, (clave, (_, forma, tipo)) in enumerate(descriptores_salida.items())}
+            return arrays_salida, resultados
+        finally:
+            for memoria in bloques:
+                memoria.close()
+                memoria.unlink()
+
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+# Ejecutor compartido por las sesiones del proceso (el pool se crea la primera vez que se usa)
+_ejecutor = None
+_lock_ejecutor = threading.Lock()
+
+
+def obtener_ejecutor():
+    """Devuelve el ejecutor paralelo global."""
+    global _ejecutor
+    with _lock_ejecutor:
+        if _ejecutor is None:
+            _ejecutor = EjecutorParalelo()
+        return _ejecutor
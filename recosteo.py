@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+
+from arrendamientos import MotorArrendamientos, completar_contratos, costo_contrato, CONTRATO_DEFAULT
+from cartera import costos_lotes
+from equilibrio import margenes_lotes
+
+# Recosteo incremental de la cartera de lotes. Cuando llega una tarifa FADEEAC nueva, un precio
+# o un tipo de cambio, no se recalcula toda la cartera: un índice invertido dice qué lotes
+# dependen de cada insumo y solo esos lotes se vuelven a costear. Las claves del índice son:
+# - ("tarifa", j): lotes cuyo flete interpola el punto j de la tabla de fletes
+# - ("precio", cultivo): lotes del cultivo
+# - ("contrato", nombre): lotes arrendados con ese contrato
+# - ("precio_soja",): lotes arrendados con un contrato en quintales de soja
+# - ("tipo_cambio",): lotes con flete (la tarifa está en pesos)
+# Cada actualización escribe los resultados nuevos en su lugar y devuelve las diferencias por
+# lote; al guardar en el almacén solo se reescriben las particiones con lotes recalculados.
+
+# Montos en USD por lote que devuelve margenes_lotes
+MEDIDAS = ["ingreso_bruto", "costos_directos", "comercializacion", "estructura", "cosecha", "flete",
+           "arrendamiento", "margen_bruto", "margen_directo"]
+COMPONENTES_CONTRATO = ["usd_ha", "qq_soja_ha", "porcentaje_cosecha"]
+
+
+def _agrupar(claves, posiciones):
+    # Diccionario clave -> posiciones (ordenadas) de los lotes con esa clave
+    if not len(posiciones):
+        return {}
+    return {clave: posiciones[indices]
+            for clave, indices in pd.Series(posiciones).groupby(claves, sort=False).indices.items()}
+
+
+def puntos_tarifa(km, km_tabla):
+    """
+    Puntos de la tabla de fletes que usa la interpolación de cada distancia.
+
+    Fuera de la tabla se usa solo el punto del extremo; adentro, los dos puntos del tramo.
+
+    Retorna:
+    - Tupla (punto inferior, punto superior), arrays de índices de la tabla
+    """
+    ultimo = len(km_tabla) - 1
+    tramo = np.searchsorted(np.asarray(km_tabla, dtype=float), np.asarray(km, dtype=float), side="right")
+    return np.clip(tramo - 1, 0, ultimo), np.clip(tramo, 0, ultimo)
+
+
+class MotorRecosteo:
+    """
+    Resultados por lote de la cartera que se recalculan solo donde cambió un insumo.
+
+    Parámetros:
+    - df_lotes: DataFrame de lotes completo
+    - df_comparativo: Tabla comparativa de cultivos
+    - km_tabla, tarifa_tabla: Tabla de fletes
+    - tipo_cambio: Tipo de cambio en $/USD
+    - df_contratos: Tabla de contratos (por defecto solo el contrato por defecto)
+    - precio_soja_tn: Precio de la soja para los contratos en quintales (por defecto el de la tabla comparativa)
+    - costos_directos: Costos directos por lote en USD/ha (opcional)
+    - cosecha: Costo de cosecha por lote en USD/ha (opcional)
+    - labores: Costo de labores por lote en USD/ha (opcional; reemplaza la parte de labranza de los costos directos)
+    - comercializacion: MotorComercializacion para los gastos de venta (opcional; por defecto los parámetros vigentes)
+    """
+
+    def __init__(self, df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio, df_contratos=None,
+                 precio_soja_tn=None, costos_directos=None, cosecha=None, labores=None, comercializacion=None):
+        self.lotes = df_lotes.reset_index(drop=True).copy()
+        self.df_comparativo = df_comparativo
+        self.km_tabla = np.asarray(km_tabla, dtype=float).copy()
+        self.tarifa_tabla = np.asarray(tarifa_tabla, dtype=float).copy()
+        self.tipo_cambio = float(tipo_cambio)
+        if precio_soja_tn is None:
+            precio_soja_tn = df_comparativo.loc[df_comparativo["Variable"] == "USD/tn", "Soja 1ra"].iloc[0]
+        self.precio_soja_tn = float(precio_soja_tn)
+
+        # Términos de arrendamiento y costos por lote, resueltos una sola vez
+        df_contratos = completar_contratos(pd.DataFrame([CONTRATO_DEFAULT]) if df_contratos is None else df_contratos)
+        arrendamientos = MotorArrendamientos(self.lotes, df_contratos)
+        self._usd_ha = arrendamientos.usd_ha.astype(float)
+        self._qq_soja_ha = arrendamientos.qq_soja_ha.astype(float)
+        self._porcentaje_cosecha = arrendamientos.porcentaje_cosecha.astype(float)
+        self._ajuste = arrendamientos.factor_ocupacion * arrendamientos.proporcion_arrendada
+        self._arrendados = arrendamientos.proporcion_arrendada > 0
+        costos = costos_lotes(self.lotes, df_comparativo, costos_directos, cosecha, labores, comercializacion)
+        self._costos_directos = costos["costos_directos"]   # Ya incluye las labores, si se indicaron
+        self._cosecha = costos["cosecha"]
+        self._comercializacion = comercializacion
+
+        # Índice invertido insumo -> lotes
+        todos = np.arange(len(self.lotes))
+        contratos = self.lotes["contrato"].astype(str).to_numpy()
+        self.indice = {("precio", cultivo): posiciones
+                       for cultivo, posiciones in _agrupar(self.lotes["cultivo"].to_numpy(), todos).items()}
+        self.indice.update({("contrato", contrato): posiciones for contrato, posiciones
+                            in _agrupar(contratos[self._arrendados], todos[self._arrendados]).items()})
+        self.indice[("precio_soja",)] = np.flatnonzero(self._arrendados & (self._qq_soja_ha != 0))
+        self.indice[("tipo_cambio",)] = np.flatnonzero(self.lotes["rendimiento"].to_numpy(dtype=float) != 0)
+        self._indexar_tarifas()
+
+        self.resultados = self._costear(todos)
+        self.resultados["id"] = self.resultados["lote"].astype(str) + " | " + self.resultados["cultivo"].astype(str)
+        self._columnas_medidas = [self.resultados.columns.get_loc(m) for m in MEDIDAS]
+        self._pendientes = np.zeros(len(self.lotes), dtype=bool)   # Lotes recalculados desde el último guardado
+        self._guardado = None
+        self.recosteados = 0
+
+    def _indexar_tarifas(self):
+        for clave in [c for c in self.indice if c[0] == "tarifa"]:
+            del self.indice[clave]
+        inferior, superior = puntos_tarifa(self.lotes["km"].to_numpy(dtype=float), self.km_tabla)
+        todos = np.arange(len(self.lotes))
+        distintos = superior != inferior
+        puntos = np.concatenate([inferior, superior[distintos]])
+        lotes = np.concatenate([todos, todos[distintos]])
+        orden = np.argsort(lotes, kind="stable")
+        self.indice.update({("tarifa", int(j)): posiciones for j, posiciones in _agrupar(puntos[orden], lotes[orden]).items()})
+
+    def _costear(self, posiciones):
+        # Resultados de los lotes indicados con los insumos vigentes
+        fijo = costo_contrato(self._usd_ha[posiciones], self._qq_soja_ha[posiciones], 0.0, self.precio_soja_tn) \
+            * self._ajuste[posiciones]
+        fraccion = self._porcentaje_cosecha[posiciones] / 100 * self._ajuste[posiciones]
+        return margenes_lotes(self.lotes.iloc[posiciones], self.df_comparativo, self.km_tabla, self.tarifa_tabla,
+                              self.tipo_cambio, fijo, fraccion, self._costos_directos[posiciones], self._cosecha[posiciones],
+                              comercializacion=self._comercializacion)
+
+    def afectados(self, claves):
+        """
+        Lotes que dependen de alguno de los insumos indicados.
+
+        Parámetros:
+        - claves: Claves del índice, por ejemplo [("precio", "Maíz"), ("tarifa", 3)]
+
+        Retorna:
+        - Posiciones de los lotes en resultados (ordenadas, sin repetir)
+        """
+        grupos = [self.indice[clave] for clave in claves if clave in self.indice]
+        return np.unique(np.concatenate(grupos)) if grupos else np.empty(0, dtype=np.int64)
+
+    def _recostear(self, posiciones):
+        # Recalcula los lotes, escribe sus resultados en su lugar y devuelve las diferencias
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        delta = self.resultados.iloc[posiciones][["id", "lote", "zona", "cultivo"]].copy()
+        if not len(posiciones):
+            return delta.assign(**{m: pd.Series(dtype=float) for m in MEDIDAS})
+        anteriores = self.resultados.iloc[posiciones, self._columnas_medidas].to_numpy(dtype=float)
+        nuevos = self._costear(posiciones)[MEDIDAS].to_numpy(dtype=float)
+        self.resultados.iloc[posiciones, self._columnas_medidas] = nuevos
+        self._pendientes[posiciones] = True
+        self.recosteados += len(posiciones)
+        delta[MEDIDAS] = nuevos - anteriores
+        return delta
+
+    def actualizar_tarifas(self, km_tabla, tarifa_tabla):
+        """
+        Aplica una tabla de fletes nueva.
+
+        Con los mismos kilómetros solo se recalculan los lotes de los tramos cuya tarifa cambió;
+        si cambian los kilómetros de la tabla se recalcula toda la cartera.
+
+        Retorna:
+        - DataFrame de diferencias por lote (índice = posición en resultados; id, lote, zona,
+          cultivo y la diferencia de cada medida en USD)
+        """
+        km_tabla = np.asarray(km_tabla, dtype=float)
+        tarifa_tabla = np.asarray(tarifa_tabla, dtype=float)
+        if np.array_equal(km_tabla, self.km_tabla):
+            posiciones = self.afectados([("tarifa", int(j)) for j in np.flatnonzero(tarifa_tabla != self.tarifa_tabla)])
+            self.tarifa_tabla = tarifa_tabla.copy()
+        else:
+            self.km_tabla, self.tarifa_tabla = km_tabla.copy(), tarifa_tabla.copy()
+            self._indexar_tarifas()
+            posiciones = np.arange(len(self.lotes))
+        return self._recostear(posiciones)
+
+    def actualizar_precios(self, precios):
+        """
+        Aplica precios nuevos por cultivo a todos los lotes del cultivo.
+
+        Parámetros:
+        - precios: Diccionario cultivo -> precio en USD/tn
+
+        Retorna:
+        - DataFrame de diferencias por lote (ver actualizar_tarifas)
+        """
+        columna = self.lotes.columns.get_loc("precio")
+        cambiados = []
+        for cultivo, precio in precios.items():
+            posiciones = self.afectados([("precio", cultivo)])
+            posiciones = posiciones[self.lotes["precio"].to_numpy(dtype=float)[posiciones] != float(precio)]
+            self.lotes.iloc[posiciones, columna] = float(precio)
+            cambiados.append(posiciones)
+        return self._recostear(np.unique(np.concatenate(cambiados)) if cambiados else [])
+
+    def actualizar_tipo_cambio(self, tipo_cambio):
+        """Aplica un tipo de cambio nuevo ($/USD); devuelve las diferencias por lote."""
+        if float(tipo_cambio) == self.tipo_cambio:
+            return self._recostear([])
+        self.tipo_cambio = float(tipo_cambio)
+        return self._recostear(self.afectados([("tipo_cambio",)]))
+
+    def actualizar_precio_soja(self, precio_soja_tn):
+        """Aplica un precio de soja nuevo (contratos en quintales); devuelve las diferencias por lote."""
+        if float(precio_soja_tn) == self.precio_soja_tn:
+            return self._recostear([])
+        self.precio_soja_tn = float(precio_soja_tn)
+        return self._recostear(self.afectados([("precio_soja",)]))
+
+    def actualizar_contrato(self, contrato, **componentes):
+        """
+        Cambia los términos de un contrato en todos los lotes arrendados con él.
+
+        Parámetros:
+        - contrato: Nombre del contrato
+        - componentes: usd_ha, qq_soja_ha y/o porcentaje_cosecha nuevos
+
+        Retorna:
+        - DataFrame de diferencias por lote (ver actualizar_tarifas)
+        """
+        desconocidos = sorted(set(componentes) - set(COMPONENTES_CONTRATO))
+        if desconocidos:
+            raise ValueError("Componentes de contrato desconocidos: " + ", ".join(desconocidos))
+        posiciones = self.afectados([("contrato", str(contrato))])
+        if "usd_ha" in componentes:
+            self._usd_ha[posiciones] = float(componentes["usd_ha"])
+        if "qq_soja_ha" in componentes:
+            self._qq_soja_ha[posiciones] = float(componentes["qq_soja_ha"])
+            soja = self.indice[("precio_soja",)]
+            self.indice[("precio_soja",)] = (np.union1d(soja, posiciones) if float(componentes["qq_soja_ha"]) != 0
+                                             else np.setdiff1d(soja, posiciones))
+        if "porcentaje_cosecha" in componentes:
+            self._porcentaje_cosecha[posiciones] = float(componentes["porcentaje_cosecha"])
+        return self._recostear(posiciones)
+
+    def dependencias(self):
+        """Cantidad de lotes que dependen de cada insumo (DataFrame Insumo, Clave, Lotes)."""
+        return pd.DataFrame([(clave[0], clave[1] if len(clave) > 1 else "", len(posiciones))
+                             for clave, posiciones in self.indice.items()], columns=["Insumo", "Clave", "Lotes"])
+
+    def guardar(self, almacen, tabla, campana, tarifa, escenario="base"):
+        """
+        Guarda los resultados en el almacén.
+
+        La primera vez (o con otra tabla, campaña, tarifa o escenario) se guarda toda la cartera;
+        después solo se reescriben las particiones (zona y cultivo) con lotes recalculados.
+
+        Retorna:
+        - Cantidad de filas escritas
+        """
+        clave = (almacen.carpeta, tabla, int(campana), str(tarifa), str(escenario))
+        df = self.resultados.drop(columns="id")
+        if self._guardado != clave:
+            filas = almacen.guardar(tabla, df, campana, tarifa, escenario)
+        elif self._pendientes.any():
+            particiones = pd.MultiIndex.from_frame(df.loc[self._pendientes, ["zona", "cultivo"]].astype(str))
+            en_particiones = pd.MultiIndex.from_frame(df[["zona", "cultivo"]].astype(str)).isin(particiones)
+            filas = almacen.reemplazar_particiones(tabla, df[en_particiones], campana, tarifa, escenario)
+        else:
+            filas = 0
+        self._guardado = clave
+        self._pendientes[:] = False
+        return filas
@@ -0,0 +1,188 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+# Historial de rendimientos por lote y campaña, para reemplazar la variación fija de ±20%
+# por distribuciones empíricas (percentiles y remuestreo bootstrap) por cultivo y zona.
+# Cada archivo CSV de historial tiene las columnas:
+# - campana: Primer año de la campaña (2024 para la 2024/25) o el texto "2024/25"
+# - lote: Identificador del lote
+# - zona: Zona del lote
+# - cultivo: Cultivo (mismos nombres que la tabla comparativa)
+# - rendimiento: Rendimiento obtenido en tn/ha
+COLUMNAS_HISTORIAL = ["campana", "lote", "zona", "cultivo", "rendimiento"]
+
+PERCENTILES_DEFAULT = (10, 50, 90)
+REMUESTRAS_DEFAULT = 5000
+
+
+def _anio_campana(campanas):
+    # "2024/25" -> 2024; 2024 -> 2024
+    return pd.Series(campanas).astype(str).str.slice(0, 4).astype(int).to_numpy()
+
+
+class HistorialRendimientos:
+    """
+    Almacén columnar compacto del historial de rendimientos.
+
+    Cultivo, zona y lote se guardan como códigos enteros (con sus tablas de nombres),
+    la campaña como entero de 16 bits y el rendimiento como float32. Las filas se
+    ordenan por cultivo y campaña: cada cultivo es un tramo contiguo y, dentro del
+    tramo, cada campaña también, de modo que el remuestreo es aritmética de índices.
+    """
+
+    def __init__(self, df):
+        faltantes = [c for c in COLUMNAS_HISTORIAL if c not in df.columns]
+        if faltantes:
+            raise ValueError("Faltan columnas en el historial de rendimientos: " + ", ".join(faltantes))
+        df = df.dropna(subset=["rendimiento"])
+        if df.empty:
+            raise ValueError("El historial de rendimientos no tiene datos")
+
+        codigo_cultivo, self.cultivos = pd.factorize(df["cultivo"].astype(str), sort=True)
+        codigo_zona, self.zonas = pd.factorize(df["zona"].astype(str), sort=True)
+        codigo_lote, self.lotes = pd.factorize(df["lote"].astype(str), sort=True)
+        campana = _anio_campana(df["campana"])
+
+        orden = np.lexsort((campana, codigo_cultivo))
+        self.cultivo = codigo_cultivo[orden].astype(np.int16)
+        self.zona = codigo_zona[orden].astype(np.int16)
+        self.lote = codigo_lote[orden].astype(np.int32)
+        self.campana = campana[orden].astype(np.int16)
+        self.rendimiento = df["rendimiento"].to_numpy(dtype=np.float32)[orden]
+        self.cultivos = list(self.cultivos)
+        self.zonas = list(self.zonas)
+        self.lotes = list(self.lotes)
+        # Inicio del tramo de cada cultivo (y el fin del último)
+        self._tramos = np.searchsorted(self.cultivo, np.arange(len(self.cultivos) + 1))
+
+    def __len__(self):
+        return len(self.rendimiento)
+
+    @property
+    def campanas(self):
+        return sorted(set(self.campana.tolist()))
+
+    def guardar(self, ruta):
+        """Guarda el historial en un archivo .npz comprimido."""
+        np.savez_compressed(ruta, cultivo=self.cultivo, zona=self.zona, lote=self.lote, campana=self.campana,
+                            rendimiento=self.rendimiento, cultivos=np.array(self.cultivos),
+                            zonas=np.array(self.zonas), lotes=np.array(self.lotes))
+
+    @classmethod
+    def abrir(cls, ruta):
+        """Abre un historial guardado con guardar()."""
+        with np.load(ruta) as datos:
+            cultivos, zonas, lotes = list(datos["cultivos"]), list(datos["zonas"]), list(datos["lotes"])
+            return cls(pd.DataFrame({
+                "campana": datos["campana"],
+                "lote": np.array(lotes, dtype=object)[datos["lote"]],
+                "zona": np.array(zonas, dtype=object)[datos["zona"]],
+                "cultivo": np.array(cultivos, dtype=object)[datos["cultivo"]],
+                "rendimiento": datos["rendimiento"],
+            }))
+
+    def _filas(self, cultivo, zona=None):
+        # Filas de un cultivo (y zona), ordenadas por campaña
+        if cultivo not in self.cultivos:
+            return np.empty(0, dtype=np.int64)
+        c = self.cultivos.index(cultivo)
+        filas = np.arange(self._tramos[c], self._tramos[c + 1])
+        if zona is not None:
+            if zona not in self.zonas:
+                return np.empty(0, dtype=np.int64)
+            filas = filas[self.zona[filas] == self.zonas.index(zona)]
+        return filas
+
+    def muestras(self, cultivo, zona=None):
+        """Rendimientos observados de un cultivo (y zona) en tn/ha."""
+        return self.rendimiento[self._filas(cultivo, zona)].astype(float)
+
+    def cuantiles(self, cultivos, percentiles=PERCENTILES_DEFAULT, zona=None):
+        """
+        Percentiles empíricos del rendimiento por cultivo.
+
+        Parámetros:
+        - cultivos: Lista de cultivos
+        - percentiles: Percentiles a calcular (0-100)
+        - zona: Zona a considerar (None para todas)
+
+        Retorna:
+        - DataFrame con una fila por cultivo: Observaciones y una columna P<n> por percentil (NaN sin datos)
+        """
+        filas = []
+        for cultivo in cultivos:
+            valores = self.muestras(cultivo, zona)
+            p = np.percentile(valores, percentiles) if len(valores) else np.full(len(percentiles), np.nan)
+            filas.append([cultivo, len(valores)] + list(p))
+        return pd.DataFrame(filas, columns=["Cultivo", "Observaciones"] + [f"P{int(q)}" for q in percentiles])
+
+    def bootstrap(self, cultivos, n_remuestras=REMUESTRAS_DEFAULT, zona=None, por_campana=True, semilla=None):
+        """
+        Remuestreo bootstrap de rendimientos para varios cultivos a la vez.
+
+        Con por_campana=True cada remuestra sortea primero una campaña, común a todos los
+        cultivos, y luego una observación de esa campaña para cada cultivo: así se conserva
+        la correlación entre cultivos de un mismo año (clima), que importa en las rotaciones.
+        Si un cultivo no tiene datos en la campaña sorteada se usa cualquier campaña.
+
+        Parámetros:
+        - cultivos: Lista de cultivos
+        - n_remuestras: Cantidad de remuestras
+        - zona: Zona a considerar (None para todas)
+        - por_campana: Sortear campañas comunes a todos los cultivos
+        - semilla: Semilla del generador aleatorio
+
+        Retorna:
+        - Array (n_remuestras, len(cultivos)) de rendimientos en tn/ha (NaN si el cultivo no tiene historial)
+        """
+        rng = np.random.default_rng(semilla)
+        resultado = np.full((n_remuestras, len(cultivos)), np.nan)
+        campanas = rng.choice(self.campanas, size=n_remuestras) if por_campana else None
+        for j, cultivo in enumerate(cultivos):
+            filas = self._filas(cultivo, zona)
+            if len(filas) == 0:
+                continue
+            sorteo = rng.random(n_remuestras)
+            posicion = (sorteo * len(filas)).astype(np.int64)
+            if por_campana:
+                # Tramo de la campaña sorteada dentro de las filas (ordenadas por campaña)
+                campana_filas = self.campana[filas]
+                inicio = np.searchsorted(campana_filas, campanas, side="left")
+                cantidad = np.searchsorted(campana_filas, campanas, side="right") - inicio
+                posicion = np.where(cantidad > 0, inicio + (sorteo * cantidad).astype(np.int64), posicion)
+            resultado[:, j] = self.rendimiento[filas[posicion]]
+        return resultado
+
+    def factores_relativos(self, cultivo, percentiles=PERCENTILES_DEFAULT, zona=None):
+        """
+        Percentiles del rendimiento relativos a la mediana histórica (1.0 = mediana).
+
+        Permiten aplicar la variabilidad histórica a un rendimiento base distinto del histórico.
+        """
+        valores = self.muestras(cultivo, zona)
+        if len(valores) == 0:
+            return None
+        mediana = np.median(valores)
+        return np.percentile(valores, percentiles) / mediana if mediana > 0 else None
+
+
+def cargar_historial(archivos):
+    """
+    Carga el historial de rendimientos.
+
+    Parámetros:
+    - archivos: Directorio, ruta, o lista de rutas/archivos CSV
+
+    Retorna:
+    - HistorialRendimientos
+    """
+    if isinstance(archivos, (str, os.PathLike)) and os.path.isdir(archivos):
+        archivos = sorted(glob.glob(os.path.join(archivos, "*.csv")))
+    elif isinstance(archivos, (str, os.PathLike)) or hasattr(archivos, "read"):
+        archivos = [archivos]
+    if not archivos:
+        raise ValueError("No se encontraron archivos de historial de rendimientos")
+    return HistorialRendimientos(pd.concat([pd.read_csv(archivo) for archivo in archivos], ignore_index=True))
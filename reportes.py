@@ -0,0 +1,469 @@
+import html
+import importlib
+import os
+import re
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from arrendamientos import MotorArrendamientos, CONTRATO_DEFAULT, cargar_contratos
+from cartera import completar_lotes
+from comercializacion import motor_vigente, cargar_parametros, PARAMETROS_DEFAULT
+from datos_base import tabla_comparativa, cargar_tabla_fletes, TIPO_CAMBIO_DEFAULT
+from equilibrio import margenes_lotes, equilibrios_cartera
+from insumos import MatrizInsumos, INSUMOS_DEFAULT, RECETAS_DEFAULT
+from paralelo import EjecutorParalelo, particionar
+from tarifas import tabla_cosecha, tabla_labores, costo_labores, TARIFAS_COSECHA_DEFAULT, TARIFAS_LABORES_DEFAULT, \
+    KM_TRASLADO_DEFAULT
+
+# Reportes de márgenes en lote para muchos campos (clientes), sin pasar por la aplicación.
+# Cada campo es una tabla de lotes (mismo formato que la cartera de la Calculadora) y se
+# genera un reporte con las tablas y gráficos equivalentes a las pestañas Calculadora y
+# Rotaciones. Los campos se reparten en tandas entre los procesos del ejecutor paralelo:
+# la tabla de fletes viaja una sola vez en memoria compartida y la tabla comparativa y los
+# contratos una vez por tanda. Los costos se calculan como en la cartera de la aplicación con
+# sus valores por defecto: costos directos de la tabla comparativa con la labranza cotizada
+# por la tarifa de labores, cosecha por la tarifa del contratista y gastos de venta con el
+# motor de comercialización. Cada proceso escribe los archivos de cada campo apenas los
+# genera (no se acumulan en memoria) y devuelve solo una fila de resumen.
+#
+# Uso: python reportes.py lotes.csv --salida reportes --formatos html xlsx
+#   lotes.csv con una columna "campo", o una carpeta con un CSV de lotes por campo.
+
+# Formato -> paquete opcional que necesita (None: sin dependencias)
+FORMATOS = {"html": None, "xlsx": "openpyxl", "pdf": "weasyprint"}
+FORMATOS_DEFAULT = ("html",)
+TAREAS_POR_PROCESO = 4
+
+# Rotaciones de doble cultivo: cultivo de 2da -> cultivo de invierno que lo antecede
+ANTECESOR_SEGUNDA = {"Soja 2da": "Trigo", "Maíz 2da": "Trigo"}
+
+_ESTILO = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; margin-bottom: 1.5em; font-size: 0.9em; }
+th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: right; }
+th { background: #eef3e8; }
+td:first-child, th:first-child { text-align: left; }
+.error { color: #a00; }
+"""
+
+
+def requerir_formatos(formatos):
+    """
+    Verifica que estén instalados los paquetes que necesita cada formato.
+
+    Parámetros:
+    - formatos: Lista de formatos ("html", "xlsx", "pdf")
+
+    Lanza:
+    - ValueError si un formato no existe, ImportError si falta su paquete
+    """
+    for formato in formatos:
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido: {formato} (disponibles: {', '.join(FORMATOS)})")
+        paquete = FORMATOS[formato]
+        if paquete is None:
+            continue
+        try:
+            importlib.import_module(paquete)
+        except ImportError:
+            raise ImportError(f"El formato {formato} requiere el paquete {paquete}: pip install {paquete}") from None
+
+
+def nombre_archivo(campo):
+    """Nombre de archivo seguro para un campo."""
+    return re.sub(r"[^\w\-]+", "_", str(campo)).strip("_") or "campo"
+
+
+def cargar_campos(ruta):
+    """
+    Carga las tablas de lotes de los campos.
+
+    Parámetros:
+    - ruta: Carpeta con un CSV de lotes por campo (el nombre del archivo es el campo), o un CSV
+      de lotes con una columna "campo"
+
+    Retorna:
+    - Lista de tuplas (campo, DataFrame de lotes), ordenada por campo. Las tablas se validan
+      y completan al generar cada reporte, así un campo con errores no detiene el resto.
+    """
+    if os.path.isdir(ruta):
+        archivos = sorted(f for f in os.listdir(ruta) if f.lower().endswith(".csv"))
+        return [(os.path.splitext(f)[0], pd.read_csv(os.path.join(ruta, f))) for f in archivos]
+    df = pd.read_csv(ruta)
+    if "campo" not in df.columns:
+        raise ValueError("La tabla de lotes debe tener una columna 'campo' (o indicar una carpeta con un CSV por campo)")
+    return [(str(campo), grupo.drop(columns="campo").reset_index(drop=True))
+            for campo, grupo in df.groupby("campo", sort=True)]
+
+
+@lru_cache(maxsize=None)
+def _tablas_contratistas():
+    # Tarifas de cosecha y labores y pasadas por cultivo de la receta (una vez por proceso)
+    pasadas = MatrizInsumos(RECETAS_DEFAULT, INSUMOS_DEFAULT).densa()[TARIFAS_LABORES_DEFAULT["labor"].unique()]
+    return tabla_cosecha(TARIFAS_COSECHA_DEFAULT), tabla_labores(TARIFAS_LABORES_DEFAULT), pasadas
+
+
+def costos_contratistas(df_lotes, km_contratista=KM_TRASLADO_DEFAULT):
+    """
+    Cosecha y labores por lote con las tarifas de contratistas, como en la cartera de la aplicación.
+
+    Parámetros:
+    - df_lotes: DataFrame de lotes completo
+    - km_contratista: Distancia de traslado de los contratistas (km)
+
+    Retorna:
+    - Tupla (cosecha, labores) con arrays en USD/ha por lote
+    """
+    tarifas_cosecha, tarifas_labores, pasadas = _tablas_contratistas()
+    cosecha = tarifas_cosecha.consultar([df_lotes["cultivo"]], df_lotes["rendimiento"], km_contratista)
+    return cosecha, costo_labores(tarifas_labores, pasadas, df_lotes["cultivo"], km_contratista)
+
+
+def resultados_campo(df_lotes, df_comparativo, km_tabla, tarifa_tabla, df_contratos, tipo_cambio, precio_soja,
+                     km_contratista=KM_TRASLADO_DEFAULT, comercializacion=None):
+    """
+    Calcula las tablas del reporte de un campo.
+
+    Parámetros:
+    - df_lotes: DataFrame de lotes completo del campo
+    - df_comparativo: Tabla comparativa de cultivos
+    - km_tabla, tarifa_tabla: Tabla de fletes
+    - df_contratos: Tabla de contratos de arrendamiento
+    - tipo_cambio: Tipo de cambio en $/USD
+    - precio_soja: Precio de la soja en USD/tn (contratos en quintales)
+    - km_contratista: Distancia de traslado de los contratistas para cosecha y labores (km)
+    - comercializacion: MotorComercializacion para los gastos de venta (por defecto los parámetros vigentes)
+
+    Retorna:
+    - Diccionario nombre -> DataFrame con las tablas del reporte (en orden de presentación)
+    """
+    motor = MotorArrendamientos(df_lotes, df_contratos)
+    arrendamiento_fijo, fraccion_arrendamiento = motor.componentes(precio_soja)
+    cosecha, labores = costos_contratistas(df_lotes, km_contratista)
+    df_margenes = margenes_lotes(df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio,
+                                 arrendamiento_fijo, fraccion_arrendamiento, cosecha=cosecha, labores=labores,
+                                 comercializacion=comercializacion)
+
+    # Calculadora: márgenes por cultivo (totales y por hectárea)
+    columnas = ["ingreso_bruto", "costos_directos", "comercializacion", "estructura", "cosecha", "flete",
+                "arrendamiento", "margen_bruto", "margen_directo"]
+    por_cultivo = df_margenes.groupby("cultivo", sort=False)[["superficie"] + columnas].sum()
+    df_cultivos = pd.DataFrame({
+        "Cultivo": por_cultivo.index,
+        "Superficie (ha)": por_cultivo["superficie"].to_numpy(),
+        "Ingreso Bruto (USD/ha)": (por_cultivo["ingreso_bruto"] / por_cultivo["superficie"]).to_numpy(),
+        "Costos Directos (USD/ha)": (por_cultivo["costos_directos"] / por_cultivo["superficie"]).to_numpy(),
+        "Margen Bruto (USD/ha)": (por_cultivo["margen_bruto"] / por_cultivo["superficie"]).to_numpy(),
+        "Margen Directo (USD/ha)": (por_cultivo["margen_directo"] / por_cultivo["superficie"]).to_numpy(),
+        "Margen Bruto Total (USD)": por_cultivo["margen_bruto"].to_numpy(),
+        "Margen Directo Total (USD)": por_cultivo["margen_directo"].to_numpy(),
+    })
+    totales = df_margenes[["superficie"] + columnas].sum()
+    df_costos = pd.DataFrame({
+        "Concepto": ["Costos Directos", "Comercialización", "Estructura", "Cosecha", "Flete", "Arrendamiento", "Margen Directo"],
+        "USD/ha": [totales[c] / totales["superficie"] if totales["superficie"] > 0 else 0.0
+                   for c in ("costos_directos", "comercializacion", "estructura", "cosecha", "flete",
+                             "arrendamiento", "margen_directo")]
+    })
+
+    # Rotaciones: cada cultivo de 2da se combina con el de invierno que lo antecede
+    md_ha = dict(zip(df_cultivos["Cultivo"], df_cultivos["Margen Directo (USD/ha)"]))
+    mb_ha = dict(zip(df_cultivos["Cultivo"], df_cultivos["Margen Bruto (USD/ha)"]))
+    superficie = dict(zip(df_cultivos["Cultivo"], df_cultivos["Superficie (ha)"]))
+    filas = []
+    ocupado = {}
+    for segunda, antecesor in ANTECESOR_SEGUNDA.items():
+        if superficie.get(segunda, 0) > 0:
+            filas.append((f"{antecesor} + {segunda}", superficie[segunda],
+                          mb_ha.get(antecesor, 0.0) + mb_ha[segunda], md_ha.get(antecesor, 0.0) + md_ha[segunda]))
+            ocupado[antecesor] = ocupado.get(antecesor, 0.0) + superficie[segunda]
+    for cultivo, ha in superficie.items():
+        if cultivo in ANTECESOR_SEGUNDA:
+            continue
+        ha_solo = ha - ocupado.get(cultivo, 0.0)
+        if ha_solo > 0:
+            filas.append((cultivo, ha_solo, mb_ha[cultivo], md_ha[cultivo]))
+    df_rotaciones = pd.DataFrame(filas, columns=["Rotación", "Superficie (ha)", "Margen Bruto (USD/ha)", "Margen Directo (USD/ha)"])
+    df_rotaciones["Margen Directo Total (USD)"] = df_rotaciones["Superficie (ha)"] * df_rotaciones["Margen Directo (USD/ha)"]
+    superficie_fisica = df_rotaciones["Superficie (ha)"].sum()
+    superficie_efectiva = df_cultivos["Superficie (ha)"].sum()
+    df_rotaciones = pd.concat([df_rotaciones, pd.DataFrame([{
+        "Rotación": "TOTAL",
+        "Superficie (ha)": superficie_fisica,
+        "Margen Bruto (USD/ha)": (df_rotaciones["Superficie (ha)"] * df_rotaciones["Margen Bruto (USD/ha)"]).sum() / superficie_fisica
+        if superficie_fisica > 0 else 0.0,
+        "Margen Directo (USD/ha)": df_rotaciones["Margen Directo Total (USD)"].sum() / superficie_fisica if superficie_fisica > 0 else 0.0,
+        "Margen Directo Total (USD)": df_rotaciones["Margen Directo Total (USD)"].sum(),
+    }])], ignore_index=True)
+    df_superficie = pd.DataFrame({
+        "Indicador": ["Superficie física (ha)", "Superficie efectiva (ha)", "Intensidad de uso (%)"],
+        "Valor": [superficie_fisica, superficie_efectiva,
+                  superficie_efectiva / superficie_fisica * 100 if superficie_fisica > 0 else 0.0]
+    })
+
+    return {
+        "Márgenes por cultivo": df_cultivos,
+        "Costos y margen por hectárea": df_costos,
+        "Lotes y puntos de equilibrio": equilibrios_cartera(df_lotes, df_comparativo, km_tabla, tarifa_tabla, tipo_cambio,
+                                                            arrendamiento_fijo, fraccion_arrendamiento, cosecha=cosecha,
+                                                            labores=labores, comercializacion=comercializacion),
+        "Arrendamientos": motor.resumen(precio_soja),
+        "Rotaciones": df_rotaciones,
+        "Superficie": df_superficie,
+    }
+
+
+def grafico_barras(etiquetas, valores, titulo, ancho=560, alto_barra=22):
+    """
+    Gráfico de barras horizontales como SVG (se incrusta en el HTML, sin dependencias).
+
+    Parámetros:
+    - etiquetas: Nombre de cada barra
+    - valores: Valor de cada barra (admite negativos)
+    - titulo: Título del gráfico
+
+    Retorna:
+    - Texto SVG
+    """
+    valores = np.nan_to_num(np.asarray(valores, dtype=float))
+    margen_izq, margen_der = 160, 90
+    minimo, maximo = min(0.0, valores.min(initial=0.0)), max(0.0, valores.max(initial=0.0))
+    escala = (ancho - margen_izq - margen_der) / ((maximo - minimo) or 1.0)
+    cero = margen_izq + (0.0 - minimo) * escala
+    alto = 30 + alto_barra * len(valores)
+    partes = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{ancho}" height="{alto}" font-size="12">',
+              f'<text x="0" y="16" font-weight="bold">{html.escape(titulo)}</text>']
+    for i, (etiqueta, valor) in enumerate(zip(etiquetas, valores)):
+        y = 26 + i * alto_barra
+        x = min(cero, cero + valor * escala)
+        color = "#4a7c2a" if valor >= 0 else "#b03a2e"
+        partes.append(f'<text x="{margen_izq - 6}" y="{y + 14}" text-anchor="end">{html.escape(str(etiqueta))}</text>')
+        partes.append(f'<rect x="{x:.1f}" y="{y + 2}" width="{abs(valor) * escala:.1f}" height="{alto_barra - 6}" fill="{color}"/>')
+        partes.append(f'<text x="{max(cero, cero + valor * escala) + 4:.1f}" y="{y + 14}">{valor:,.0f}</text>')
+    partes.append(f'<line x1="{cero:.1f}" y1="24" x2="{cero:.1f}" y2="{alto}" stroke="#555"/></svg>')
+    return "".join(partes)
+
+
+def html_campo(campo, tablas, parametros):
+    """
+    Reporte HTML de un campo (tablas y gráficos de las pestañas Calculadora y Rotaciones).
+
+    Parámetros:
+    - campo: Nombre del campo
+    - tablas: Diccionario de resultados_campo
+    - parametros: Diccionario de parámetros usados (se listan al inicio)
+
+    Retorna:
+    - Texto HTML
+    """
+    def tabla(nombre):
+        return f"<h3>{html.escape(nombre)}</h3>" + tablas[nombre].to_html(
+            index=False, border=0, float_format=lambda v: f"{v:,.2f}", na_rep="-")
+
+    cultivos = tablas["Márgenes por cultivo"]
+    rotaciones = tablas["Rotaciones"].iloc[:-1]
+    costos = tablas["Costos y margen por hectárea"]
+    lista_parametros = "".join(f"<li>{html.escape(str(k))}: {html.escape(str(v))}</li>" for k, v in parametros.items())
+    return "\n".join([
+        "<!DOCTYPE html>",
+        f'<html lang="es"><head><meta charset="utf-8"><title>Márgenes - {html.escape(str(campo))}</title>',
+        f"<style>{_ESTILO}</style></head><body>",
+        f"<h1>Márgenes agrícolas: {html.escape(str(campo))}</h1>",
+        f"<ul>{lista_parametros}</ul>",
+        "<h2>Calculadora</h2>",
+        tabla("Márgenes por cultivo"),
+        grafico_barras(cultivos["Cultivo"], cultivos["Margen Directo (USD/ha)"], "Margen Directo por cultivo (USD/ha)"),
+        tabla("Costos y margen por hectárea"),
+        grafico_barras(costos["Concepto"], costos["USD/ha"], "Distribución del ingreso (USD/ha)"),
+        tabla("Lotes y puntos de equilibrio"),
+        tabla("Arrendamientos"),
+        "<h2>Rotaciones</h2>",
+        tabla("Superficie"),
+        tabla("Rotaciones"),
+        grafico_barras(rotaciones["Rotación"], rotaciones["Margen Directo (USD/ha)"], "Margen Directo por rotación (USD/ha)"),
+        "</body></html>",
+    ])
+
+
+def _escribir(ruta, escribir):
+    # Escribe en un archivo temporal y lo renombra: un reporte a medio escribir nunca queda con el nombre final
+    temporal = ruta + ".tmp"
+    try:
+        escribir(temporal)
+        os.replace(temporal, ruta)
+    except BaseException:
+        # Si la escritura falla no queda el temporal a medio escribir
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _escribir_xlsx(ruta, tablas):
+    def escribir(destino):
+        with pd.ExcelWriter(destino, engine="openpyxl") as libro:
+            for nombre, df in tablas.items():
+                df.to_excel(libro, sheet_name=nombre[:31], index=False)
+    _escribir(ruta, escribir)
+
+
+def _escribir_pdf(ruta, texto_html):
+    from weasyprint import HTML
+    _escribir(ruta, lambda destino: HTML(string=texto_html).write_pdf(destino))
+
+
+def _escribir_html(ruta, texto_html):
+    def escribir(destino):
+        with open(destino, "w", encoding="utf-8") as archivo:
+            archivo.write(texto_html)
+    _escribir(ruta, escribir)
+
+
+def _generar_tanda(entradas, salidas, campos, df_comparativo, df_contratos, carpeta, formatos, tipo_cambio, precio_soja,
+                   km_contratista, df_parametros):
+    # Tarea del ejecutor paralelo: genera y escribe los reportes de una tanda de campos
+    comercializacion = motor_vigente(df_parametros)
+    parametros = {"Tipo de cambio ($/USD)": f"{tipo_cambio:,.2f}", "Precio soja (USD/tn)": f"{precio_soja:,.2f}",
+                  "Costos directos": "tabla comparativa, con la labranza por tarifa de labores",
+                  "Traslado de contratistas (km)": f"{km_contratista:,.0f}",
+                  "Comercialización": "parámetros versión " + ", ".join(sorted(set(map(str, comercializacion.version.values()))))}
+    resumen = []
+    for campo, df_lotes in campos:
+        inicio = time.perf_counter()
+        fila = {"campo": campo, "lotes": len(df_lotes), "superficie": np.nan,
+                "margen_directo": np.nan, "archivos": "", "error": ""}
+        try:
+            df_lotes = completar_lotes(df_lotes, df_comparativo)
+            fila["superficie"] = float(df_lotes["superficie"].sum())
+            tablas = resultados_campo(df_lotes, df_comparativo, entradas["km"], entradas["tarifa"], df_contratos,
+                                      tipo_cambio, precio_soja, km_contratista, comercializacion)
+            fila["margen_directo"] = float(tablas["Márgenes por cultivo"]["Margen Directo Total (USD)"].sum())
+            base = os.path.join(carpeta, nombre_archivo(campo))
+            archivos = []
+            texto_html = html_campo(campo, tablas, parametros) if {"html", "pdf"} & set(formatos) else None
+            for formato in formatos:
+                ruta = f"{base}.{formato}"
+                if formato == "html":
+                    _escribir_html(ruta, texto_html)
+                elif formato == "xlsx":
+                    _escribir_xlsx(ruta, tablas)
+                elif formato == "pdf":
+                    _escribir_pdf(ruta, texto_html)
+                archivos.append(os.path.basename(ruta))
+            fila["archivos"] = " ".join(archivos)
+        except Exception as e:
+            # Un campo con datos inválidos o un error al escribir sus archivos no detiene la tanda:
+            # queda registrado en el resumen
+            fila["error"] = f"{type(e).__name__}: {e}"
+        fila["segundos"] = time.perf_counter() - inicio
+        resumen.append(fila)
+    return resumen
+
+
+def _html_indice(df_resumen):
+    filas = []
+    for fila in df_resumen.itertuples(index=False):
+        nombre = html.escape(str(fila.campo))
+        enlaces = " ".join(f'<a href="{html.escape(a)}">{html.escape(a.rsplit(".", 1)[-1])}</a>' for a in fila.archivos.split())
+        superficie = "-" if np.isnan(fila.superficie) else f"{fila.superficie:,.0f}"
+        margen = "-" if np.isnan(fila.margen_directo) else f"{fila.margen_directo:,.0f}"
+        error = f'<span class="error">{html.escape(fila.error)}</span>' if fila.error else ""
+        filas.append(f"<tr><td>{nombre}</td><td>{fila.lotes}</td><td>{superficie}</td>"
+                     f"<td>{margen}</td><td>{enlaces}{error}</td></tr>")
+    return "\n".join([
+        '<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>Reportes de márgenes</title>',
+        f"<style>{_ESTILO}</style></head><body><h1>Reportes de márgenes</h1>",
+        "<table><tr><th>Campo</th><th>Lotes</th><th>Superficie (ha)</th><th>Margen Directo (USD)</th><th>Reporte</th></tr>",
+        *filas,
+        "</table></body></html>",
+    ])
+
+
+def generar_reportes(campos, carpeta, formatos=FORMATOS_DEFAULT, df_comparativo=None, df_fletes=None,
+                     df_contratos=None, tipo_cambio=TIPO_CAMBIO_DEFAULT, precio_soja=None, km_contratista=KM_TRASLADO_DEFAULT,
+                     df_parametros=None, ejecutor=None, tareas_por_proceso=TAREAS_POR_PROCESO):
+    """
+    Genera los reportes de todos los campos en paralelo.
+
+    Parámetros:
+    - campos: Lista de tuplas (campo, DataFrame de lotes), por ejemplo de cargar_campos
+    - carpeta: Carpeta de salida (se crea si no existe)
+    - formatos: Formatos a generar ("html", "xlsx", "pdf")
+    - df_comparativo: Tabla comparativa de cultivos (por defecto la de la aplicación)
+    - df_fletes: Tabla de fletes con columnas KM y Tarifa_$/TN (por defecto la de la aplicación)
+    - df_contratos: Tabla de contratos (por defecto solo el contrato por defecto)
+    - tipo_cambio: Tipo de cambio en $/USD
+    - precio_soja: Precio de la soja en USD/tn (por defecto el de Soja 1ra en la tabla comparativa)
+    - km_contratista: Distancia de traslado de los contratistas para cosecha y labores (km)
+    - df_parametros: Parámetros de comercialización (por defecto los de ejemplo)
+    - ejecutor: EjecutorParalelo a usar (por defecto uno nuevo, que se cierra al terminar)
+    - tareas_por_proceso: Tandas por proceso (más tandas reparten mejor campos de distinto tamaño)
+
+    Retorna:
+    - DataFrame de resumen con una fila por campo (también se escriben resumen.csv e index.html)
+    """
+    requerir_formatos(formatos)
+    df_comparativo = tabla_comparativa() if df_comparativo is None else df_comparativo
+    df_fletes = cargar_tabla_fletes() if df_fletes is None else df_fletes
+    df_contratos = pd.DataFrame([CONTRATO_DEFAULT]) if df_contratos is None else df_contratos
+    df_parametros = PARAMETROS_DEFAULT if df_parametros is None else df_parametros
+    if precio_soja is None:
+        precio_soja = df_comparativo.loc[df_comparativo["Variable"] == "USD/tn", "Soja 1ra"].iloc[0]
+    os.makedirs(carpeta, exist_ok=True)
+
+    propio = ejecutor is None
+    ejecutor = EjecutorParalelo() if propio else ejecutor
+    try:
+        tramos = particionar(len(campos), ejecutor.procesos * tareas_por_proceso)
+        _, resultados = ejecutor.mapear(
+            _generar_tanda, [campos[a:b] for a, b in tramos],
+            entradas={"km": df_fletes["KM"].to_numpy(dtype=float), "tarifa": df_fletes["Tarifa_$/TN"].to_numpy(dtype=float)},
+            df_comparativo=df_comparativo, df_contratos=df_contratos, carpeta=carpeta, formatos=list(formatos),
+            tipo_cambio=float(tipo_cambio), precio_soja=float(precio_soja), km_contratista=float(km_contratista),
+            df_parametros=df_parametros
+        )
+    finally:
+        if propio:
+            ejecutor.cerrar()
+
+    df_resumen = pd.DataFrame([fila for tanda in resultados for fila in tanda],
+                              columns=["campo", "lotes", "superficie", "margen_directo", "archivos", "error", "segundos"])
+    df_resumen.to_csv(os.path.join(carpeta, "resumen.csv"), index=False)
+    _escribir_html(os.path.join(carpeta, "index.html"), _html_indice(df_resumen))
+    return df_resumen
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Genera reportes de márgenes para muchos campos.")
+    parser.add_argument("lotes", help="CSV de lotes con columna 'campo', o carpeta con un CSV por campo")
+    parser.add_argument("--salida", default="reportes", help="Carpeta de salida")
+    parser.add_argument("--formatos", nargs="+", default=list(FORMATOS_DEFAULT), choices=list(FORMATOS))
+    parser.add_argument("--contratos", help="CSV de contratos de arrendamiento")
+    parser.add_argument("--tipo-cambio", type=float, default=TIPO_CAMBIO_DEFAULT)
+    parser.add_argument("--precio-soja", type=float)
+    parser.add_argument("--km-contratista", type=float, default=KM_TRASLADO_DEFAULT,
+                        help="Traslado de contratistas (km) para las tarifas de cosecha y labores")
+    parser.add_argument("--parametros", help="CSV de parámetros de comercialización")
+    parser.add_argument("--procesos", type=int, help="Procesos (por defecto MARGENES_PROCESOS o la cantidad de CPUs)")
+    argumentos = parser.parse_args()
+
+    try:
+        requerir_formatos(argumentos.formatos)
+    except ImportError as e:
+        parser.exit(1, f"{e}\n")
+    inicio = time.perf_counter()
+    with EjecutorParalelo(argumentos.procesos) as ejecutor:
+        resumen = generar_reportes(
+            cargar_campos(argumentos.lotes), argumentos.salida, argumentos.formatos,
+            df_contratos=cargar_contratos(argumentos.contratos) if argumentos.contratos else None,
+            tipo_cambio=argumentos.tipo_cambio, precio_soja=argumentos.precio_soja,
+            km_contratista=argumentos.km_contratista,
+            df_parametros=cargar_parametros(argumentos.parametros) if argumentos.parametros else None, ejecutor=ejecutor
+        )
+    errores = int((resumen["error"] != "").sum())
+    print(f"{len(resumen) - errores} reportes generados en {argumentos.salida} ({time.perf_counter() - inicio:.1f} s)"
+          + (f"; {errores} campos con errores (ver resumen.csv)" if errores else ""))
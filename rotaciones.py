@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+
+from comercializacion import PRODUCTO_CULTIVO
+from paralelo import particionar
+
+# Simulación plurianual de secuencias de rotación.
+# Cada campaña de una secuencia es un "plan" (un cultivo, un doble cultivo trigo/2da o
+# barbecho). Las reglas de transición ajustan el rendimiento según lo sembrado la campaña
+# anterior y prohíben secuencias inviables. Se evalúan miles de secuencias x escenarios a
+# la vez: el margen de una secuencia en un escenario es un producto matricial.
+
+# Planes de campaña: nombre -> cultivos que se cosechan en la campaña
+PLANES_DEFAULT = {
+    "Trigo + Soja 2da": ["Trigo", "Soja 2da"],
+    "Trigo + Maíz 2da": ["Trigo", "Maíz 2da"],
+    "Soja 1ra": ["Soja 1ra"],
+    "Maíz": ["Maíz"],
+    "Maíz Tardío": ["Maíz Tardío"],
+    "Girasol": ["Girasol"],
+    "Barbecho": [],
+}
+BARBECHO = "Barbecho"
+
+# Costo de mantener un barbecho (control de malezas) en USD/ha
+COSTO_BARBECHO_DEFAULT = 40.0
+
+# Reglas de rendimiento: (producto de la campaña anterior, producto actual, factor).
+# El producto anterior BARBECHO aplica a cualquier cultivo después de un barbecho.
+# Valores de ejemplo; deben ajustarse con ensayos o el historial propio.
+REGLAS_DEFAULT = [
+    ("Soja", "Soja", 0.90),       # Soja sobre soja: enfermedades y menor aporte de rastrojo
+    ("Girasol", "Girasol", 0.85),  # Girasol sobre girasol: enfermedades de suelo
+    ("Trigo", "Trigo", 0.92),      # Trigo sobre trigo
+    ("Maíz", "Maíz", 0.95),        # Maíz sobre maíz
+    ("Soja", "Maíz", 1.05),        # Maíz después de soja
+    ("Maíz", "Soja", 1.03),        # Soja después de maíz
+    (BARBECHO, "*", 1.05),         # Recarga de agua después de un barbecho
+]
+
+# Transiciones inviables (plan anterior, plan actual): la cosecha tardía de la campaña
+# anterior se superpone con la siembra del trigo
+TRANSICIONES_PROHIBIDAS_DEFAULT = [
+    ("Trigo + Maíz 2da", "Trigo + Soja 2da"),
+    ("Trigo + Maíz 2da", "Trigo + Maíz 2da"),
+    ("Maíz Tardío", "Trigo + Soja 2da"),
+    ("Maíz Tardío", "Trigo + Maíz 2da"),
+]
+
+ANIOS_DEFAULT = 5
+MAX_SECUENCIAS_DEFAULT = 20000
+CV_RENDIMIENTO_DEFAULT = 0.2
+CORRELACION_CAMPANA_DEFAULT = 0.6
+BLOQUE_SECUENCIAS = 4096
+
+
+def _producto(cultivo):
+    return PRODUCTO_CULTIVO.get(cultivo, cultivo)
+
+
+class ModeloRotaciones:
+    """
+    Planes de campaña, reglas de transición y datos económicos por cultivo.
+
+    Se arma una sola vez: la composición de cada plan (planes x cultivos), la matriz de
+    factores de rendimiento (plan anterior x plan actual x cultivos) y la de transiciones
+    permitidas, de modo que evaluar una secuencia es indexar estas matrices.
+    """
+
+    def __init__(self, cultivos, rendimientos_base, precios, margenes_base, planes=None, reglas=None,
+                 transiciones_prohibidas=None, costo_barbecho=COSTO_BARBECHO_DEFAULT):
+        planes = PLANES_DEFAULT if planes is None else planes
+        reglas = REGLAS_DEFAULT if reglas is None else reglas
+        transiciones_prohibidas = TRANSICIONES_PROHIBIDAS_DEFAULT if transiciones_prohibidas is None else transiciones_prohibidas
+
+        self.cultivos = list(cultivos)
+        self.planes = list(planes)
+        faltantes = sorted({c for cs in planes.values() for c in cs} - set(self.cultivos))
+        if faltantes:
+            raise ValueError("Cultivos de los planes sin datos económicos: " + ", ".join(faltantes))
+
+        self.rendimientos_base = np.asarray(rendimientos_base, dtype=float)
+        self.precios = np.asarray(precios, dtype=float)
+        self.margenes_base = np.asarray(margenes_base, dtype=float)
+
+        k, j = len(self.planes), len(self.cultivos)
+        self.composicion = np.zeros((k, j))
+        for p, plan in enumerate(self.planes):
+            for cultivo in planes[plan]:
+                self.composicion[p, self.cultivos.index(cultivo)] = 1.0
+        # Margen fijo de cada plan (el barbecho solo tiene su costo)
+        self.margen_plan = np.array([-costo_barbecho if not planes[plan] else 0.0 for plan in self.planes])
+
+        # Factores de rendimiento por transición
+        productos_plan = [{_producto(c) for c in planes[plan]} or {BARBECHO} for plan in self.planes]
+        productos_cultivo = [_producto(c) for c in self.cultivos]
+        self.factores = np.ones((k, k, j))
+        for anterior, actual, factor in reglas:
+            previos = np.array([anterior in productos for productos in productos_plan])
+            cultivos_regla = np.array([actual == "*" or actual == producto for producto in productos_cultivo])
+            self.factores[np.ix_(previos, np.ones(k, dtype=bool), cultivos_regla)] *= factor
+
+        self.permitidas = np.ones((k, k), dtype=bool)
+        for anterior, actual in transiciones_prohibidas:
+            if anterior in self.planes and actual in self.planes:
+                self.permitidas[self.planes.index(anterior), self.planes.index(actual)] = False
+
+    def secuencias(self, anios=ANIOS_DEFAULT, max_secuencias=MAX_SECUENCIAS_DEFAULT, semilla=None):
+        """
+        Secuencias candidatas de planes: todas las permitidas si no superan max_secuencias,
+        o una muestra aleatoria de secuencias permitidas.
+
+        Retorna:
+        - Array (secuencias, anios) de índices de plan
+        """
+        k = len(self.planes)
+        if k ** anios <= max_secuencias:
+            secuencias = np.stack(np.unravel_index(np.arange(k ** anios), (k,) * anios), axis=1)
+        else:
+            # Muestreo de cadenas: cada campaña se sortea entre los planes permitidos tras la anterior
+            rng = np.random.default_rng(semilla)
+            secuencias = np.empty((max_secuencias, anios), dtype=np.int64)
+            secuencias[:, 0] = rng.integers(0, k, max_secuencias)
+            acumulada = np.cumsum(self.permitidas, axis=1)
+            for a in range(1, anios):
+                filas = acumulada[secuencias[:, a - 1]]
+                sorteo = (rng.random(max_secuencias) * filas[:, -1]).astype(np.int64)
+                secuencias[:, a] = (filas <= sorteo[:, None]).sum(axis=1)
+            secuencias = np.unique(secuencias, axis=0)
+        validas = self.permitidas[secuencias[:, :-1], secuencias[:, 1:]].all(axis=1)
+        return secuencias[validas]
+
+    def escenarios_rendimiento(self, n_escenarios, anios, cv=CV_RENDIMIENTO_DEFAULT,
+                               correlacion=CORRELACION_CAMPANA_DEFAULT, historial=None, semilla=None):
+        """
+        Rendimientos simulados por escenario, campaña y cultivo.
+
+        Con historial se remuestrea una campaña histórica por cada campaña simulada
+        (HistorialRendimientos.bootstrap); si no, se usa un desvío normal con un
+        componente común a la campaña (clima) y otro propio de cada cultivo.
+
+        Retorna:
+        - Array (escenarios, anios, cultivos) en tn/ha
+        """
+        if historial is not None:
+            rindes = historial.bootstrap(self.cultivos, n_escenarios * anios, semilla=semilla)
+            rindes = np.where(np.isnan(rindes), self.rendimientos_base, rindes)
+            return rindes.reshape(n_escenarios, anios, len(self.cultivos))
+        rng = np.random.default_rng(semilla)
+        comun = rng.standard_normal((n_escenarios, anios, 1))
+        propio = rng.standard_normal((n_escenarios, anios, len(self.cultivos)))
+        desvio = np.sqrt(correlacion) * comun + np.sqrt(1 - correlacion) * propio
+        return self.rendimientos_base * np.maximum(0.0, 1 + cv * desvio)
+
+    def evaluar(self, secuencias, rendimientos, tasa_descuento=0.0, plan_inicial=None):
+        """
+        Margen directo acumulado y descontado de cada secuencia en cada escenario.
+
+        El margen de un cultivo se ajusta por la diferencia de rendimiento valuada al precio:
+        margen = margen_base + (rendimiento * factor_transición - rendimiento_base) * precio.
+
+        Parámetros:
+        - secuencias: Array (secuencias, anios) de índices de plan
+        - rendimientos: Array (escenarios, anios, cultivos) de rendimientos
+        - tasa_descuento: Tasa anual (0.08 = 8%)
+        - plan_inicial: Plan de la campaña previa a la primera (None: sin ajuste en la primera)
+
+        Retorna:
+        - Tupla (acumulado, descontado): arrays (escenarios, secuencias) en USD/ha
+        """
+        secuencias = np.asarray(secuencias)
+        n_sec, anios = secuencias.shape
+        n_esc = rendimientos.shape[0]
+        descuento = (1 + tasa_descuento) ** -np.arange(anios)
+        # Parte lineal en el rendimiento (R @ A) y parte fija (B) de cada secuencia
+        rend_plano = rendimientos.reshape(n_esc, -1)
+        acumulado = np.empty((n_esc, n_sec))
+        descontado = np.empty((n_esc, n_sec))
+        fijo_cultivo = self.margenes_base - self.rendimientos_base * self.precios
+        for inicio in range(0, n_sec, BLOQUE_SECUENCIAS):
+            bloque = secuencias[inicio:inicio + BLOQUE_SECUENCIAS]
+            anterior = np.empty_like(bloque)
+            anterior[:, 1:] = bloque[:, :-1]
+            anterior[:, 0] = self.planes.index(plan_inicial) if plan_inicial is not None else -1
+            factores = np.where((anterior >= 0)[..., None], self.factores[anterior, bloque], 1.0)
+            composicion = self.composicion[bloque]                    # (b, anios, cultivos)
+            lineal = composicion * factores * self.precios             # (b, anios, cultivos)
+            fijo = composicion @ fijo_cultivo + self.margen_plan[bloque]  # (b, anios)
+            fin = inicio + len(bloque)
+            acumulado[:, inicio:fin] = rend_plano @ lineal.reshape(len(bloque), -1).T + fijo.sum(axis=1)
+            descontado[:, inicio:fin] = (rend_plano @ (lineal * descuento[:, None]).reshape(len(bloque), -1).T
+                                         + fijo @ descuento)
+        return acumulado, descontado
+
+    def nombres(self, secuencias):
+        """Secuencias como texto ("Soja 1ra → Maíz → ...")."""
+        return [" → ".join(self.planes[p] for p in fila) for fila in np.asarray(secuencias)]
+
+
+def _evaluar_tramo(entradas, salidas, tramo, modelo, tasa_descuento, plan_inicial):
+    # Tarea de EjecutorParalelo: evalúa un tramo de secuencias y escribe sus columnas de la salida
+    inicio, fin = tramo
+    acumulado, descontado = modelo.evaluar(entradas["secuencias"][inicio:fin], entradas["rendimientos"],
+                                           tasa_descuento, plan_inicial)
+    salidas["acumulado"][:, inicio:fin] = acumulado
+    salidas["descontado"][:, inicio:fin] = descontado
+
+
+def evaluar_en_paralelo(ejecutor, modelo, secuencias, rendimientos, tasa_descuento=0.0, plan_inicial=None):
+    """
+    Igual que ModeloRotaciones.evaluar, repartiendo las secuencias entre los procesos del ejecutor.
+
+    Secuencias y rendimientos se comparten en memoria; cada proceso escribe su tramo de columnas.
+    """
+    forma = (rendimientos.shape[0], len(secuencias))
+    salidas, _ = ejecutor.mapear(
+        _evaluar_tramo, particionar(len(secuencias), ejecutor.procesos * 4),
+        entradas={"secuencias": secuencias, "rendimientos": rendimientos},
+        salidas={"acumulado": (forma, np.float64), "descontado": (forma, np.float64)},
+        modelo=modelo, tasa_descuento=tasa_descuento, plan_inicial=plan_inicial
+    )
+    return salidas["acumulado"], salidas["descontado"]
+
+
+def simular_rotaciones(modelo, rendimientos, anios=ANIOS_DEFAULT, tasa_descuento=0.0, max_secuencias=MAX_SECUENCIAS_DEFAULT,
+                       plan_inicial=None, mejores=20, semilla=None, ejecutor=None):
+    """
+    Evalúa las secuencias candidatas y resume las mejores por margen descontado medio.
+
+    Parámetros:
+    - modelo: ModeloRotaciones
+    - rendimientos: Array (escenarios, anios, cultivos) de rendimientos simulados
+    - anios: Campañas de cada secuencia
+    - tasa_descuento: Tasa anual de descuento
+    - max_secuencias: Máximo de secuencias candidatas
+    - plan_inicial: Plan de la campaña anterior a la simulación
+    - mejores: Cantidad de secuencias a informar
+    - semilla: Semilla para el muestreo de secuencias
+    - ejecutor: EjecutorParalelo para repartir las secuencias entre procesos (opcional)
+
+    Retorna:
+    - DataFrame con margen acumulado y descontado (media, P10) y probabilidad de pérdida por secuencia
+    """
+    secuencias = modelo.secuencias(anios, max_secuencias, semilla)
+    if ejecutor is not None:
+        acumulado, descontado = evaluar_en_paralelo(ejecutor, modelo, secuencias, rendimientos, tasa_descuento, plan_inicial)
+    else:
+        acumulado, descontado = modelo.evaluar(secuencias, rendimientos, tasa_descuento, plan_inicial)
+    medio = descontado.mean(axis=0)
+    orden = np.argsort(-medio, kind="stable")[:mejores]
+    return pd.DataFrame({
+        "Secuencia": modelo.nombres(secuencias[orden]),
+        "Margen Acumulado Medio (USD/ha)": acumulado.mean(axis=0)[orden],
+        "Margen Descontado Medio (USD/ha)": medio[orden],
+        "Margen Descontado P10 (USD/ha)": np.percentile(descontado[:, orden], 10, axis=0),
+        "Prob. Pérdida Acumulada (%)": (acumulado[:, orden] < 0).mean(axis=0) * 100,
+    })
@@ -0,0 +1,475 @@
+import json
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from actualizador_precios import obtener_actualizador
+from arrendamientos import completar_contratos, costo_contrato, factor_ocupacion, cargar_contratos, \
+    CONTRATO_DEFAULT as CONTRATO_ARRENDAMIENTO_DEFAULT
+from calculos import calcular_costo_flete_vectorizado, RECARGOS_FLETE_CULTIVO
+from cartera import KM_DEFAULT, PROPORCION_ARRENDADA_DEFAULT, CONTRATO_DEFAULT, COSECHA_DEFAULT
+from datos_base import tabla_comparativa, cargar_tabla_fletes, TIPO_CAMBIO_DEFAULT
+from equilibrio import margenes_lotes
+
+# Servicio HTTP/JSON local con los márgenes por lote y los costos de flete, para otras
+# herramientas (ERP, planificación de logística). Las tablas de cultivos, fletes y contratos
+# se cargan una sola vez al iniciar, y cada lote se completa con sus valores por defecto y los
+# términos de su contrato al validar la solicitud. Las solicitudes que llegan al mismo tiempo
+# se juntan en tandas: cada tanda se calcula con una sola llamada vectorizada (margenes_lotes,
+# la misma lógica de la cartera de lotes) y cada solicitud recibe su tramo del resultado.
+#
+#   python servicio.py --puerto 8780
+#   curl -d '{"lotes": [{"cultivo": "Maíz", "superficie": 120, "km": 250}]}' http://127.0.0.1:8780/margenes
+#   curl -d '{"km": [50, 300], "cultivo": "Girasol"}' http://127.0.0.1:8780/fletes
+#   curl http://127.0.0.1:8780/metricas
+#
+# Con --prueba se levanta el servicio en un puerto libre, se envían solicitudes concurrentes
+# y se informan el rendimiento y la latencia.
+
+PUERTO_DEFAULT = 8780
+MAX_FILAS_TANDA = 20000         # Filas (lotes o distancias) máximas por tanda
+ESPERA_TANDA = 0.001            # Segundos que se esperan más solicitudes después de la primera
+MAX_FILAS_SOLICITUD = 10000     # Filas máximas por solicitud
+MAX_BYTES_SOLICITUD = 4 * 1024 * 1024
+LATENCIAS_GUARDADAS = 4096      # Latencias recientes para los percentiles
+
+# Campos numéricos opcionales de cada lote (los faltantes toman los valores por defecto de la cartera)
+CAMPOS_NUMERICOS = ["superficie", "rendimiento", "precio", "km", "proporcion_arrendada", "costos_directos", "cosecha"]
+COLUMNAS_MARGENES = ["lote", "cultivo", "superficie", "ingreso_bruto", "costos_directos", "comercializacion",
+                     "estructura", "cosecha", "flete", "arrendamiento", "margen_bruto", "margen_directo",
+                     "margen_directo_ha"]
+
+
+class AgrupadorSolicitudes:
+    """
+    Junta en tandas las solicitudes que llegan al mismo tiempo y las calcula con una sola llamada.
+
+    Un hilo toma la primera solicitud de la cola, espera a lo sumo `espera` segundos por más
+    (sin pasar de max_filas) y calcula la tanda completa. Con carga, mientras se calcula una
+    tanda se acumulan las siguientes, así que las tandas crecen solas.
+
+    Parámetros:
+    - funcion: funcion(df) -> DataFrame con una fila de resultado por fila de entrada, en el mismo orden
+    - max_filas: Filas máximas por tanda
+    - espera: Segundos de espera por más solicitudes después de la primera
+    - nombre: Nombre del hilo
+    """
+
+    def __init__(self, funcion, max_filas=MAX_FILAS_TANDA, espera=ESPERA_TANDA, nombre="agrupador"):
+        self.funcion = funcion
+        self.max_filas = max_filas
+        self.espera = espera
+        self.solicitudes = 0
+        self.filas = 0
+        self.tandas = 0
+        self.errores = 0
+        self._latencias = deque(maxlen=LATENCIAS_GUARDADAS)
+        self._lock = threading.Lock()
+        self._cola = queue.Queue()
+        self._inicio = time.monotonic()
+        self._hilo = threading.Thread(target=self._correr, name=nombre, daemon=True)
+        self._hilo.start()
+
+    def enviar(self, filas):
+        """
+        Encola una solicitud.
+
+        Parámetros:
+        - filas: Lista de diccionarios (una fila de entrada cada uno)
+
+        Retorna:
+        - Future con el DataFrame de resultados de esas filas
+        """
+        futuro = Future()
+        self._cola.put((filas, futuro, time.perf_counter()))
+        return futuro
+
+    def calcular(self, filas, timeout=None):
+        """Encola una solicitud y espera su resultado."""
+        return self.enviar(filas).result(timeout)
+
+    def _correr(self):
+        while True:
+            primera = self._cola.get()
+            if primera is None:
+                return
+            tanda = [primera]
+            filas = len(primera[0])
+            limite = time.monotonic() + self.espera
+            detener = False
+            while filas < self.max_filas:
+                try:
+                    siguiente = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    detener = True
+                    break
+                tanda.append(siguiente)
+                filas += len(siguiente[0])
+            self._procesar(tanda)
+            if detener:
+                return
+
+    def _procesar(self, tanda):
+        try:
+            resultado = self.funcion(pd.DataFrame.from_records([fila for filas, _, _ in tanda for fila in filas]))
+        except Exception as e:
+            with self._lock:
+                self.errores += len(tanda)
+            for _, futuro, _ in tanda:
+                futuro.set_exception(e)
+            return
+        fin = time.perf_counter()
+        with self._lock:
+            self.tandas += 1
+            self.solicitudes += len(tanda)
+            self.filas += len(resultado)
+            self._latencias.extend(fin - enviado for _, _, enviado in tanda)
+        inicio = 0
+        for filas, futuro, _ in tanda:
+            futuro.set_result(resultado.iloc[inicio:inicio + len(filas)].reset_index(drop=True))
+            inicio += len(filas)
+
+    def metricas(self):
+        """Solicitudes, filas y tandas procesadas, rendimiento y percentiles de latencia (ms)."""
+        with self._lock:
+            latencias = np.array(self._latencias) * 1000
+            segundos = time.monotonic() - self._inicio
+            return {
+                "solicitudes": self.solicitudes,
+                "filas": self.filas,
+                "tandas": self.tandas,
+                "errores": self.errores,
+                "solicitudes_por_tanda": self.solicitudes / self.tandas if self.tandas else 0.0,
+                "filas_por_segundo": self.filas / segundos if segundos > 0 else 0.0,
+                "latencia_ms": {f"p{p}": float(np.percentile(latencias, p)) if len(latencias) else None
+                                for p in (50, 95, 99)},
+            }
+
+    def detener(self, timeout=5.0):
+        """Termina el hilo después de calcular lo que quedó en la cola."""
+        self._cola.put(None)
+        self._hilo.join(timeout)
+
+
+def _numero(valor, campo):
+    if valor is None:
+        return np.nan
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+        raise ValueError(f"El campo {campo} debe ser un número")
+    return float(valor)
+
+
+def _a_json(df):
+    # Registros JSON (los valores no finitos se informan como null)
+    return [{clave: (valor if not isinstance(valor, float) or math.isfinite(valor) else None)
+             for clave, valor in fila.items()} for fila in df.to_dict("records")]
+
+
+class ServicioMargenes:
+    """
+    Cálculo de márgenes y fletes para el servicio HTTP, con las tablas cargadas una sola vez.
+
+    Parámetros:
+    - df_comparativo: Tabla comparativa de cultivos (por defecto la de la aplicación)
+    - df_fletes: Tabla de fletes con columnas KM y Tarifa_$/TN (por defecto la de la aplicación)
+    - df_contratos: Tabla de contratos (por defecto solo el contrato por defecto)
+    - espera: Segundos de espera de cada tanda por más solicitudes
+    """
+
+    def __init__(self, df_comparativo=None, df_fletes=None, df_contratos=None, espera=ESPERA_TANDA):
+        self.df_comparativo = tabla_comparativa() if df_comparativo is None else df_comparativo
+        df_fletes = cargar_tabla_fletes() if df_fletes is None else df_fletes
+        self.km_tabla = df_fletes["KM"].to_numpy(dtype=float)
+        self.tarifa_tabla = df_fletes["Tarifa_$/TN"].to_numpy(dtype=float)
+        df_contratos = completar_contratos(pd.DataFrame([CONTRATO_ARRENDAMIENTO_DEFAULT]) if df_contratos is None else df_contratos)
+        self.cultivos = list(self.df_comparativo.columns[1:])
+        # Valores por defecto de cada cultivo y componentes de cada contrato, resueltos una sola vez
+        variables = self.df_comparativo.set_index("Variable")
+        self._por_cultivo = {cultivo: {"rendimiento": float(variables.loc["Rendimiento tn", cultivo]),
+                                       "precio": float(variables.loc["USD/tn", cultivo]),
+                                       "costos_directos": float(variables.loc["Total costos directos / ha", cultivo])}
+                             for cultivo in self.cultivos}
+        self._contratos = {CONTRATO_ARRENDAMIENTO_DEFAULT["contrato"]: CONTRATO_ARRENDAMIENTO_DEFAULT}
+        self._contratos.update({str(c["contrato"]): c for c in df_contratos.to_dict("records")})
+        self.contratos = set(self._contratos)
+        self.precio_soja = float(self.df_comparativo.loc[self.df_comparativo["Variable"] == "USD/tn", "Soja 1ra"].iloc[0])
+        self.actualizador = obtener_actualizador()
+        self.margenes = AgrupadorSolicitudes(self._margenes_tanda, espera=espera, nombre="tandas-margenes")
+        self.fletes = AgrupadorSolicitudes(self._fletes_tanda, espera=espera, nombre="tandas-fletes")
+
+    def tipo_cambio(self, solicitud):
+        if solicitud.get("tipo_cambio") is not None:
+            tipo_cambio = _numero(solicitud["tipo_cambio"], "tipo_cambio")
+        else:
+            tipo_cambio = self.actualizador.instantanea.tipo_cambio(TIPO_CAMBIO_DEFAULT) if self.actualizador \
+                else TIPO_CAMBIO_DEFAULT
+        if tipo_cambio <= 0:
+            raise ValueError("El tipo de cambio debe ser positivo")
+        return tipo_cambio
+
+    def filas_margenes(self, solicitud):
+        """
+        Valida una solicitud de márgenes y arma sus filas.
+
+        Parámetros:
+        - solicitud: {"lotes": [{"cultivo": ..., "superficie": ..., ...}], "tipo_cambio": ..., "precio_soja": ...}
+
+        Retorna:
+        - Lista de filas para el agrupador de márgenes
+        """
+        lotes = solicitud.get("lotes")
+        if not isinstance(lotes, list) or not lotes:
+            raise ValueError("La solicitud debe tener una lista 'lotes' no vacía")
+        if len(lotes) > MAX_FILAS_SOLICITUD:
+            raise ValueError(f"A lo sumo {MAX_FILAS_SOLICITUD} lotes por solicitud")
+        tipo_cambio = self.tipo_cambio(solicitud)
+        precio_soja = self.precio_soja if solicitud.get("precio_soja") is None else _numero(solicitud["precio_soja"], "precio_soja")
+        filas = []
+        for i, lote in enumerate(lotes, start=1):
+            if not isinstance(lote, dict):
+                raise ValueError(f"El lote {i} debe ser un objeto")
+            if lote.get("cultivo") not in self.cultivos:
+                raise ValueError(f"Cultivo desconocido en el lote {i}: {lote.get('cultivo')}")
+            fila = {campo: _numero(lote.get(campo), campo) for campo in CAMPOS_NUMERICOS}
+            por_defecto = {"superficie": 1.0, "km": float(KM_DEFAULT), "proporcion_arrendada": PROPORCION_ARRENDADA_DEFAULT,
+                           "cosecha": float(COSECHA_DEFAULT), **self._por_cultivo[lote["cultivo"]]}
+            for campo, valor in por_defecto.items():
+                if np.isnan(fila[campo]):
+                    fila[campo] = valor
+            if not 0 <= fila["proporcion_arrendada"] <= 1:
+                raise ValueError(f"La proporción arrendada del lote {i} debe estar entre 0 y 1")
+            contrato = str(lote.get("contrato", CONTRATO_DEFAULT))
+            if contrato not in self._contratos and contrato != "":
+                raise ValueError(f"Contrato no definido en el lote {i}: {contrato}")
+            # Los lotes propios (sin contrato o sin superficie arrendada) no pagan arrendamiento
+            terminos = self._contratos[contrato] if contrato and fila["proporcion_arrendada"] > 0 else {}
+            fila.update(lote=str(lote.get("lote", i)), zona=str(lote.get("zona", "General")), cultivo=lote["cultivo"],
+                        tipo_cambio=tipo_cambio, precio_soja=precio_soja,
+                        **{componente: float(terminos.get(componente, 0.0))
+                           for componente in ("usd_ha", "qq_soja_ha", "porcentaje_cosecha")})
+            filas.append(fila)
+        return filas
+
+    def _margenes_tanda(self, df):
+        # Arrendamiento en una parte fija y una fracción del ingreso (como MotorArrendamientos.componentes)
+        ajuste = factor_ocupacion(df["cultivo"].tolist()) * df["proporcion_arrendada"].to_numpy(dtype=float)
+        arrendamiento_fijo = costo_contrato(df["usd_ha"].to_numpy(dtype=float), df["qq_soja_ha"].to_numpy(dtype=float),
+                                            0.0, df["precio_soja"].to_numpy(dtype=float)) * ajuste
+        fraccion_arrendamiento = df["porcentaje_cosecha"].to_numpy(dtype=float) / 100 * ajuste
+        resultado = margenes_lotes(df, self.df_comparativo, self.km_tabla, self.tarifa_tabla,
+                                   df["tipo_cambio"].to_numpy(dtype=float), arrendamiento_fijo, fraccion_arrendamiento,
+                                   df["costos_directos"].to_numpy(dtype=float), df["cosecha"].to_numpy(dtype=float))
+        resultado["margen_directo_ha"] = resultado["margen_directo"] / resultado["superficie"].where(resultado["superficie"] > 0)
+        return resultado[COLUMNAS_MARGENES]
+
+    def filas_fletes(self, solicitud):
+        """
+        Valida una solicitud de fletes y arma sus filas.
+
+        Parámetros:
+        - solicitud: {"km": número o lista, "cultivo": texto o lista (recargo por cultivo), "tipo_cambio": ...}
+
+        Retorna:
+        - Lista de filas para el agrupador de fletes
+        """
+        distancias = solicitud.get("km")
+        distancias = distancias if isinstance(distancias, list) else [distancias]
+        if not distancias or len(distancias) > MAX_FILAS_SOLICITUD:
+            raise ValueError(f"'km' debe tener entre 1 y {MAX_FILAS_SOLICITUD} distancias")
+        cultivos = solicitud.get("cultivo")
+        cultivos = cultivos if isinstance(cultivos, list) else [cultivos] * len(distancias)
+        if len(cultivos) != len(distancias):
+            raise ValueError("'cultivo' debe tener un valor por distancia")
+        tipo_cambio = self.tipo_cambio(solicitud)
+        filas = []
+        for km, cultivo in zip(distancias, cultivos):
+            km = _numero(km, "km")
+            if np.isnan(km) or km < 0:
+                raise ValueError("Las distancias deben ser números no negativos")
+            filas.append({"km": km, "recargo": float(RECARGOS_FLETE_CULTIVO.get(cultivo, 0)), "tipo_cambio": tipo_cambio})
+        return filas
+
+    def _fletes_tanda(self, df):
+        flete = np.atleast_1d(calcular_costo_flete_vectorizado(df["km"].to_numpy(dtype=float), self.km_tabla,
+                                                               self.tarifa_tabla, df["recargo"].to_numpy(dtype=float)))
+        return pd.DataFrame({"km": df["km"], "recargo": df["recargo"], "flete_ars_tn": flete,
+                             "flete_usd_tn": flete / df["tipo_cambio"].to_numpy(dtype=float)})
+
+    def metricas(self):
+        return {"margenes": self.margenes.metricas(), "fletes": self.fletes.metricas()}
+
+    def detener(self):
+        self.margenes.detener()
+        self.fletes.detener()
+
+
+def crear_servidor(servicio, puerto=PUERTO_DEFAULT, host="127.0.0.1"):
+    """
+    Servidor HTTP del servicio (un hilo por conexión; las tandas se calculan en los agrupadores).
+
+    Rutas:
+    - POST /margenes: márgenes por lote (USD totales y margen directo por ha)
+    - POST /fletes: costo de flete en $/tn y USD/tn
+    - GET /metricas: rendimiento y latencia de cada ruta
+    - GET /salud: cultivos y contratos disponibles
+
+    Retorna:
+    - ThreadingHTTPServer (puerto 0 elige uno libre: ver server_address)
+    """
+
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Permite conexiones persistentes
+        # TCP_NODELAY: sin él, cada respuesta espera el ACK demorado del cliente (unos 40 ms)
+        disable_nagle_algorithm = True
+
+        def _responder(self, estado, datos):
+            cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            if self.path == "/metricas":
+                self._responder(200, servicio.metricas())
+            elif self.path == "/salud":
+                self._responder(200, {"cultivos": servicio.cultivos, "contratos": sorted(servicio.contratos)})
+            else:
+                self._responder(404, {"error": f"Ruta inexistente: {self.path}"})
+
+        def do_POST(self):
+            rutas = {"/margenes": (servicio.filas_margenes, servicio.margenes, "lotes"),
+                     "/fletes": (servicio.filas_fletes, servicio.fletes, "fletes")}
+            try:
+                longitud = int(self.headers.get("Content-Length") or 0)
+                if longitud < 0:
+                    raise ValueError
+            except ValueError:
+                # Sin una longitud válida no se puede leer el cuerpo: se responde y se cierra la conexión
+                self.close_connection = True
+                self._responder(400, {"error": "Encabezado Content-Length inválido"})
+                return
+            if self.path not in rutas:
+                self.rfile.read(longitud)
+                self._responder(404, {"error": f"Ruta inexistente: {self.path}"})
+                return
+            if longitud > MAX_BYTES_SOLICITUD:
+                self.close_connection = True
+                self._responder(413, {"error": "Solicitud demasiado grande"})
+                return
+            armar_filas, agrupador, clave = rutas[self.path]
+            try:
+                solicitud = json.loads(self.rfile.read(longitud) or b"{}")
+                if not isinstance(solicitud, dict):
+                    raise ValueError("El cuerpo debe ser un objeto JSON")
+                filas = armar_filas(solicitud)
+            except ValueError as e:
+                self._responder(400, {"error": str(e)})
+                return
+            try:
+                self._responder(200, {clave: _a_json(agrupador.calcular(filas))})
+            except Exception as e:
+                self._responder(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def probar_carga(url, solicitudes=2000, concurrencia=16, lotes_por_solicitud=1):
+    """
+    Envía solicitudes de márgenes concurrentes (conexiones persistentes) y mide el rendimiento.
+
+    Parámetros:
+    - url: URL base del servicio (por ejemplo http://127.0.0.1:8780)
+    - solicitudes: Cantidad total de solicitudes
+    - concurrencia: Clientes simultáneos
+    - lotes_por_solicitud: Lotes en cada solicitud
+
+    Retorna:
+    - Diccionario con solicitudes por segundo y percentiles de latencia del lado del cliente (ms)
+    """
+    import http.client
+    from urllib.parse import urlparse
+
+    destino = urlparse(url)
+    cultivos = list(tabla_comparativa().columns[1:])
+    latencias = []
+    lock = threading.Lock()
+
+    def cliente(indice):
+        conexion = http.client.HTTPConnection(destino.hostname, destino.port, timeout=30)
+        propias = []
+        for n in range(indice, solicitudes, concurrencia):
+            cuerpo = json.dumps({"lotes": [{"lote": f"{n}-{k}", "cultivo": cultivos[(n + k) % len(cultivos)],
+                                            "superficie": 100 + n % 50, "km": 20 + (n * 7 + k) % 500}
+                                           for k in range(lotes_por_solicitud)]}).encode("utf-8")
+            inicio = time.perf_counter()
+            # Cuerpo en bytes: encabezados y cuerpo salen en un solo envío
+            conexion.request("POST", "/margenes", cuerpo, {"Content-Type": "application/json"})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status != 200:
+                raise RuntimeError(f"Respuesta {respuesta.status} del servicio")
+            propias.append(time.perf_counter() - inicio)
+        conexion.close()
+        with lock:
+            latencias.extend(propias)
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    latencias_ms = np.array(latencias) * 1000
+    return {"solicitudes": len(latencias), "segundos": segundos, "solicitudes_por_segundo": len(latencias) / segundos,
+            **{f"latencia_p{p}_ms": float(np.percentile(latencias_ms, p)) for p in (50, 95, 99)}}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de márgenes y fletes.")
+    parser.add_argument("--puerto", type=int, default=PUERTO_DEFAULT)
+    parser.add_argument("--contratos", help="CSV de contratos de arrendamiento")
+    parser.add_argument("--espera-ms", type=float, default=ESPERA_TANDA * 1000,
+                        help="Espera de cada tanda por más solicitudes (ms)")
+    parser.add_argument("--prueba", action="store_true", help="Levanta el servicio en un puerto libre y mide la carga")
+    parser.add_argument("--solicitudes", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    argumentos = parser.parse_args()
+
+    servicio = ServicioMargenes(df_contratos=cargar_contratos(argumentos.contratos) if argumentos.contratos else None,
+                                espera=argumentos.espera_ms / 1000)
+    servidor = crear_servidor(servicio, 0 if argumentos.prueba else argumentos.puerto)
+    url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    if argumentos.prueba:
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        cliente = probar_carga(url, argumentos.solicitudes, argumentos.concurrencia)
+        print(json.dumps({"cliente": cliente, "servicio": servicio.metricas()}, indent=2, ensure_ascii=False))
+        servidor.shutdown()
+        servicio.detener()
+    else:
+        print(f"Servicio de márgenes en {url} (POST /margenes, POST /fletes, GET /metricas)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            servicio.detener()
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+# Tablas de tarifas genéricas (fletes, cosecha, labores de contratistas).
+# Una tabla se define en formato largo y se consulta en forma vectorizada:
+# - columnas clave: coincidencia exacta (por ejemplo cultivo o labor)
+# - columna de banda: escalones; se usa la banda con mayor "desde" que no supere el valor
+# - columna de interpolación: lineal por tramos, con el valor del extremo fuera de rango
+
+
+def interpolar_tramos(x, xs, ys):
+    """
+    Interpolación lineal por tramos; fuera del rango de la tabla devuelve el valor del extremo.
+
+    Es la regla común a la tabla de fletes FADEEAC y a las tarifas de contratistas.
+
+    Parámetros:
+    - x: Valor(es) a consultar
+    - xs: Abscisas de la tabla (ordenadas, sin repetir)
+    - ys: Valores de la tabla
+
+    Retorna:
+    - Valor(es) interpolado(s)
+    """
+    return np.interp(x, xs, ys)
+
+
+class TablaTarifas:
+    """
+    Tabla de tarifas con claves exactas, bandas escalonadas e interpolación lineal.
+
+    Al construirse agrupa las filas en curvas (una por combinación de clave y banda);
+    cada consulta resuelve la curva de todos los casos a la vez y luego interpola por curva.
+    """
+
+    def __init__(self, df, columna_tarifa, columnas_clave=(), columna_banda=None, columna_interpolacion=None):
+        self.columna_tarifa = columna_tarifa
+        self.columnas_clave = list(columnas_clave)
+        self.columna_banda = columna_banda
+        self.columna_interpolacion = columna_interpolacion
+
+        df = df.copy()
+        if not self.columnas_clave:
+            df["_clave"] = ""
+            self.columnas_clave_internas = ["_clave"]
+        else:
+            self.columnas_clave_internas = self.columnas_clave
+        if columna_banda is None:
+            df["_banda"] = 0.0
+            columna_banda = "_banda"
+        if columna_interpolacion is None:
+            df["_x"] = 0.0
+            columna_interpolacion = "_x"
+        df = df.sort_values(self.columnas_clave_internas + [columna_banda, columna_interpolacion])
+
+        if df.duplicated(self.columnas_clave_internas + [columna_banda, columna_interpolacion]).any():
+            raise ValueError("La tabla de tarifas tiene filas repetidas para la misma clave, banda y valor")
+
+        # Índice de claves: cada clave tiene sus bandas ordenadas y cada banda una curva
+        self._claves = {}
+        self._curvas = []
+        for clave, grupo_clave in df.groupby(self.columnas_clave_internas, sort=False):
+            clave = clave if isinstance(clave, tuple) else (clave,)
+            bandas = []
+            for banda, grupo in grupo_clave.groupby(columna_banda, sort=True):
+                bandas.append(float(banda))
+                self._curvas.append((grupo[columna_interpolacion].to_numpy(dtype=float),
+                                     grupo[columna_tarifa].to_numpy(dtype=float)))
+            primera_curva = len(self._curvas) - len(bandas)
+            self._claves[clave] = (np.array(bandas), primera_curva)
+
+    @property
+    def claves(self):
+        return list(self._claves)
+
+    def _curva_de(self, claves, bandas):
+        # Resuelve el índice de curva de cada consulta (claves iguales se resuelven juntas)
+        n = len(bandas)
+        curva = np.full(n, -1)
+        claves_consulta = pd.MultiIndex.from_arrays(claves) if claves else pd.MultiIndex.from_arrays([np.full(n, "")])
+        codigos, unicas = pd.factorize(claves_consulta)
+        unicas = [clave if isinstance(clave, tuple) else (clave,) for clave in unicas]
+        faltantes = [" / ".join(str(c) for c in clave) for clave in unicas if clave not in self._claves]
+        if faltantes:
+            raise ValueError("Claves sin tarifa: " + ", ".join(faltantes))
+        for codigo, clave in enumerate(unicas):
+            limites, primera_curva = self._claves[clave]
+            mascara = codigos == codigo
+            # Banda con mayor "desde" que no supere el valor (por debajo de la primera se usa la primera)
+            posicion = np.searchsorted(limites, bandas[mascara], side="right") - 1
+            curva[mascara] = primera_curva + np.clip(posicion, 0, len(limites) - 1)
+        return curva
+
+    def consultar(self, claves=None, bandas=None, x=None):
+        """
+        Tarifa para muchos casos a la vez.
+
+        Parámetros:
+        - claves: Lista de arrays, uno por columna clave (en el orden de columnas_clave)
+        - bandas: Valores de la variable de banda (array)
+        - x: Valores de la variable de interpolación (array)
+
+        Retorna:
+        - Array de tarifas
+        """
+        claves = [np.asarray(c) for c in (claves or [])]
+        largos = [len(c) for c in claves] + [np.size(v) for v in (bandas, x) if v is not None and np.ndim(v) > 0]
+        n = max(largos) if largos else 1
+        claves = [np.broadcast_to(c, n) for c in claves]
+        bandas = np.broadcast_to(np.asarray(0.0 if bandas is None else bandas, dtype=float), n)
+        x = np.broadcast_to(np.asarray(0.0 if x is None else x, dtype=float), n)
+
+        curva = self._curva_de(claves, bandas)
+        tarifa = np.empty(n)
+        orden = np.argsort(curva, kind="stable")
+        cortes = np.flatnonzero(np.diff(curva[orden])) + 1
+        for grupo in np.split(orden, cortes):
+            if len(grupo) == 0:
+                continue
+            xs, ys = self._curvas[curva[grupo[0]]]
+            tarifa[grupo] = interpolar_tramos(x[grupo], xs, ys)
+        return tarifa
+
+
+# Tarifas de cosecha de ejemplo (USD/ha) por cultivo, banda de rendimiento (tn/ha desde)
+# y distancia de traslado del equipo (km)
+_BASE_COSECHA = {"Soja 1ra": 75, "Soja 2da": 70, "Maíz": 95, "Maíz 2da": 90, "Maíz Tardío": 95,
+                 "Trigo": 70, "Girasol": 80}
+_BANDAS_COSECHA = {"Soja 1ra": [0, 2.5, 3.5], "Soja 2da": [0, 2.0, 3.0], "Maíz": [0, 6, 9],
+                   "Maíz 2da": [0, 5, 8], "Maíz Tardío": [0, 5, 8], "Trigo": [0, 3, 4.5],
+                   "Girasol": [0, 2, 3]}
+_RECARGO_BANDA_COSECHA = [1.0, 1.1, 1.2]
+_TRASLADO_COSECHA = {0: 0, 50: 5, 200: 15}  # km -> USD/ha adicionales
+KM_TRASLADO_DEFAULT = 50  # Traslado de contratistas por defecto (km)
+
+TARIFAS_COSECHA_DEFAULT = pd.DataFrame(
+    [(cultivo, banda, km, round(base * recargo + traslado, 2))
+     for cultivo, base in _BASE_COSECHA.items()
+     for banda, recargo in zip(_BANDAS_COSECHA[cultivo], _RECARGO_BANDA_COSECHA)
+     for km, traslado in _TRASLADO_COSECHA.items()],
+    columns=["cultivo", "rinde_desde", "km", "tarifa_usd_ha"]
+)
+
+# Tarifas de labores de ejemplo (USD/ha por pasada) por labor y distancia de traslado (km)
+TARIFAS_LABORES_DEFAULT = pd.DataFrame([
+    ("Siembra directa", 0, 35.0), ("Siembra directa", 50, 38.0), ("Siembra directa", 200, 45.0),
+    ("Pulverización terrestre", 0, 7.0), ("Pulverización terrestre", 50, 8.0), ("Pulverización terrestre", 200, 10.0),
+    ("Fertilización", 0, 6.0), ("Fertilización", 50, 7.0), ("Fertilización", 200, 9.0),
+], columns=["labor", "km", "tarifa_usd_ha"])
+
+
+def tabla_cosecha(df=TARIFAS_COSECHA_DEFAULT):
+    """Tabla de tarifas de cosecha por cultivo, banda de rendimiento y distancia."""
+    return TablaTarifas(df, "tarifa_usd_ha", ["cultivo"], "rinde_desde", "km")
+
+
+def tabla_labores(df=TARIFAS_LABORES_DEFAULT):
+    """Tabla de tarifas de labores por tipo de labor y distancia."""
+    return TablaTarifas(df, "tarifa_usd_ha", ["labor"], columna_interpolacion="km")
+
+
+def costo_labores(tabla, pasadas, cultivos, km):
+    """
+    Costo de labores por hectárea de cada lote: suma de pasadas x tarifa de cada labor.
+
+    Parámetros:
+    - tabla: TablaTarifas de labores
+    - pasadas: DataFrame cultivos x labores con la cantidad de pasadas por hectárea
+    - cultivos: Cultivo de cada lote
+    - km: Distancia de traslado del contratista para cada lote (escalar o array)
+
+    Retorna:
+    - Array con el costo de labores en USD/ha por lote
+    """
+    cultivos = np.asarray(cultivos)
+    km = np.broadcast_to(np.asarray(km, dtype=float), len(cultivos))
+    pasadas_lote = pasadas.reindex(index=cultivos, fill_value=0.0)
+    total = np.zeros(len(cultivos))
+    for labor in pasadas.columns:
+        cantidad = pasadas_lote[labor].to_numpy(dtype=float)
+        if cantidad.any():
+            total += cantidad * tabla.consultar([np.full(len(cultivos), labor)], x=km)
+    return total
@@ -0,0 +1,416 @@
+import bisect
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from cache_calculos import CacheCalculos
+from calculos import calcular_costo_flete_vectorizado, calcular_margenes, calcular_margen_directo, \
+    calcular_elasticidades
+from datos_base import cargar_tabla_fletes
+from paralelo import EjecutorParalelo, particionar
+
+# Verificación diferencial de los motores de cálculo. Las fórmulas escalares de la aplicación
+# (la interpolación de fletes de la Calculadora, los márgenes de la Calculadora, calcular_margen_directo y las
+# elasticidades del análisis de sensibilidad) quedan copiadas acá tal como están hoy, como
+# referencia fija, y cada motor optimizado (vectorizado, con caché, en paralelo, el servicio
+# por tandas) se compara contra ellas sobre muchas entradas al azar. Una fracción de las
+# entradas son casos borde: distancias en los extremos de la tabla de fletes o fuera de ella,
+# costos nulos (retorno sobre costos sin denominador) y márgenes base exactamente cero
+# (elasticidades NaN). Se informa el desvío máximo y la velocidad de cada motor junto a la de
+# la referencia; si algún motor se aparta más que la tolerancia, termina con código 1.
+#
+#   python verificar_motores.py --casos 1000000 --semilla 7
+
+CASOS_DEFAULT = 1_000_000
+MUESTRA_DEFAULT = 20_000        # Casos para los motores que se llaman fila por fila (caché, servicio)
+PROPORCION_BORDES = 0.1         # Fracción de casos borde entre las entradas al azar
+
+# Desvío admitido: |motor - referencia| <= absoluta + relativa * |referencia|; los NaN e
+# infinitos de la referencia deben coincidir exactamente
+TOLERANCIA_RELATIVA = 1e-9
+TOLERANCIA_ABSOLUTA = 1e-9
+
+
+# --- Referencias escalares (no modificar: son el comportamiento a preservar) ---
+
+def referencia_costo_flete(km, recargo, km_tabla, tarifa_tabla):
+    # Regla original de la interpolación de fletes de la Calculadora, sobre listas ordenadas
+    if km <= km_tabla[0]:
+        costo = tarifa_tabla[0]
+    elif km >= km_tabla[-1]:
+        costo = tarifa_tabla[-1]
+    else:
+        # Punto de la tabla más cercano por debajo y por encima
+        i_inferior = bisect.bisect_right(km_tabla, km) - 1
+        i_superior = bisect.bisect_left(km_tabla, km)
+        valor_inferior, valor_superior = km_tabla[i_inferior], km_tabla[i_superior]
+        if valor_superior == valor_inferior:
+            costo = tarifa_tabla[i_superior]
+        else:
+            costo_inferior, costo_superior = tarifa_tabla[i_inferior], tarifa_tabla[i_superior]
+            costo = costo_inferior + (km - valor_inferior) * (costo_superior - costo_inferior) / (valor_superior - valor_inferior)
+    if recargo > 0:
+        costo = costo * (1 + recargo/100)
+    return costo
+
+
+def referencia_margenes(rendimiento, precio, costos_directos, comercializacion, estructura, cosecha,
+                        flete_usd_tn, arrendamiento_ha):
+    # Márgenes por hectárea de la Calculadora
+    ingreso_bruto_ha = rendimiento * precio
+    costo_flete_ha = rendimiento * flete_usd_tn
+    margen_bruto_ha = ingreso_bruto_ha - costos_directos - comercializacion - estructura - cosecha - costo_flete_ha
+    margen_directo_ha = margen_bruto_ha - arrendamiento_ha
+    costos_totales_ha = costos_directos + comercializacion + estructura + cosecha + costo_flete_ha + arrendamiento_ha
+    retorno_costos = (margen_directo_ha / costos_totales_ha) * 100 if costos_totales_ha > 0 else 0
+    return ingreso_bruto_ha, costo_flete_ha, margen_bruto_ha, margen_directo_ha, costos_totales_ha, retorno_costos
+
+
+def referencia_margen_directo(rendimiento, precio, costos_directos, flete, otros_costos=140, arrendamiento=160*0.3):
+    costo_flete_ha = rendimiento * flete
+    ingreso_bruto = rendimiento * precio
+    margen_bruto = ingreso_bruto - costos_directos - otros_costos - costo_flete_ha
+    return (margen_bruto - arrendamiento,)
+
+
+def referencia_elasticidades(rend, prec, cost, flete_base):
+    # Elasticidades de un cultivo, como el bucle original del análisis de sensibilidad
+    base_marg = referencia_margen_directo(rend, prec, cost, flete_base)[0]
+    if base_marg == 0:
+        return float('nan'), float('nan'), float('nan')
+    marg_rend_up = referencia_margen_directo(rend * 1.2, prec, cost, flete_base)[0]
+    marg_rend_down = referencia_margen_directo(rend * 0.8, prec, cost, flete_base)[0]
+    elast_rend = ((marg_rend_up - marg_rend_down) / base_marg) / 0.4
+    marg_flete_up = referencia_margen_directo(rend, prec, cost, flete_base * 1.2)[0]
+    marg_flete_down = referencia_margen_directo(rend, prec, cost, flete_base * 0.8)[0]
+    elast_flete = abs((marg_flete_up - marg_flete_down) / base_marg) / 0.4
+    relation = elast_rend / elast_flete if elast_flete != 0 else float('inf')
+    return elast_rend, elast_flete, relation
+
+
+# --- Entradas al azar con casos borde ---
+
+def _con_bordes(rng, valores, bordes, proporcion=PROPORCION_BORDES):
+    # Reemplaza una fracción de los valores por casos borde elegidos al azar
+    elegidos = rng.random(len(valores)) < proporcion
+    valores[elegidos] = rng.choice(np.asarray(bordes, dtype=float), int(elegidos.sum()))
+    return valores
+
+
+def generar_fletes(rng, n, km_tabla):
+    """Distancias (incluso fuera de la tabla y sobre sus puntos) y recargos."""
+    extremos = [0, 1, km_tabla[0] / 2, km_tabla[0], np.nextafter(km_tabla[0], np.inf),
+                np.nextafter(km_tabla[-1], -np.inf), km_tabla[-1], km_tabla[-1] + 0.5, 5 * km_tabla[-1]]
+    bordes = extremos + list(km_tabla) + list((km_tabla[1:] + km_tabla[:-1]) / 2)
+    return {
+        "km": _con_bordes(rng, rng.uniform(0, 1.2 * km_tabla[-1], n), bordes, 2 * PROPORCION_BORDES),
+        "recargo": _con_bordes(rng, rng.choice([0.0, 10.0, 20.0, 30.0, 40.0], n), [0.0, 5.5, 100.0]),
+    }
+
+
+def generar_margenes(rng, n):
+    """Entradas de la Calculadora; una fracción sin costos (retorno sin denominador) o con costos negativos."""
+    casos = {
+        "rendimiento": _con_bordes(rng, rng.uniform(0, 15, n), [0.0]),
+        "precio": _con_bordes(rng, rng.uniform(0, 600, n), [0.0]),
+        "costos_directos": _con_bordes(rng, rng.uniform(0, 1200, n), [0.0, -50.0]),
+        "comercializacion": _con_bordes(rng, rng.uniform(0, 200, n), [0.0]),
+        "estructura": _con_bordes(rng, rng.uniform(0, 100, n), [0.0]),
+        "cosecha": _con_bordes(rng, rng.uniform(0, 150, n), [0.0]),
+        "flete_usd_tn": _con_bordes(rng, rng.uniform(0, 80, n), [0.0]),
+        "arrendamiento_ha": _con_bordes(rng, rng.uniform(0, 400, n), [0.0]),
+    }
+    sin_costos = rng.random(n) < PROPORCION_BORDES
+    for columna in ["costos_directos", "comercializacion", "estructura", "cosecha", "flete_usd_tn", "arrendamiento_ha"]:
+        casos[columna][sin_costos] = 0.0
+    return casos
+
+
+def generar_margen_directo(rng, n):
+    """Entradas del margen directo de los escenarios de sensibilidad."""
+    return {
+        "rendimiento": _con_bordes(rng, rng.uniform(0, 15, n), [0.0]),
+        "precio": _con_bordes(rng, rng.uniform(0, 600, n), [0.0]),
+        "costos_directos": _con_bordes(rng, rng.uniform(0, 1200, n), [0.0]),
+        "flete": _con_bordes(rng, rng.uniform(0, 80, n), [0.0]),
+        "otros_costos": _con_bordes(rng, rng.uniform(0, 400, n), [0.0, 140.0]),
+        "arrendamiento": _con_bordes(rng, rng.uniform(0, 400, n), [0.0, 160 * 0.3]),
+    }
+
+
+def generar_elasticidades(rng, n):
+    """Entradas de las elasticidades; una fracción con margen base exactamente cero (valores enteros)."""
+    casos = {
+        "rendimiento": rng.uniform(0.5, 15, n),
+        "precio": rng.uniform(50, 600, n),
+        "costos_directos": rng.uniform(0, 1200, n),
+        "flete": _con_bordes(rng, rng.uniform(0, 80, n), [0.0]),
+    }
+    # Con enteros la cuenta es exacta: costos = ingreso - flete - otros costos - arrendamiento deja margen 0
+    nulo = rng.random(n) < PROPORCION_BORDES
+    m = int(nulo.sum())
+    rend = rng.integers(1, 15, m).astype(float)
+    prec = rng.integers(50, 600, m).astype(float)
+    flete = rng.integers(0, 80, m).astype(float)
+    casos["rendimiento"][nulo] = rend
+    casos["precio"][nulo] = prec
+    casos["flete"][nulo] = flete
+    casos["costos_directos"][nulo] = rend * prec - 140 - rend * flete - 160 * 0.3
+    return casos
+
+
+# --- Motores a verificar ---
+
+def _fletes_vectorizado(casos, km_tabla, tarifa_tabla):
+    return np.atleast_1d(calcular_costo_flete_vectorizado(casos["km"], km_tabla, tarifa_tabla, casos["recargo"]))[:, None]
+
+
+def _fletes_escalar(km, recargo, km_tabla, tarifa_tabla):
+    return (calcular_costo_flete_vectorizado(km, km_tabla, tarifa_tabla, recargo),)
+
+
+def _margenes_vectorizado(casos):
+    resultado = calcular_margenes(*(casos[c] for c in VERIFICACIONES["margenes"]["columnas"]))
+    return np.column_stack([resultado[s] for s in VERIFICACIONES["margenes"]["salidas"]])
+
+
+def _margenes_escalar(*args):
+    resultado = calcular_margenes(*args)
+    return tuple(resultado[s] for s in VERIFICACIONES["margenes"]["salidas"])
+
+
+def _margen_directo_vectorizado(casos):
+    return calcular_margen_directo(*(casos[c] for c in VERIFICACIONES["margen_directo"]["columnas"]))[:, None]
+
+
+def _margen_directo_escalar(*args):
+    return (calcular_margen_directo(*args),)
+
+
+def _elasticidades_vectorizado(casos):
+    df = calcular_elasticidades([""] * len(casos["rendimiento"]), casos["rendimiento"], casos["precio"],
+                                casos["costos_directos"], casos["flete"])
+    return df[VERIFICACIONES["elasticidades"]["salidas"]].to_numpy(dtype=float)
+
+
+# Cada verificación: columnas de entrada (en el orden de la referencia), salidas, generador,
+# referencia escalar, motor vectorizado y motor escalar (para el caché); "tabla" indica si
+# reciben la tabla de fletes
+VERIFICACIONES = {
+    "fletes": {
+        "columnas": ["km", "recargo"],
+        "salidas": ["costo_ars_tn"],
+        "generar": generar_fletes,
+        "referencia": referencia_costo_flete,
+        "vectorizado": _fletes_vectorizado,
+        "escalar": _fletes_escalar,
+        "tabla": True,
+    },
+    "margenes": {
+        "columnas": ["rendimiento", "precio", "costos_directos", "comercializacion", "estructura", "cosecha",
+                     "flete_usd_tn", "arrendamiento_ha"],
+        "salidas": ["ingreso_bruto_ha", "costo_flete_ha", "margen_bruto_ha", "margen_directo_ha",
+                    "costos_totales_ha", "retorno_costos"],
+        "generar": generar_margenes,
+        "referencia": referencia_margenes,
+        "vectorizado": _margenes_vectorizado,
+        "escalar": _margenes_escalar,
+        "tabla": False,
+    },
+    "margen_directo": {
+        "columnas": ["rendimiento", "precio", "costos_directos", "flete", "otros_costos", "arrendamiento"],
+        "salidas": ["margen_directo"],
+        "generar": generar_margen_directo,
+        "referencia": referencia_margen_directo,
+        "vectorizado": _margen_directo_vectorizado,
+        "escalar": _margen_directo_escalar,
+        "tabla": False,
+    },
+    "elasticidades": {
+        "columnas": ["rendimiento", "precio", "costos_directos", "flete"],
+        "salidas": ["Elasticidad Rendimiento", "Elasticidad Flete", "Relación Rendimiento/Flete"],
+        "generar": generar_elasticidades,
+        "referencia": referencia_elasticidades,
+        "vectorizado": _elasticidades_vectorizado,
+        "escalar": None,
+        "tabla": False,
+    },
+}
+
+
+def _tarea_vectorizada(entradas, salidas, particion, verificacion, tabla):
+    inicio, fin = particion
+    casos = {columna: valores[inicio:fin] for columna, valores in entradas.items()}
+    salidas["resultado"][inicio:fin] = VERIFICACIONES[verificacion]["vectorizado"](casos, **tabla)
+
+
+def _aplicar_referencia(funcion, casos, columnas, tabla):
+    extra = (tabla["km_tabla"].tolist(), tabla["tarifa_tabla"].tolist()) if tabla else ()
+    return np.array([funcion(*fila, *extra) for fila in zip(*(casos[c].tolist() for c in columnas))], dtype=float)
+
+
+def _motor_cache(especificacion, casos, tabla, indices):
+    # Dos pasadas sobre los mismos casos con un caché propio: la primera calcula, la segunda
+    # devuelve lo guardado; se verifican las dos
+    cache = CacheCalculos(max_entradas=2 * len(indices) + 1)
+    filas = list(zip(*(casos[c][indices].tolist() for c in especificacion["columnas"])))
+    extra = (tabla["km_tabla"], tabla["tarifa_tabla"]) if tabla else ()
+    pasadas = [[cache.memoizar("verificacion", especificacion["escalar"], *fila, *extra) for fila in filas]
+               for _ in range(2)]
+    return np.array(pasadas[0] + pasadas[1], dtype=float)
+
+
+def _motor_servicio(casos, indices):
+    # Fletes a través de las tandas del servicio HTTP (sin abrir el puerto), en solicitudes concurrentes
+    from servicio import ServicioMargenes, MAX_FILAS_SOLICITUD
+
+    servicio = ServicioMargenes()
+    try:
+        filas = [{"km": km, "recargo": recargo, "tipo_cambio": 1.0}
+                 for km, recargo in zip(casos["km"][indices].tolist(), casos["recargo"][indices].tolist())]
+        futuros = [servicio.fletes.enviar(filas[i:i + MAX_FILAS_SOLICITUD]) for i in range(0, len(filas), MAX_FILAS_SOLICITUD)]
+        return np.concatenate([futuro.result()["flete_ars_tn"].to_numpy(dtype=float) for futuro in futuros])[:, None]
+    finally:
+        servicio.detener()
+
+
+def comparar(referencia, obtenido, relativa=TOLERANCIA_RELATIVA, absoluta=TOLERANCIA_ABSOLUTA):
+    """
+    Desvío entre los resultados de un motor y los de la referencia.
+
+    Parámetros:
+    - referencia, obtenido: Arrays (casos, salidas)
+    - relativa, absoluta: Tolerancias
+
+    Retorna:
+    - Diccionario con desvio_absoluto, desvio_relativo (máximos), fallas (casos fuera de
+      tolerancia) y peor (índice del caso con mayor desvío relativo o primera falla de NaN/infinito)
+    """
+    referencia = np.asarray(referencia, dtype=float).reshape(len(referencia), -1)
+    obtenido = np.asarray(obtenido, dtype=float).reshape(referencia.shape)
+    finitos = np.isfinite(referencia) & np.isfinite(obtenido)
+    # NaN con NaN e infinito con el mismo infinito coinciden; cualquier otra mezcla es una falla
+    especiales = ~finitos & ~((np.isnan(referencia) & np.isnan(obtenido)) | (referencia == obtenido))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diferencia = np.where(finitos, np.abs(obtenido - referencia), 0.0)
+        escala = np.where(finitos, np.abs(referencia), 0.0)
+        relativo = np.where(diferencia > 0, diferencia / escala, 0.0)
+    fuera = (diferencia > absoluta + relativa * escala) | especiales
+    por_caso = fuera.any(axis=1)
+    if por_caso.any():
+        peor = int(np.flatnonzero(especiales.any(axis=1))[0]) if especiales.any() else int(np.argmax(relativo.max(axis=1) * por_caso))
+    else:
+        peor = int(np.argmax(relativo.max(axis=1))) if relativo.size else 0
+    return {
+        "desvio_absoluto": float(diferencia.max()) if diferencia.size else 0.0,
+        "desvio_relativo": float(relativo.max()) if relativo.size else 0.0,
+        "fallas": int(por_caso.sum()),
+        "peor": peor,
+    }
+
+
+def _curvas_sin_ajustes():
+    # Un cultivo cuyo producto no tiene ajustes recibe NaN (la cartera usa entonces el precio de la tabla)
+    from curvas_precios import CurvasPrecios, mes_entrega_cultivo
+
+    ajustes = pd.DataFrame({"fecha": np.array(["2025-03-01"], dtype="datetime64[D]"), "producto": ["Soja"],
+                            "mes_entrega": mes_entrega_cultivo(["Soja 1ra"], 2025), "ajuste": [300.0]})
+    precios = CurvasPrecios(ajustes).precios_lotes(["Soja 1ra", "Maíz"], "2025-03-02", 2025)
+    return bool(precios[0] == 300.0 and np.isnan(precios[1]))
+
+
+# Comprobaciones puntuales de casos borde: nombre -> función que devuelve True si se cumple
+COMPROBACIONES = {
+    "producto sin ajustes de futuros da precio NaN": _curvas_sin_ajustes,
+}
+
+
+def comprobar():
+    """Corre las comprobaciones puntuales; devuelve un diccionario nombre -> se cumple."""
+    return {nombre: funcion() for nombre, funcion in COMPROBACIONES.items()}
+
+
+def verificar(casos=CASOS_DEFAULT, muestra=MUESTRA_DEFAULT, semilla=0, procesos=2, verificaciones=None):
+    """
+    Compara cada motor contra la referencia escalar.
+
+    Parámetros:
+    - casos: Cantidad de entradas al azar por verificación
+    - muestra: Cantidad de entradas para los motores fila por fila (caché y servicio)
+    - semilla: Semilla de las entradas (la misma semilla reproduce la misma corrida)
+    - procesos: Procesos del motor en paralelo
+    - verificaciones: Nombres de VERIFICACIONES a correr (por defecto todas)
+
+    Retorna:
+    - DataFrame con una fila por motor: verificación, motor, casos, desvíos máximos, fallas,
+      casos por segundo del motor y de la referencia, y el peor caso
+    """
+    rng = np.random.default_rng(semilla)
+    df_fletes = cargar_tabla_fletes()
+    tabla_fletes = {"km_tabla": df_fletes["KM"].to_numpy(dtype=float),
+                    "tarifa_tabla": df_fletes["Tarifa_$/TN"].to_numpy(dtype=float)}
+    filas = []
+    with EjecutorParalelo(procesos, serial=False) as ejecutor:
+        for nombre in verificaciones or list(VERIFICACIONES):
+            especificacion = VERIFICACIONES[nombre]
+            tabla = tabla_fletes if especificacion["tabla"] else {}
+            entradas = especificacion["generar"](rng, casos, tabla["km_tabla"]) if tabla else especificacion["generar"](rng, casos)
+
+            t = time.perf_counter()
+            referencia = _aplicar_referencia(especificacion["referencia"], entradas, especificacion["columnas"], tabla)
+            velocidad_referencia = casos / (time.perf_counter() - t)
+
+            indices = rng.choice(casos, min(muestra, casos), replace=False)
+            motores = {
+                "vectorizado": (lambda: especificacion["vectorizado"](entradas, **tabla), np.arange(casos)),
+                "paralelo": (lambda: ejecutor.mapear(
+                    _tarea_vectorizada, particionar(casos, 4 * ejecutor.procesos), entradas,
+                    {"resultado": ((casos, len(especificacion["salidas"])), float)},
+                    verificacion=nombre, tabla=tabla)[0]["resultado"], np.arange(casos)),
+            }
+            if especificacion["escalar"] is not None:
+                motores["cache"] = (lambda: _motor_cache(especificacion, entradas, tabla, indices),
+                                    np.concatenate([indices, indices]))
+            if nombre == "fletes":
+                motores["servicio"] = (lambda: _motor_servicio(entradas, indices), indices)
+
+            for motor, (calcular, indices_motor) in motores.items():
+                t = time.perf_counter()
+                obtenido = calcular()
+                velocidad = len(indices_motor) / (time.perf_counter() - t)
+                resultado = comparar(referencia[indices_motor], obtenido)
+                caso = int(indices_motor[resultado["peor"]])
+                filas.append({
+                    "Verificación": nombre, "Motor": motor, "Casos": len(indices_motor),
+                    "Desvío abs.": resultado["desvio_absoluto"], "Desvío rel.": resultado["desvio_relativo"],
+                    "Fallas": resultado["fallas"], "Casos/s": velocidad, "Casos/s referencia": velocidad_referencia,
+                    "Peor caso": {c: float(entradas[c][caso]) for c in especificacion["columnas"]},
+                })
+    return pd.DataFrame(filas)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Verifica los motores de cálculo contra las fórmulas escalares de referencia.")
+    parser.add_argument("--casos", type=int, default=CASOS_DEFAULT, help="Entradas al azar por verificación")
+    parser.add_argument("--muestra", type=int, default=MUESTRA_DEFAULT, help="Entradas para los motores con caché y del servicio")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de las entradas al azar")
+    parser.add_argument("--procesos", type=int, default=2, help="Procesos del motor en paralelo")
+    parser.add_argument("--solo", nargs="*", choices=list(VERIFICACIONES), help="Verificaciones a correr (por defecto todas)")
+    argumentos = parser.parse_args()
+
+    df = verificar(argumentos.casos, argumentos.muestra, argumentos.semilla, argumentos.procesos, argumentos.solo)
+    for fila in df.itertuples(index=False):
+        estado = "ok" if fila.Fallas == 0 else f"FALLA ({fila.Fallas} casos)"
+        print(f"{fila[0]:<15} {fila.Motor:<12} {fila.Casos:>9}  abs {fila[3]:9.2e}  rel {fila[4]:9.2e}  "
+              f"{fila[6]:>12,.0f} casos/s (referencia {fila[7]:>10,.0f})  {estado}")
+        if fila.Fallas:
+            print(f"    peor caso: {fila[8]}")
+    comprobaciones = comprobar()
+    for nombre, cumple in comprobaciones.items():
+        print(f"{nombre:<60} {'ok' if cumple else 'FALLA'}")
+    if (df["Fallas"] > 0).any() or not all(comprobaciones.values()):
+        sys.exit(1)
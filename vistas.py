@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+from memoria import compactar
+
+# Capa de vistas de resultados: ordenar, filtrar, agregar y paginar del lado del servidor,
+# para enviar al navegador solo la página visible y series ya reducidas para los gráficos.
+# También mide el tamaño de lo que se envía en cada ejecución.
+
+FILAS_POR_PAGINA_DEFAULT = 50
+MAX_PUNTOS_DEFAULT = 500
+MAX_BARRAS_DEFAULT = 30
+
+
+class VistaTabla:
+    """
+    Tabla grande consultada por páginas.
+
+    Los órdenes por columna se calculan al construirla (cambiar de página no vuelve a
+    ordenar) y después no se modifica: se comparte entre sesiones desde el caché. La tabla
+    se guarda compacta (texto repetido como categorías, float32 donde alcanza la precisión);
+    en las columnas categóricas la búsqueda recorre solo las categorías.
+    """
+
+    def __init__(self, df):
+        self._df = compactar(df.reset_index(drop=True))
+        self._ordenes = {(columna, ascendente): self._df[columna].sort_values(
+                             ascending=ascendente, kind="stable", na_position="last").index.to_numpy()
+                         for columna in self._df.columns for ascendente in (True, False)}
+
+    def __len__(self):
+        return len(self._df)
+
+    @property
+    def columnas(self):
+        return list(self._df.columns)
+
+    def _coincidencias(self, buscar):
+        # Filas con el texto en alguna columna de texto (no se guarda: el objeto es compartido)
+        texto = buscar.lower()
+        coincide = np.zeros(len(self._df), dtype=bool)
+        for columna in self._df.select_dtypes(exclude="number").columns:
+            serie = self._df[columna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                categorias = serie.cat.categories.astype(str).str.lower().str.contains(texto, regex=False)
+                # El código -1 (valor faltante) toma el último elemento, que no coincide
+                coincide |= np.append(np.asarray(categorias, dtype=bool), False)[serie.cat.codes.to_numpy()]
+            else:
+                coincide |= serie.astype(str).str.lower().str.contains(texto, regex=False).to_numpy(dtype=bool)
+        return coincide
+
+    def filas(self, buscar=None, orden=None, ascendente=True):
+        """
+        Índices de las filas que cumplen la búsqueda, en el orden pedido.
+
+        Parámetros:
+        - buscar: Texto a buscar (sin distinguir mayúsculas) en las columnas de texto
+        - orden: Columna por la que ordenar (None mantiene el orden original)
+        - ascendente: Sentido del orden
+
+        Retorna:
+        - Array de índices de fila
+        """
+        indices = self._ordenes[(orden, ascendente)] if orden is not None else np.arange(len(self._df))
+        if buscar:
+            indices = indices[self._coincidencias(buscar)[indices]]
+        return indices
+
+    def pagina(self, numero, filas_por_pagina=FILAS_POR_PAGINA_DEFAULT, buscar=None, orden=None, ascendente=True):
+        """
+        Una página de la tabla.
+
+        Parámetros:
+        - numero: Número de página (desde 0; se acota al rango válido)
+        - filas_por_pagina: Filas por página
+        - buscar, orden, ascendente: Como en filas()
+
+        Retorna:
+        - Tupla (DataFrame de la página, total de filas que cumplen la búsqueda, número de página usado)
+        """
+        indices = self.filas(buscar, orden, ascendente)
+        paginas = max(1, -(-len(indices) // filas_por_pagina))
+        numero = min(max(0, int(numero)), paginas - 1)
+        seleccion = indices[numero * filas_por_pagina:(numero + 1) * filas_por_pagina]
+        return self._df.iloc[seleccion], len(indices), numero
+
+    def agregado(self, por, medidas, funcion="sum", buscar=None):
+        """Agregado por una o más columnas (para gráficos), sobre las filas que cumplen la búsqueda."""
+        df = self._df.iloc[self.filas(buscar)] if buscar else self._df
+        return df.groupby(por, sort=True)[list(medidas)].agg(funcion)
+
+
+def reducir_serie(x, y, max_puntos=MAX_PUNTOS_DEFAULT):
+    """
+    Reduce una serie larga para graficar, conservando picos: en cada tramo se dejan
+    el mínimo y el máximo (y siempre el primer y el último punto).
+
+    Parámetros:
+    - x, y: Arrays de la serie (x ordenado)
+    - max_puntos: Cantidad máxima aproximada de puntos resultantes
+
+    Retorna:
+    - Tupla (x, y) reducida
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_puntos:
+        return x, y
+    tramos = max(1, (max_puntos - 2) // 2)
+    limites = np.linspace(1, n - 1, tramos + 1).astype(int)
+    inicios = limites[:-1]
+    # Posición del mínimo y del máximo de cada tramo (reduceat sobre los valores y luego búsqueda)
+    minimos = np.minimum.reduceat(y[:-1], inicios)
+    maximos = np.maximum.reduceat(y[:-1], inicios)
+    tramo_de = np.repeat(np.arange(tramos), np.diff(limites))
+    posiciones = np.arange(1, n - 1)
+    valores = y[1:n - 1]
+    es_min = valores == minimos[tramo_de]
+    es_max = valores == maximos[tramo_de]
+    # Primera posición que alcanza el extremo en cada tramo
+    pos_min = np.full(tramos, n, dtype=np.int64)
+    pos_max = np.full(tramos, n, dtype=np.int64)
+    np.minimum.at(pos_min, tramo_de[es_min], posiciones[es_min])
+    np.minimum.at(pos_max, tramo_de[es_max], posiciones[es_max])
+    elegidos = np.unique(np.concatenate([[0, n - 1], pos_min[pos_min < n], pos_max[pos_max < n]]))
+    return x[elegidos], y[elegidos]
+
+
+def barras_principales(serie, max_barras=MAX_BARRAS_DEFAULT, etiqueta_otros="Otros"):
+    """
+    Deja las max_barras categorías de mayor valor absoluto y suma el resto en "Otros".
+
+    Parámetros:
+    - serie: Serie de pandas categoría -> valor
+
+    Retorna:
+    - Serie reducida
+    """
+    if len(serie) <= max_barras:
+        return serie
+    orden = serie.abs().sort_values(ascending=False, kind="stable").index
+    principales = serie.loc[orden[:max_barras - 1]]
+    return pd.concat([principales, pd.Series({etiqueta_otros: serie.loc[orden[max_barras - 1:]].sum()})])
+
+
+def tamano_carga(datos):
+    """Bytes aproximados que ocupa un DataFrame o Serie al enviarse al navegador (formato Arrow)."""
+    if isinstance(datos, pd.Series):
+        datos = datos.to_frame()
+    try:
+        import pyarrow as pa
+        return pa.Table.from_pandas(datos, preserve_index=False).nbytes
+    except Exception:
+        return int(datos.memory_usage(deep=True).sum())
+
+
+class MedidorCarga:
+    """Registro de los datos enviados al navegador en una ejecución de la página."""
+
+    def __init__(self):
+        self._elementos = []
+
+    def registrar(self, nombre, datos):
+        self._elementos.append((nombre, len(datos), tamano_carga(datos)))
+        return datos
+
+    @property
+    def total(self):
+        return sum(b for _, _, b in self._elementos)
+
+    def resumen(self, maximo=10):
+        """DataFrame con los elementos más pesados de la ejecución."""
+        df = pd.DataFrame(self._elementos, columns=["Elemento", "Filas", "Bytes"])
+        return df.sort_values("Bytes", ascending=False, kind="stable").head(maximo).reset_index(drop=True)